@@ -0,0 +1,162 @@
+import numpy as np
+from scipy.linalg import cho_solve
+
+# python -m aiportfolio.BL_MVO.BL_batch
+
+# B...: 배치 차원 (τ 그리드, 뷰 세트, 날짜 등 - 서로 브로드캐스트 가능)
+# N: 자산 개수
+# K: 견해 개수
+
+def apply_P(P, A):
+    """
+    P·A (A: (..., N, M))를 계산합니다.
+    scipy.sparse P (K×N)는 dense로 바꾸지 않고, A의 배치 차원을 열로 펼쳐 한 번의 sparse 곱으로 계산합니다.
+    """
+    if not hasattr(P, 'toarray'):
+        return P @ A
+    moved = np.moveaxis(np.asarray(A, dtype=float), -2, 0)                 # (N, ..., M)
+    out = np.asarray(P @ moved.reshape(moved.shape[0], -1))                 # (K, ...·M)
+    return np.moveaxis(out.reshape((P.shape[0],) + moved.shape[1:]), 0, -2)
+
+def _has_view(P):
+    """행별로 0이 아닌 원소가 있는지 여부 (..., K)"""
+    if hasattr(P, 'toarray'):
+        return np.diff(P.tocsr().indptr) > 0
+    return np.any(P != 0, axis=-1)
+
+def he_litterman_omega(sigma, P, tau):
+    """
+    He & Litterman (1999)의 대각 Ω를 배치로 계산합니다.
+
+    Formula:
+        Ω_ii = τ × P_i × Σ × P_i^T
+
+    P_i가 모두 0인 행(패딩된 견해)은 정보가 없으므로 Ω_ii = 1로 두어
+    (PτΣP^T + Ω)가 특이행렬이 되지 않게 합니다. 사후 분포에는 영향이 없습니다.
+
+    Args:
+        sigma (np.ndarray): (..., N, N)
+        P (np.ndarray or scipy.sparse): (..., K, N). sparse는 단일 K×N만 지원
+        tau (float or np.ndarray): 스칼라 또는 배치 차원과 브로드캐스트 가능한 배열
+
+    Returns:
+        np.ndarray: (..., K, K) 대각 행렬
+    """
+    tau = np.asarray(tau, dtype=float)
+    P_sigma_PT = apply_P(P, np.swapaxes(apply_P(P, sigma), -1, -2))     # (..., K, K)
+    diag = np.diagonal(P_sigma_PT, axis1=-2, axis2=-1)
+    omega = np.where(_has_view(P), tau[..., None] * diag, 1.0)
+    return omega[..., :, None] * np.eye(omega.shape[-1])
+
+def _cho_solve(L, B):
+    """
+    L·L^T·X = B 를 두 번의 삼각 시스템 풀이로 계산합니다. (scipy cho_solve, 배치 지원)
+    """
+    return cho_solve((L, True), B)
+
+def batched_bl_posterior(sigma, pi, P, Q, Omega=None, tau=0.025, return_sigma=False):
+    """
+    Black-Litterman posterior for many (τ, view-set, date) combinations at once
+
+    모든 입력은 앞쪽 배치 차원에서 브로드캐스트되며, 역행렬을 직접 구하지 않고
+    K×K 행렬 (PτΣP^T + Ω)의 Cholesky 분해로 풉니다. K ≤ N이므로
+    N×N 역행렬을 세 번 구하는 기존 방식보다 빠르고 수치적으로 안정적입니다.
+
+    Formula (get_bl_outputs의 식과 수학적으로 동일):
+        μ_BL = π + τΣP^T·(PτΣP^T + Ω)^(-1)·(Q - Pπ)
+        Σ_BL = τΣ - τΣP^T·(PτΣP^T + Ω)^(-1)·PτΣ
+
+    Args:
+        sigma (np.ndarray): 공분산 행렬 (..., N, N)
+        pi (np.ndarray): 균형 초과수익률 (..., N)
+        P (np.ndarray or scipy.sparse): 선택 행렬 (..., K, N). sparse는 단일 K×N만 지원
+        Q (np.ndarray): 견해 벡터 (..., K)
+        Omega (np.ndarray, optional): 견해 불확실성 (..., K, K).
+            None이면 τ에 맞춰 He-Litterman 대각 Ω를 계산
+        tau (float or np.ndarray): 스칼라 또는 배치 차원과 브로드캐스트 가능한 배열
+        return_sigma (bool): True이면 Σ_BL도 반환
+
+    Returns:
+        np.ndarray: μ_BL (..., N), return_sigma=True이면 (μ_BL, Σ_BL)
+
+    Example:
+        τ 그리드(G)와 날짜(W)를 동시에 계산하려면 τ를 (G, 1), 나머지를 (W, ...)로 전달:
+            mu = batched_bl_posterior(sigma, pi, P, Q, tau=taus[:, None])  # (G, W, N)
+    """
+    sigma = np.asarray(sigma, dtype=float)
+    pi = np.asarray(pi, dtype=float)
+    if not hasattr(P, 'toarray'):
+        P = np.asarray(P, dtype=float)  # scipy.sparse는 그대로 두고 apply_P로 곱함
+    Q = np.asarray(Q, dtype=float)
+    tau = np.asarray(tau, dtype=float)
+
+    if Omega is None:
+        Omega = he_litterman_omega(sigma, P, tau)
+    Omega = np.asarray(Omega, dtype=float)
+
+    # Σ가 대칭이므로 τΣP^T = τ(PΣ)^T
+    tau_sigma_PT = tau[..., None, None] * np.swapaxes(apply_P(P, sigma), -1, -2)  # (..., N, K)
+    M = apply_P(P, tau_sigma_PT) + Omega                         # (..., K, K)
+
+    try:
+        L = np.linalg.cholesky(M)
+    except np.linalg.LinAlgError as e:
+        raise ValueError(f"(PτΣP^T + Ω)가 양의 정부호가 아닙니다: {e}")
+
+    residual = Q - apply_P(P, pi[..., None])[..., 0]            # (..., K)
+    adj = _cho_solve(L, residual[..., None])[..., 0]              # (..., K)
+    mu_BL = pi + np.einsum('...nk,...k->...n', tau_sigma_PT, adj)
+
+    if not return_sigma:
+        return mu_BL
+
+    tau_sigma = tau[..., None, None] * sigma                     # (..., N, N)
+    sigma_BL = tau_sigma - tau_sigma_PT @ _cho_solve(L, np.swapaxes(tau_sigma_PT, -1, -2))
+    return mu_BL, sigma_BL
+
+def stack_views(view_sets):
+    """
+    견해 개수(K)가 서로 다른 (P, Q, Omega) 목록을 하나의 배치로 쌓습니다.
+
+    부족한 견해는 P=0, Q=0, Ω=1인 행으로 채웁니다. 이 행은 Pπ와 Q가 모두 0이라
+    사후 분포에 아무 영향을 주지 않으므로 결과는 패딩 전과 동일합니다.
+    Omega가 None인 항목이 하나라도 있으면 반환되는 Omega는 None이며,
+    batched_bl_posterior가 τ에 맞춰 He-Litterman Ω를 계산합니다.
+
+    Args:
+        view_sets (list): [(P, Q, Omega), ...] - P (K×N), Q (K×1 또는 K,), Omega (K×K) 또는 None
+
+    Returns:
+        tuple: (P, Q, Omega) - (B, K_max, N), (B, K_max), (B, K_max, K_max) 또는 None
+    """
+    k_max = max(np.asarray(P).shape[0] for P, _, _ in view_sets)
+    n = np.asarray(view_sets[0][0]).shape[1]
+    b = len(view_sets)
+
+    P_stack = np.zeros((b, k_max, n))
+    Q_stack = np.zeros((b, k_max))
+    Omega_stack = np.broadcast_to(np.eye(k_max), (b, k_max, k_max)).copy()
+    has_omega = all(Omega is not None for _, _, Omega in view_sets)
+
+    for i, (P, Q, Omega) in enumerate(view_sets):
+        k = np.asarray(P).shape[0]
+        P_stack[i, :k] = P
+        Q_stack[i, :k] = np.asarray(Q, dtype=float).reshape(-1)
+        if has_omega:
+            Omega_stack[i, :k, :k] = Omega
+
+    return P_stack, Q_stack, (Omega_stack if has_omega else None)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    A = rng.normal(size=(11, 11)) * 0.01
+    sigma = A @ A.T + np.eye(11) * 1e-4
+    pi = rng.normal(size=11) * 0.005
+    P = np.zeros((3, 11))
+    P[[0, 1, 2], [0, 3, 5]] = 1
+    P[[0, 1, 2], [1, 4, 6]] = -1
+    Q = np.array([0.01, -0.005, 0.002])
+
+    taus = np.linspace(0.01, 0.1, 10)
+    mu = batched_bl_posterior(sigma, pi, P, Q, tau=taus)
+    print(mu.shape)
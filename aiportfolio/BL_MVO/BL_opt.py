@@ -4,9 +4,9 @@ from datetime import datetime
 
 # Import parameters from the BL_params directory
 from aiportfolio.BL_MVO.BL_params.market_params import Market_Params
-from aiportfolio.BL_MVO.BL_params.view_params import get_view_params
+from aiportfolio.BL_MVO.BL_batch import batched_bl_posterior
 
-def get_bl_outputs(tau, start_date, end_date, simul_name=None, Tier=None, model='llama'):
+def get_bl_outputs(tau, start_date, end_date, simul_name=None, Tier=None, model='llama', params=None, universe='sector', views=None):
     """
     Execute the Black-Litterman model to compute posterior expected returns and covariance.
 
@@ -24,40 +24,43 @@ def get_bl_outputs(tau, start_date, end_date, simul_name=None, Tier=None, model=
         end_date (datetime): 종료 날짜 (예측 기준일)
         simul_name (str, optional): 시뮬레이션 이름
         Tier (int, optional): 분석 단계 (1, 2, 3)
+        params (dict, optional): 미리 계산된 시장 파라미터 (Market_Params.compute_all() 형식).
+            None이면 start_date ~ end_date로 새로 계산
+        universe (str): 'sector' (기본값) 또는 'stock' (S&P500 구성 종목 단위, params가 None일 때 사용)
+        views (list, optional): 미리 생성한 뷰. None이면 LLM으로 생성
 
     Returns:
         tuple: (mu_BL, Sigma_BL, sectors)
             - mu_BL (np.ndarray): 사후 기대수익률 벡터 (N×1)
             - Sigma_BL (pd.DataFrame): 사후 공분산 행렬 (N×N)
-            - sectors (list): 섹터 리스트
+            - sectors (list): 섹터 리스트 (universe='stock'이면 종목 리스트)
     """
     # BL 변수 생성
-    market_params = Market_Params(start_date, end_date)
-    Pi = market_params.making_pi()      # Equilibrium excess returns (π)
-    sigma = market_params.making_sigma()  # Covariance matrix (Σ)
-    sigma_for_optimize = market_params.making_sigma_for_optimize()
+    if params is None:
+        market_params = Market_Params(start_date, end_date, universe=universe)
+        params = market_params.compute_all()  # 기간 슬라이싱/피벗 1회로 Σ, Σ_opt, λ, w_mkt, π 계산
+    Pi = params['pi']      # Equilibrium excess returns (π)
+    sigma = (params['sigma'], params['sectors'])  # Covariance matrix (Σ)
+    sigma_for_optimize = (params['sigma_for_optimize'], params['sectors'])
+
+    # LLM 의존성(transformers/torch)은 뷰가 필요한 경우에만 로드 (NONE_view 베이스라인은 불필요)
+    from aiportfolio.BL_MVO.BL_params.view_params import get_view_params
+
+    # 종목 단위면 섹터 뷰를 종목 sparse P로 변환하기 위한 정보 전달
+    stock_info = None
+    if params.get('universe') == 'stock':
+        stock_info = {'gsector': params['gsector'], 'w_mkt': params['w_mkt']}
 
-    P, Q, Omega = get_view_params(sigma[0], tau, end_date, simul_name, Tier, model)
+    P, Q, Omega = get_view_params(sigma[0], tau, end_date, simul_name, Tier, model, stock_info=stock_info,
+                                   views_data=views)
 
     # --- Execute the Black-Litterman formula ---
     pi_np = (Pi.values.flatten() if isinstance(Pi, pd.DataFrame) else Pi.flatten()).reshape(-1, 1)
     sigma_np = sigma[0].values if isinstance(sigma[0], pd.DataFrame) else sigma[0]
 
-    # Calculate intermediate terms
-    tau_sigma_inv = np.linalg.inv(tau * sigma_np)
-    omega_inv = np.linalg.inv(Omega)
-    PT_omega_inv = P.T @ omega_inv
-
-    # Term A: [ (τΣ)^(-1) + P^T·Ω^(-1)·P ]
-    term_A = tau_sigma_inv + PT_omega_inv @ P
-
-    # Term B: [ (τΣ)^(-1)·π + P^T·Ω^(-1)·Q ]
-    term_B_part1 = tau_sigma_inv @ pi_np
-    term_B_part2 = PT_omega_inv @ Q
-    term_B = term_B_part1 + term_B_part2
-
     # Calculate posterior expected returns (μ_BL)
-    mu_BL = np.linalg.inv(term_A) @ term_B
+    # 역행렬 대신 (PτΣP^T + Ω)의 Cholesky 풀이를 사용하는 배치 커널로 계산 (단일 배치)
+    mu_BL = batched_bl_posterior(sigma_np, pi_np.flatten(), P, Q.flatten(), Omega=Omega, tau=tau).reshape(-1, 1)
 
     # --- Return the outputs for the MVO script ---
     sectors = sigma[1]
@@ -71,4 +74,35 @@ def get_bl_outputs(tau, start_date, end_date, simul_name=None, Tier=None, model=
     print('\nμ_BL (Posterior Expected Returns)')
     print(mu_BL)
 
-    return mu_BL.reshape(-1, 1), sigma_for_optimize[0], sectors
\ No newline at end of file
+    return mu_BL.reshape(-1, 1), sigma_for_optimize[0], sectors
+
+def get_equilibrium_outputs(start_date, end_date, params=None, universe='sector', cov_method=None):
+    """
+    뷰가 없는 경우(P=0)의 Black-Litterman 결과를 닫힌 형태로 반환합니다. (NONE_view 베이스라인)
+
+    Theoretical Foundation:
+        P=0이면 term_A = (τΣ)^(-1), term_B = (τΣ)^(-1)·π 이므로
+        μ_BL = [(τΣ)^(-1)]^(-1) × (τΣ)^(-1)·π = π  (τ와 무관하게 정확히 성립)
+
+    역행렬 계산 없이 π를 그대로 사용하므로 결과가 정확하고 추가 비용이 없습니다.
+
+    Args:
+        start_date (datetime): 시작 날짜
+        end_date (datetime): 종료 날짜 (예측 기준일)
+        params (dict, optional): 미리 계산된 시장 파라미터 (Market_Params.compute_all() 형식).
+            AI 포트폴리오 실행과 같은 파라미터를 공유하면 집계를 다시 하지 않습니다.
+        universe (str): 'sector' (기본값) 또는 'stock' (params가 None일 때 사용)
+        cov_method (str, optional): 공분산 추정 방식 (params가 None일 때 사용, Market_Params와 동일)
+
+    Returns:
+        tuple: (mu_BL, Sigma_BL, sectors) - get_bl_outputs와 동일한 형식
+            - mu_BL (np.ndarray): 사후 기대수익률 벡터 = π (N×1)
+            - Sigma_BL (pd.DataFrame): 샤프 최적화용 공분산 행렬 (N×N)
+            - sectors (list): 섹터 리스트
+    """
+    if params is None:
+        params = Market_Params(start_date, end_date, universe=universe, cov_method=cov_method).compute_all()
+
+    mu_BL = np.asarray(params['pi'], dtype=float).reshape(-1, 1)
+
+    return mu_BL, params['sigma_for_optimize'], params['sectors']
@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+
+# python -m aiportfolio.BL_MVO.BL_params.covariance
+
+# T: 관측 월 수
+# N: 자산 개수
+# k: 팩터 개수
+
+class FactorCovariance:
+    """
+    Low-rank plus diagonal covariance representation
+
+        Σ = B·F·B^T + diag(D)
+
+    N×N 행렬을 만들지 않고도 Σ·x 와 Σ^(-1)·x 를 계산할 수 있습니다.
+    역행렬 풀이는 Woodbury 항등식으로 k×k 시스템 하나만 풀기 때문에
+    O(N·k²)이며, 자산 부분집합(idx)에 대해서도 같은 비용으로 풀 수 있습니다.
+    (active-set MVO의 자유 변수 블록 Σ_FF 풀이 등)
+
+    Formula (Woodbury):
+        Σ^(-1) = D^(-1) - D^(-1)·B·(F^(-1) + B^T·D^(-1)·B)^(-1)·B^T·D^(-1)
+
+    Attributes:
+        B (np.ndarray): 팩터 노출 (N×k)
+        F (np.ndarray): 팩터 공분산 (k×k, 양의 정부호)
+        D (np.ndarray): 고유 분산 (N,, 모두 양수)
+    """
+    def __init__(self, B, F, D):
+        self.B = np.asarray(B, dtype=float)
+        self.F = np.asarray(F, dtype=float)
+        self.D = np.asarray(D, dtype=float)
+
+        if np.any(self.D <= 0):
+            raise ValueError("고유 분산 D는 모두 양수여야 Woodbury 풀이가 가능합니다.")
+
+        # F = L·L^T 로 두고 B를 스케일하면 Σ = G·G^T + diag(D) (G = B·L)
+        self._G = self.B @ np.linalg.cholesky(self.F)
+
+    @property
+    def n_factors(self):
+        return self.B.shape[1]
+
+    def dense(self):
+        """N×N 공분산 행렬을 만듭니다."""
+        return self._G @ self._G.T + np.diag(self.D)
+
+    def matvec(self, x, idx=None):
+        """
+        Σ·x (idx가 주어지면 Σ_idx,idx·x) 를 O(N·k)로 계산합니다.
+        """
+        G, D = (self._G, self.D) if idx is None else (self._G[idx], self.D[idx])
+        x = np.asarray(x, dtype=float)
+        return G @ (G.T @ x) + (D * x.T).T
+
+    def solve(self, rhs, idx=None):
+        """
+        Σ·x = rhs (idx가 주어지면 Σ_idx,idx·x = rhs) 를 Woodbury 항등식으로 풉니다.
+
+        Args:
+            rhs (np.ndarray): (n,) 또는 (n, m)
+            idx (np.ndarray, optional): 자산 부분집합 (bool 마스크 또는 정수 인덱스)
+
+        Returns:
+            np.ndarray: rhs와 같은 shape의 해
+        """
+        G, D = (self._G, self.D) if idx is None else (self._G[idx], self.D[idx])
+        rhs = np.asarray(rhs, dtype=float)
+
+        d_inv_rhs = (rhs.T / D).T
+        d_inv_G = G / D[:, None]
+        core = np.eye(G.shape[1]) + G.T @ d_inv_G          # k×k
+        return d_inv_rhs - d_inv_G @ cho_solve(cho_factor(core), G.T @ d_inv_rhs)
+
+def _center(values):
+    """
+    열 평균을 빼고 결측치는 0으로 채운 뒤, 열마다 sqrt(T / n_i) (n_i: 관측 수)를 곱한 T×N 행렬을 반환합니다.
+
+    결측을 0으로만 채우면 X^T·X / T 의 분산이 n_i / T 만큼 0 쪽으로 줄어들므로
+    (종목 편입/편출로 관측이 일부인 종목일수록 과소추정), 관측 수로 열을 다시 키워
+    분산은 관측된 달만으로 추정하고 공분산은 n_ij / sqrt(n_i·n_j) (n_ij: 함께 관측된 달 수)만큼만 줄어들게 합니다.
+    X^T·X 형태는 그대로이므로 양의 준정부호와 Ledoit-Wolf의 팩터 표현이 유지됩니다.
+    """
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(values, axis=0)
+    scale = np.sqrt(values.shape[0] / np.maximum(counts, 1))
+    return np.where(valid, values - np.nan_to_num(mean), 0.0) * scale
+
+def ledoit_wolf_cov(values):
+    """
+    Ledoit-Wolf shrinkage covariance (scaled identity target)
+
+    표본공분산 S를 m·I (m = tr(S)/N) 쪽으로 최적 강도 δ만큼 줄입니다.
+    N이 T보다 크거나 비슷해도 (예: 500 종목, 120개월) 항상 양의 정부호이고
+    조건수가 유한하므로 BL 역행렬과 MVO가 안정적으로 동작합니다.
+
+    Theoretical Foundation:
+        Ledoit & Wolf (2004) "A well-conditioned estimator for large-dimensional covariance matrices"
+
+    Formula:
+        Σ_LW = δ·m·I + (1 - δ)·S
+        d² = ||S - m·I||²_F / N
+        b² = min( (1/T²)·Σ_t ||x_t·x_t^T - S||²_F / N , d² )
+        δ  = b² / d²
+
+    Args:
+        values (np.ndarray): T×N 수익률 행렬 (결측치 허용)
+
+    Returns:
+        tuple: (sigma, delta)
+            - sigma (np.ndarray): N×N 축소 공분산 행렬
+            - delta (float): 축소 강도 (0 ~ 1)
+    """
+    X = _center(values)
+    T, N = X.shape
+
+    S = X.T @ X / T
+    m = np.trace(S) / N
+    d2 = np.sum((S - m * np.eye(N)) ** 2) / N
+
+    # Σ_t ||x_t·x_t^T - S||²_F = Σ_t ||x_t||⁴ - T·||S||²_F
+    b2_bar = (np.sum(np.sum(X ** 2, axis=1) ** 2) - T * np.sum(S ** 2)) / (T ** 2 * N)
+    b2 = min(b2_bar, d2)
+
+    delta = 0.0 if d2 == 0 else b2 / d2
+    sigma = delta * m * np.eye(N) + (1 - delta) * S
+    return sigma, float(delta)
+
+def _ledoit_wolf_estimate(values):
+    """
+    Ledoit-Wolf backend. 관측 수가 자산 수보다 적고 (T < N) 축소 강도가 양수이면
+    Σ = (1-δ)/T·X^T·X + δ·m·I 를 rank-T 팩터 표현 (B = X^T, F = (1-δ)/T·I, D = δ·m)으로도 반환합니다.
+    """
+    sigma, delta = ledoit_wolf_cov(values)
+    X = _center(values)
+    T, N = X.shape
+    m = np.trace(sigma) / N      # tr(Σ_LW) = tr(S) 이므로 m과 동일
+
+    factor = None
+    if T < N and 0 < delta < 1 and m > 0:
+        factor = FactorCovariance(X.T, (1 - delta) / T * np.eye(T), np.full(N, delta * m))
+    return {'sigma': sigma, 'factor': factor, 'shrinkage': delta}
+
+def _sample_estimate(values):
+    """
+    표본공분산 backend (ddof=1, 기존 Market_Params와 동일).
+    결측치가 있으면 pandas의 pairwise 공분산으로 계산합니다. 팩터 표현은 없습니다.
+    """
+    values = np.asarray(values, dtype=float)
+    if np.isnan(values).any():
+        sigma = pd.DataFrame(values).cov().to_numpy()
+    else:
+        sigma = np.cov(values, rowvar=False, ddof=1)
+    return {'sigma': np.atleast_2d(sigma), 'factor': None, 'shrinkage': None}
+
+def ewma_cov(values, halflife=24):
+    """
+    Exponentially weighted covariance (RiskMetrics 방식)
+
+    최근 관측치에 더 큰 가중치를 두어 국면 변화에 빠르게 반응합니다.
+    가중 평균을 뺀 뒤 가중 교차곱을 한 번의 행렬곱으로 계산합니다.
+
+    Formula:
+        w_t ∝ 0.5^((T-1-t) / halflife),  Σ w_t = 1
+        Σ = Σ_t w_t·(x_t - x̄_w)(x_t - x̄_w)^T
+
+    Args:
+        values (np.ndarray): T×N 수익률 행렬 (결측치는 가중 평균 위치로 간주)
+        halflife (float): 반감기 (관측 월 수)
+
+    Returns:
+        np.ndarray: N×N 공분산 행렬
+    """
+    values = np.asarray(values, dtype=float)
+    T = values.shape[0]
+    w = 0.5 ** (np.arange(T - 1, -1, -1) / halflife)
+    w = w / w.sum()
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (w @ filled) / (w @ valid)
+    X = np.where(valid, values - np.nan_to_num(mean), 0.0)
+    return (X * w[:, None]).T @ X
+
+def _ewma_estimate(values, halflife=24):
+    """EWMA backend. 팩터 표현은 없습니다."""
+    return {'sigma': ewma_cov(values, halflife=halflife), 'factor': None, 'shrinkage': None}
+
+def factor_cov(values, n_factors=3):
+    """
+    Statistical k-factor covariance (principal components)
+
+    중심화한 T×N 수익률 행렬의 얇은 SVD로 상위 k개 주성분을 팩터로 사용하고,
+    나머지는 자산별 고유 분산으로 둡니다. N×N 고유값 분해 대신 SVD를 쓰므로
+    비용은 O(min(T, N)²·max(T, N))입니다. 대각 성분은 표본분산과 같습니다.
+
+    Formula:
+        X = U·s·V^T,  S = X^T·X / (T-1)
+        B = V_k,  F = diag(s_k² / (T-1)),  D = max(diag(S) - diag(B·F·B^T), ε)
+        Σ = B·F·B^T + diag(D)
+
+    Args:
+        values (np.ndarray): T×N 수익률 행렬 (결측치 허용)
+        n_factors (int): 팩터 개수 k (min(T, N) - 1 이하로 잘림)
+
+    Returns:
+        FactorCovariance: 팩터 표현 (dense()로 N×N 행렬 생성)
+    """
+    X = _center(values)
+    T, N = X.shape
+    k = int(max(1, min(n_factors, min(T, N) - 1)))
+
+    _, s, Vt = np.linalg.svd(X, full_matrices=False)
+    B = Vt[:k].T
+    F = np.diag(s[:k] ** 2 / (T - 1))
+
+    total_var = np.sum(X ** 2, axis=0) / (T - 1)
+    resid_var = total_var - np.einsum('ik,k->i', B ** 2, np.diag(F))
+    floor = 1e-6 * max(float(np.mean(total_var)), np.finfo(float).tiny)
+    return FactorCovariance(B, F, np.maximum(resid_var, floor))
+
+def _factor_estimate(values, n_factors=3):
+    """k-factor backend."""
+    factor = factor_cov(values, n_factors=n_factors)
+    return {'sigma': factor.dense(), 'factor': factor, 'shrinkage': None}
+
+# Market_Params(cov_method=...)에서 선택 가능한 공분산 추정 방식
+COV_METHODS = {
+    'sample': _sample_estimate,
+    'ledoit_wolf': _ledoit_wolf_estimate,
+    'ewma': _ewma_estimate,
+    'factor': _factor_estimate,
+}
+
+def estimate_covariance(values, method='sample', **options):
+    """
+    선택한 방식으로 T×N 수익률 블록의 공분산을 추정합니다.
+
+    Args:
+        values (np.ndarray): T×N 수익률 행렬 (결측치 허용)
+        method (str): 'sample', 'ledoit_wolf', 'ewma', 'factor' 중 하나
+        **options: 방식별 옵션 (ewma: halflife, factor: n_factors)
+
+    Returns:
+        dict: {
+            'sigma': N×N 공분산 행렬 (np.ndarray),
+            'factor': FactorCovariance 또는 None (Woodbury 풀이용 팩터 표현),
+            'shrinkage': Ledoit-Wolf 축소 강도 (다른 방식은 None)
+        }
+    """
+    if method not in COV_METHODS:
+        raise ValueError(f"지원하지 않는 cov_method입니다: {method} ({', '.join(COV_METHODS)})")
+    return COV_METHODS[method](values, **options)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.01, 0.05, size=(120, 500))
+    for method in COV_METHODS:
+        est = estimate_covariance(returns, method)
+        print(f"{method}: cond={np.linalg.cond(est['sigma']):.1f}, factor={est['factor'] is not None}")
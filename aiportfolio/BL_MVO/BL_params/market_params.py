@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from aiportfolio.BL_MVO.prepare.sector_excess_return import final
+from aiportfolio.BL_MVO.prepare.sector_excess_return import final, stock_panel
+from aiportfolio.BL_MVO.BL_params.covariance import estimate_covariance, COV_METHODS
 
-# N: 자산 개수 (11 GICS sectors)
+# N: 자산 개수 (11 GICS sectors, 또는 universe='stock'이면 S&P500 구성 종목 수)
 # K: 견해 개수
 # sigma: 초과수익률 공분산 행렬 (N×N)
 # pi: 내재 시장 균형 초과수익률 벡터 (N×1)
@@ -26,9 +27,11 @@ class Market_Params:
         Idzorek (2005) "A step-by-step guide to the Black-Litterman model"
 
     Attributes:
-        df (pd.DataFrame): Preprocessed sector return data
+        df (pd.DataFrame): Preprocessed sector (or stock) return data
         start_date (datetime): Start date for parameter estimation period
         end_date (datetime): End date (as of date for market weights)
+        universe (str): 'sector' (11 GICS sectors) or 'stock' (S&P 500 constituents)
+        cov_method (str): Covariance backend ('sample', 'ledoit_wolf', 'ewma', 'factor')
 
     Methods:
         making_mu(): Calculate mean excess returns (for reference, not used in BL)
@@ -36,18 +39,252 @@ class Market_Params:
         making_w_mkt(): Calculate market capitalization weights
         making_lambda(): Calculate market risk aversion coefficient
         making_pi(): Calculate equilibrium excess returns (CAPM reverse-engineering)
+        compute_all(): Compute all of the above from one filtered window (cached)
     """
-    def __init__(self, start_date, end_date):
+    def __init__(self, start_date, end_date, universe='sector', min_obs=60, cov_method=None, cov_options=None):
         """
         Initialize Market_Params with date range
 
         Args:
             start_date (datetime): Start date for parameter estimation
             end_date (datetime): End date (as of date for market weights)
+            universe (str): 'sector' (기본값) 또는 'stock'
+            min_obs (int): universe='stock'일 때 추정 기간 중 최소 관측 월 수
+                (end_date 월에 편입된 종목 중 이보다 관측치가 적은 종목은 제외)
+            cov_method (str, optional): 공분산 추정 방식 (covariance.COV_METHODS 참고).
+                None이면 sector는 'sample', stock은 'ledoit_wolf'
+            cov_options (dict, optional): 추정 방식별 옵션 (예: {'halflife': 24}, {'n_factors': 3})
         """
-        self.df = final()
+        if universe not in ('sector', 'stock'):
+            raise ValueError(f"지원하지 않는 universe입니다: {universe} ('sector' 또는 'stock')")
+        if cov_method is None:
+            cov_method = 'sample' if universe == 'sector' else 'ledoit_wolf'
+        if cov_method not in COV_METHODS:
+            raise ValueError(f"지원하지 않는 cov_method입니다: {cov_method} ({', '.join(COV_METHODS)})")
+
+        self.universe = universe
+        self.cov_method = cov_method
+        self.cov_options = cov_options or {}
+        self.min_obs = min_obs
+        self.df = final() if universe == 'sector' else stock_panel()
         self.start_date = start_date
         self.end_date = end_date
+        self._params = None
+
+    # 섹터 코드 순서 (공분산 행렬의 인덱스 검증용)
+    expected_index = [10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
+
+    def _window_block(self):
+        """
+        추정 기간을 정렬된 DatetimeIndex로 한 번만 슬라이싱하고,
+        (date × gsector) 형태로 한 번만 피벗합니다.
+
+        Returns:
+            pd.DataFrame: columns가 (값 종류, gsector) MultiIndex인 T×(4·N) 블록
+        """
+        panel = self.df.set_index('date').sort_index()
+        window = panel.loc[self.start_date:self.end_date]
+
+        block = window.pivot_table(
+            index=window.index,
+            columns='gsector',
+            values=['sector_excess_return', 'sector_return', 'sector_prevmktcap', 'sector_mktcap'],
+        )
+        return block
+
+    def _check_sigma(self, sigma):
+        # 공분산 행렬의 인덱스가 정해진 순서와 일치하지 않는다면 에러 발생
+        expected_index = self.expected_index
+        if not isinstance(sigma, pd.DataFrame):
+            raise TypeError("sigma[0] must be a pandas DataFrame (covariance matrix)")
+
+        if list(sigma.index) != expected_index or list(sigma.columns) != expected_index:
+            raise ValueError(
+                f"Covariance matrix index/columns mismatch.\n"
+                f"Expected: {expected_index}\n"
+                f"Got index: {list(sigma.index)}\n"
+                f"Got columns: {list(sigma.columns)}"
+            )
+
+    def _cov(self, values, index):
+        """
+        T×N 블록의 공분산을 self.cov_method 방식으로 추정합니다.
+        ('sample'은 ddof=1 표본공분산, 결측치가 있으면 pandas의 pairwise 공분산)
+
+        Returns:
+            tuple: (sigma, factor, shrinkage)
+                - sigma (pd.DataFrame): N×N 공분산 행렬
+                - factor (FactorCovariance or None): Woodbury 풀이용 팩터 표현
+                - shrinkage (float or None): Ledoit-Wolf 축소 강도
+        """
+        est = estimate_covariance(values, self.cov_method, **self.cov_options)
+        sigma = pd.DataFrame(est['sigma'], index=index, columns=index)
+        return sigma, est['factor'], est['shrinkage']
+
+    def compute_all(self):
+        """
+        Compute every BL market input from a single filtered window
+
+        The estimation window is sliced once and pivoted once into a dense
+        T×N NumPy block; Σ, Σ_opt, μ, λ, w_mkt and π are all derived from it.
+        Results are cached on the instance, so the making_*() methods below
+        are cheap accessors after the first call.
+
+        Returns:
+            dict: {
+                'sigma': Covariance of excess returns (pd.DataFrame, N×N),
+                'sigma_for_optimize': Covariance of raw returns (pd.DataFrame, N×N),
+                'mu': Mean excess returns (pd.Series, N),
+                'w_mkt': Market cap weights as of end_date (pd.Series, N),
+                'lambda': Market risk aversion coefficient (float),
+                'pi': Equilibrium excess returns (np.ndarray, N),
+                'sectors': Sector codes in order (list),
+                'sigma_factor', 'sigma_for_optimize_factor': FactorCovariance or None,
+                'cov_method': Covariance backend used (str)
+            }
+        """
+        if self._params is not None:
+            return self._params
+
+        if self.universe == 'stock':
+            self._params = self._compute_all_stock()
+            return self._params
+
+        block = self._window_block()
+        sectors = block['sector_excess_return'].columns.tolist()
+
+        excess = block['sector_excess_return'].to_numpy(dtype=float)
+        ret = block['sector_return'].to_numpy(dtype=float)
+        prevcap = block['sector_prevmktcap'].to_numpy(dtype=float)
+        mktcap = block['sector_mktcap'].to_numpy(dtype=float)
+
+        # Σ, Σ_opt
+        index = pd.Index(sectors, name='gsector')
+        sigma, sigma_factor, _ = self._cov(excess, index)
+        sigma_for_optimize, sigma_for_optimize_factor, _ = self._cov(ret, index)
+        self._check_sigma(sigma)
+        self._check_sigma(sigma_for_optimize)
+
+        # μ (참고용)
+        with np.errstate(invalid='ignore'):
+            mu = pd.Series(np.nanmean(excess, axis=0), index=pd.Index(sectors, name='gsector'), name='sector_excess_return')
+
+        # λ = E[R_m - R_f] / Var(R_m)  (시총가중 시장 수익률)
+        total_mktcap = np.nansum(prevcap, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            total_excess_return = np.where(total_mktcap != 0, np.nansum(excess * prevcap, axis=1) / total_mktcap, np.nan)
+            total_return = np.where(total_mktcap != 0, np.nansum(ret * prevcap, axis=1) / total_mktcap, np.nan)
+        lambda_mkt = np.nanmean(total_excess_return) / np.nanvar(total_return, ddof=1)
+
+        # w_mkt: end_date가 속한 월의 시가총액 비중
+        end_period = pd.Timestamp(self.end_date).to_period('M')
+        end_rows = np.flatnonzero(block.index.to_period('M') == end_period)
+        if len(end_rows) == 0:
+            raise ValueError(f"{end_period} 월의 시가총액 데이터가 없습니다.")
+        end_mktcap = mktcap[end_rows[-1]]
+
+        # 계산의 정확성을 위해 gsector가 11개인지 확인
+        n_valid = int(np.count_nonzero(~np.isnan(end_mktcap)))
+        if n_valid != len(self.expected_index):
+            raise ValueError(f"gsector의 고유값 개수가 11이 아닙니다. (현재 {n_valid}개)")
+
+        w_mkt = pd.Series(end_mktcap / end_mktcap.sum(), index=pd.Index(sectors, name='gsector'), name='sector_mktcap')
+
+        # π = λ × Σ × w_mkt
+        pi = lambda_mkt * sigma.values @ w_mkt.values
+
+        self._params = {
+            'sigma': sigma,
+            'sigma_for_optimize': sigma_for_optimize,
+            'mu': mu,
+            'w_mkt': w_mkt,
+            'lambda': lambda_mkt,
+            'pi': pi,
+            'sectors': sectors,
+            'sigma_factor': sigma_factor,
+            'sigma_for_optimize_factor': sigma_for_optimize_factor,
+            'cov_method': self.cov_method,
+            'universe': 'sector',
+        }
+        return self._params
+
+    def _compute_all_stock(self):
+        """
+        종목 단위 (universe='stock') 시장 파라미터
+
+        120개월 표본으로 ~500 종목의 표본공분산은 특이행렬이 되므로
+        Σ, Σ_opt는 기본적으로 Ledoit-Wolf 축소 공분산을 사용합니다. (cov_method로 변경 가능)
+        λ는 섹터 모드와 같은 시총가중 시장 수익률로 계산합니다.
+
+        Returns:
+            dict: compute_all()과 같은 키. 'sectors'에는 종목 코드(Ticker)가 들어가며,
+                'gsector' (Ticker → GICS 코드)와 'shrinkage' (Σ, Σ_opt의 Ledoit-Wolf 축소 강도)가 추가됨
+        """
+        panel = self.df.set_index('date').sort_index()
+        window = panel.loc[self.start_date:self.end_date]
+
+        # 대상 종목: end_date 월에 편입되어 있고 관측치가 min_obs개 이상인 종목
+        end_period = pd.Timestamp(self.end_date).to_period('M')
+        end_rows = window[window.index.to_period('M') == end_period]
+        end_rows = end_rows.dropna(subset=['MthCap']).drop_duplicates('Ticker', keep='last').set_index('Ticker')
+        if end_rows.empty:
+            raise ValueError(f"{end_period} 월의 종목 데이터가 없습니다.")
+
+        excess_block = window.pivot_table(index=window.index, columns='Ticker', values='excess_return', observed=True)
+        counts = excess_block.count()
+        tickers = [t for t in end_rows.index if counts.get(t, 0) >= self.min_obs]
+        if len(tickers) < 2:
+            raise ValueError(f"관측치가 {self.min_obs}개월 이상인 종목이 부족합니다. (현재 {len(tickers)}개)")
+        tickers = sorted(tickers)
+
+        ret_block = window.pivot_table(index=window.index, columns='Ticker', values='MthRet', observed=True)
+        excess = excess_block[tickers].to_numpy(dtype=float)
+        ret = ret_block.reindex(index=excess_block.index, columns=tickers).to_numpy(dtype=float)
+
+        index = pd.Index(tickers, name='Ticker')
+        sigma, sigma_factor, delta_sigma = self._cov(excess, index)
+        sigma_for_optimize, sigma_for_optimize_factor, delta_opt = self._cov(ret, index)
+
+        with np.errstate(invalid='ignore'):
+            mu = pd.Series(np.nanmean(excess, axis=0), index=index, name='excess_return')
+
+        # λ = E[R_m - R_f] / Var(R_m)  (전 종목 시총가중 시장 수익률)
+        weighted = window.assign(
+            _ret_x_cap_1=window['excess_return'] * window['prev_MthCap'],
+            _ret_x_cap_2=window['MthRet'] * window['prev_MthCap'],
+        )
+        agg = weighted.groupby(level=0).agg(
+            total_mktcap=('prev_MthCap', 'sum'),
+            ret_x_cap_1_sum=('_ret_x_cap_1', 'sum'),
+            ret_x_cap_2_sum=('_ret_x_cap_2', 'sum'),
+        )
+        mask = agg['total_mktcap'] != 0
+        total_excess_return = agg['ret_x_cap_1_sum'].div(agg['total_mktcap']).where(mask)
+        total_return = agg['ret_x_cap_2_sum'].div(agg['total_mktcap']).where(mask)
+        lambda_mkt = total_excess_return.mean() / total_return.var()
+
+        # w_mkt: end_date 월 시가총액 비중 (대상 종목 기준)
+        end_mktcap = end_rows.loc[tickers, 'MthCap'].astype(float)
+        w_mkt = pd.Series(end_mktcap.values / end_mktcap.sum(), index=index, name='MthCap')
+
+        # π = λ × Σ × w_mkt
+        pi = lambda_mkt * sigma.values @ w_mkt.values
+
+        return {
+            'sigma': sigma,
+            'sigma_for_optimize': sigma_for_optimize,
+            'mu': mu,
+            'w_mkt': w_mkt,
+            'lambda': lambda_mkt,
+            'pi': pi,
+            'sectors': tickers,
+            'gsector': end_rows.loc[tickers, 'gsector'].rename('gsector'),
+            'shrinkage': (delta_sigma, delta_opt),
+            'sigma_factor': sigma_factor,
+            'sigma_for_optimize_factor': sigma_for_optimize_factor,
+            'cov_method': self.cov_method,
+            'universe': 'stock',
+        }
 
     def making_mu(self):
         """
@@ -59,9 +296,7 @@ class Market_Params:
         Returns:
             pd.Series: Mean excess returns by sector (N×1)
         """
-        filtered_df = self.df[(self.df['date'] >= self.start_date) & (self.df['date'] <= self.end_date)].copy()
-        mu = filtered_df.groupby('gsector')['sector_excess_return'].mean()
-        return mu
+        return self.compute_all()['mu']
 
     def making_sigma(self):
         """
@@ -71,56 +306,23 @@ class Market_Params:
             Σ_ij = Cov(R_i - R_f, R_j - R_f)
                  = 1/(T-1) × Σ_t[(R_i,t - μ_i)(R_j,t - μ_j)]
 
-        Uses sample covariance (Pandas .cov() with ddof=1)
+        Uses sample covariance (ddof=1) by default; see cov_method for the
+        Ledoit-Wolf, EWMA and k-factor alternatives
 
         Returns:
             tuple: (sigma, sectors)
                 - sigma (pd.DataFrame): Covariance matrix (N×N)
                 - sectors (list): Sector codes in order
         """
-        filtered_df = self.df[(self.df['date'] >= self.start_date) & (self.df['date'] <= self.end_date)].copy()
-        pivot_filtered_df = filtered_df.pivot_table(index='date', columns='gsector', values='sector_excess_return')
-        sigma = pivot_filtered_df.cov()
-        sectors = sigma.columns.tolist()
+        params = self.compute_all()
+        return params['sigma'], params['sectors']
 
-        # 공분산 행렬의 인덱스가 정해진 순서와 일치하지 않는다면 에러 발생
-        expected_index = [10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
-        if not isinstance(sigma, pd.DataFrame):
-            raise TypeError("sigma[0] must be a pandas DataFrame (covariance matrix)")
-
-        if list(sigma.index) != expected_index or list(sigma.columns) != expected_index:
-            raise ValueError(
-                f"Covariance matrix index/columns mismatch.\n"
-                f"Expected: {expected_index}\n"
-                f"Got index: {list(sigma.index)}\n"
-                f"Got columns: {list(sigma.columns)}"
-            )
-
-        return sigma, sectors
-    
     def making_sigma_for_optimize(self):
         '''
         샤프 최적화 시의 샤프비율 분모용 공분산
         '''
-        filtered_df = self.df[(self.df['date'] >= self.start_date) & (self.df['date'] <= self.end_date)].copy()
-        pivot_filtered_df = filtered_df.pivot_table(index='date', columns='gsector', values='sector_return')
-        sigma_for_optimize = pivot_filtered_df.cov()
-        sectors = sigma_for_optimize.columns.tolist()
-
-        # 공분산 행렬의 인덱스가 정해진 순서와 일치하지 않는다면 에러 발생
-        expected_index = [10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
-        if not isinstance(sigma_for_optimize, pd.DataFrame):
-            raise TypeError("sigma[0] must be a pandas DataFrame (covariance matrix)")
-
-        if list(sigma_for_optimize.index) != expected_index or list(sigma_for_optimize.columns) != expected_index:
-            raise ValueError(
-                f"Covariance matrix index/columns mismatch.\n"
-                f"Expected: {expected_index}\n"
-                f"Got index: {list(sigma_for_optimize.index)}\n"
-                f"Got columns: {list(sigma_for_optimize.columns)}"
-            )
-
-        return sigma_for_optimize, sectors
+        params = self.compute_all()
+        return params['sigma_for_optimize'], params['sectors']
 
     def making_w_mkt(self, sigma_sectors):
         """
@@ -139,35 +341,21 @@ class Market_Params:
                 - w_mkt (pd.Series): Market cap weights (N×1)
                 - sectors (list): Sector codes in order
         """
-        end_month_str = self.end_date.strftime('%Y-%m')
-        filtered_df = self.df[self.df['date'].dt.strftime('%Y-%m') == end_month_str].copy()
-
-        # 계산의 정확성을 위해 gsector가 11개인지 확인하고 인덱스로 설정
-        if len(filtered_df['gsector'].unique()) == 11:
-            filtered_df = filtered_df.set_index('gsector')
-        else:
-            raise ValueError(f"gsector의 고유값 개수가 11이 아닙니다. (현재 {len(filtered_df['gsector'].unique())}개)")
+        w_mkt = self.compute_all()['w_mkt']
 
-        total_mkt_cap = filtered_df['sector_mktcap'].sum()
-        
-        # 시장 가중치 계산
-        w_mkt = filtered_df['sector_mktcap'] / total_mkt_cap
-        
         # 계산의 정확성을 위해 w_mkt.index와 sigma_sectors 리스트 비교
-        if (w_mkt.index == sigma_sectors).all():
-            pass
-        else:
+        if list(w_mkt.index) != list(sigma_sectors):
             raise ValueError(
                 f"w_mkt.index와 sectors가 일치하지 않습니다.\n"
                 f"w_mkt.index: {w_mkt.index}\n"
                 f"sectors: {sigma_sectors}"
             )
-        
+
         # 섹터 반환
         sectors = w_mkt.index.tolist()
 
         return w_mkt, sectors
-    
+
     def making_lambda(self):
         """
         Calculate market risk aversion coefficient (λ)
@@ -186,28 +374,7 @@ class Market_Params:
         Returns:
             float: Market risk aversion coefficient (lambda)
         """
-        filtered_df = self.df[(self.df['date'] >= self.start_date) & (self.df['date'] <= self.end_date)].copy()
-
-        # 시총가중 수익률 생성
-        filtered_df["_ret_x_cap_1"] = filtered_df["sector_excess_return"] * filtered_df["sector_prevmktcap"] # excess_return
-        filtered_df["_ret_x_cap_2"] = filtered_df["sector_return"] * filtered_df["sector_prevmktcap"] # 그냥 수익률
-        agg = (
-            filtered_df.groupby("date", dropna=False)
-                .agg(total_mktcap=("sector_prevmktcap", "sum"),
-                    ret_x_cap_1_sum=("_ret_x_cap_1", "sum"),
-                    ret_x_cap_2_sum=("_ret_x_cap_2", "sum"))
-                .reset_index()
-        )
-        mask = agg["total_mktcap"] != 0
-        agg["total_excess_return"] = agg["ret_x_cap_1_sum"].div(agg["total_mktcap"]).where(mask)
-        agg["total_return"]        = agg["ret_x_cap_2_sum"].div(agg["total_mktcap"]).where(mask)
-        agg = agg.drop(columns=["ret_x_cap_1_sum", "ret_x_cap_2_sum"])  # 중간열 제거
-
-        # λ (lambda) 계산
-        ret_mean = agg['total_excess_return'].mean()  # E[R_m - R_f]
-        ret_variance = agg['total_return'].var()      # Var(R_m)
-        lambda_mkt = ret_mean / ret_variance
-        return lambda_mkt
+        return self.compute_all()['lambda']
 
     def making_pi(self):
         """
@@ -231,9 +398,4 @@ class Market_Params:
         Returns:
             np.ndarray: Equilibrium excess returns vector (N×1)
         """
-        sigma = self.making_sigma()
-        w_mkt = self.making_w_mkt(sigma[1])
-        lambda_mkt = self.making_lambda()  # 변수명 변경: delta → lambda_mkt
-        pi = lambda_mkt * sigma[0].values @ w_mkt[0]
-
-        return pi
\ No newline at end of file
+        return self.compute_all()['pi']
@@ -0,0 +1,210 @@
+import pandas as pd
+import numpy as np
+
+from aiportfolio.BL_MVO.prepare.sector_excess_return import final
+from aiportfolio.BL_MVO.BL_params.market_params import Market_Params
+
+# python -m aiportfolio.BL_MVO.BL_params.rolling_params
+
+# W: 윈도우 개수 (forecast_date 개수)
+# T: 전체 월 수
+# N: 자산 개수 (11 GICS sectors)
+
+def _prefix_moments(values):
+    """
+    T×N 블록의 누적 합/누적 교차곱을 계산합니다.
+
+    공분산은 평행이동에 불변이므로 전체 평균을 먼저 빼서 누적합의 상쇄 오차를 줄입니다.
+    결측치는 0으로 두고, 결측 개수의 누적합을 따로 보관해 해당 윈도우를 식별합니다.
+
+    Returns:
+        tuple: (S1, S2, nan_count)
+            - S1 (np.ndarray): (T+1)×N 누적합
+            - S2 (np.ndarray): (T+1)×N×N 누적 교차곱
+            - nan_count (np.ndarray): (T+1,) 행별 결측 여부의 누적합
+    """
+    T, N = values.shape
+    nan_rows = np.isnan(values).any(axis=1)
+
+    with np.errstate(invalid='ignore'):
+        center = np.nanmean(values, axis=0)
+    centered = np.where(np.isnan(values), 0.0, values - np.nan_to_num(center))
+
+    S1 = np.zeros((T + 1, N))
+    S2 = np.zeros((T + 1, N, N))
+    np.cumsum(centered, axis=0, out=S1[1:])
+    np.cumsum(centered[:, :, None] * centered[:, None, :], axis=0, out=S2[1:])
+
+    nan_count = np.concatenate([[0], np.cumsum(nan_rows)])
+    return S1, S2, nan_count
+
+def _window_cov(values, S1, S2, nan_count, a, b):
+    """
+    [a, b) 구간의 표본공분산 (ddof=1).
+    결측치가 섞인 구간만 pandas pairwise 공분산으로 직접 계산합니다.
+    """
+    if nan_count[b] - nan_count[a] > 0:
+        return pd.DataFrame(values[a:b]).cov().to_numpy()
+
+    n = b - a
+    s = S1[b] - S1[a]
+    return (S2[b] - S2[a] - np.outer(s, s) / n) / (n - 1)
+
+def _window_mean_var(series, a_idx, b_idx):
+    """
+    1차원 시계열의 [a, b) 구간별 평균과 분산(ddof=1)을 누적합으로 한 번에 계산합니다. (NaN 제외)
+    """
+    valid = ~np.isnan(series)
+    with np.errstate(invalid='ignore'):
+        center = np.nanmean(series)
+    x = np.where(valid, series - center, 0.0)
+
+    cnt = np.concatenate([[0], np.cumsum(valid)])
+    s1 = np.concatenate([[0.0], np.cumsum(x)])
+    s2 = np.concatenate([[0.0], np.cumsum(x * x)])
+
+    n = cnt[b_idx] - cnt[a_idx]
+    s = s1[b_idx] - s1[a_idx]
+    ss = s2[b_idx] - s2[a_idx]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s / n + center
+        var = (ss - s * s / n) / (n - 1)
+    return mean, var
+
+def rolling_market_params(rolling_dates, df=None):
+    """
+    Compute BL market parameters for every rolling window in one call
+
+    get_rolling_dates()가 만든 (start_date, end_date) 윈도우 전체에 대해
+    Σ, Σ_opt, λ, w_mkt, π를 한 번에 계산합니다.
+    T×N 수익률 블록을 한 번만 만들고, 누적 합/교차곱의 차분으로
+    각 윈도우에 들어오고 나가는 월만 반영하므로 윈도우당 비용은 O(N²)입니다.
+
+    Formula:
+        Σ_w = [ΣΣ_t x_t x_t^T - (Σ_t x_t)(Σ_t x_t)^T / n] / (n - 1)
+        λ_w = E_w[R_m - R_f] / Var_w(R_m)
+        π_w = λ_w × Σ_w × w_mkt,w
+
+    Args:
+        rolling_dates (list): get_rolling_dates()의 반환값
+        df (pd.DataFrame, optional): final()의 섹터 패널 (None이면 캐시에서 로드)
+
+    Returns:
+        dict: {
+            'forecast_date': list of forecast dates (W),
+            'sigma': np.ndarray (W×N×N),
+            'sigma_for_optimize': np.ndarray (W×N×N),
+            'mu': np.ndarray (W×N),
+            'lambda': np.ndarray (W,),
+            'w_mkt': np.ndarray (W×N),
+            'pi': np.ndarray (W×N),
+            'sectors': list of sector codes (N)
+        }
+    """
+    if df is None:
+        df = final()
+
+    panel = df.set_index('date').sort_index()
+    block = panel.pivot_table(
+        index=panel.index,
+        columns='gsector',
+        values=['sector_excess_return', 'sector_return', 'sector_prevmktcap', 'sector_mktcap'],
+    )
+    sectors = block['sector_excess_return'].columns.tolist()
+
+    if sectors != Market_Params.expected_index:
+        raise ValueError(
+            f"Sector panel columns mismatch.\n"
+            f"Expected: {Market_Params.expected_index}\n"
+            f"Got: {sectors}"
+        )
+
+    dates = block.index
+    excess = block['sector_excess_return'].to_numpy(dtype=float)
+    ret = block['sector_return'].to_numpy(dtype=float)
+    prevcap = block['sector_prevmktcap'].to_numpy(dtype=float)
+    mktcap = block['sector_mktcap'].to_numpy(dtype=float)
+
+    # 윈도우 경계 (정렬된 날짜 인덱스에서 이분 탐색)
+    starts = pd.DatetimeIndex([p['start_date'] for p in rolling_dates])
+    ends = pd.DatetimeIndex([p['end_date'] for p in rolling_dates])
+    a_idx = dates.searchsorted(starts, side='left')
+    b_idx = dates.searchsorted(ends, side='right')
+
+    if np.any(b_idx - a_idx < 2):
+        raise ValueError("공분산을 계산하기에 윈도우의 관측치가 부족합니다.")
+
+    # Σ, Σ_opt
+    ex_S1, ex_S2, ex_nan = _prefix_moments(excess)
+    rt_S1, rt_S2, rt_nan = _prefix_moments(ret)
+    sigma = np.stack([_window_cov(excess, ex_S1, ex_S2, ex_nan, a, b) for a, b in zip(a_idx, b_idx)])
+    sigma_for_optimize = np.stack([_window_cov(ret, rt_S1, rt_S2, rt_nan, a, b) for a, b in zip(a_idx, b_idx)])
+
+    # μ (참고용)
+    with np.errstate(invalid='ignore'):
+        mu = np.stack([np.nanmean(excess[a:b], axis=0) for a, b in zip(a_idx, b_idx)])
+
+    # λ: 월별 시총가중 시장 수익률을 한 번 계산한 뒤 윈도우별 평균/분산
+    total_mktcap = np.nansum(prevcap, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total_excess_return = np.where(total_mktcap != 0, np.nansum(excess * prevcap, axis=1) / total_mktcap, np.nan)
+        total_return = np.where(total_mktcap != 0, np.nansum(ret * prevcap, axis=1) / total_mktcap, np.nan)
+    excess_mean, _ = _window_mean_var(total_excess_return, a_idx, b_idx)
+    _, return_var = _window_mean_var(total_return, a_idx, b_idx)
+    lambda_mkt = excess_mean / return_var
+
+    # w_mkt: 각 윈도우 end_date가 속한 월의 시가총액 비중
+    month_of = dates.to_period('M')
+    end_periods = ends.to_period('M')
+    end_rows = month_of.searchsorted(end_periods, side='right') - 1
+    if np.any(end_rows < 0) or np.any(month_of[end_rows] != end_periods):
+        raise ValueError("일부 end_date 월의 시가총액 데이터가 없습니다.")
+
+    end_mktcap = mktcap[end_rows]
+    n_valid = np.count_nonzero(~np.isnan(end_mktcap), axis=1)
+    if np.any(n_valid != len(sectors)):
+        raise ValueError(f"gsector의 고유값 개수가 11이 아닙니다. (현재 {n_valid.tolist()})")
+    w_mkt = end_mktcap / end_mktcap.sum(axis=1, keepdims=True)
+
+    # π = λ × Σ × w_mkt (윈도우 축으로 브로드캐스트)
+    pi = lambda_mkt[:, None] * np.einsum('wij,wj->wi', sigma, w_mkt)
+
+    return {
+        'forecast_date': [p['forecast_date'] for p in rolling_dates],
+        'sigma': sigma,
+        'sigma_for_optimize': sigma_for_optimize,
+        'mu': mu,
+        'lambda': lambda_mkt,
+        'w_mkt': w_mkt,
+        'pi': pi,
+        'sectors': sectors,
+    }
+
+def window_params(rolling, i):
+    """
+    rolling_market_params() 결과에서 i번째 윈도우를 Market_Params.compute_all()과
+    같은 형식의 딕셔너리로 꺼냅니다. (get_bl_outputs의 params 인자로 전달 가능)
+    """
+    sectors = pd.Index(rolling['sectors'], name='gsector')
+    return {
+        'sigma': pd.DataFrame(rolling['sigma'][i], index=sectors, columns=sectors),
+        'sigma_for_optimize': pd.DataFrame(rolling['sigma_for_optimize'][i], index=sectors, columns=sectors),
+        'mu': pd.Series(rolling['mu'][i], index=sectors, name='sector_excess_return'),
+        'w_mkt': pd.Series(rolling['w_mkt'][i], index=sectors, name='sector_mktcap'),
+        'lambda': float(rolling['lambda'][i]),
+        'pi': rolling['pi'][i],
+        'sectors': list(rolling['sectors']),
+        'sigma_factor': None,
+        'sigma_for_optimize_factor': None,
+        'cov_method': 'sample',
+        'universe': 'sector',
+    }
+
+if __name__ == "__main__":
+    from aiportfolio.util.making_rollingdate import get_rolling_dates
+
+    dates = get_rolling_dates(["24-05-31", "24-06-30", "24-07-31"])
+    result = rolling_market_params(dates)
+    print(result['lambda'])
+    print(result['pi'])
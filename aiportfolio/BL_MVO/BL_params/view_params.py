@@ -1,23 +1,26 @@
 import numpy as np
 import pandas as pd
 
-from aiportfolio.agents.Llama_config_수정중 import prepare_pipeline_obj
-from aiportfolio.agents.Llama_view_generator import generate_sector_views
-from aiportfolio.agents.converting_viewtomatrix import open_view_log, create_Q_vector, create_P_matrix
+from aiportfolio.BL_MVO.BL_batch import he_litterman_omega
+from aiportfolio.agents.converting_viewtomatrix import open_view_log, create_Q_vector, create_P_matrix, create_P_matrix_stock
 
-def get_view_params(sigma, tau, end_date, simul_name, Tier, model='llama'):
+def get_view_params(sigma, tau, end_date, simul_name, Tier, model='llama', stock_info=None, views_data=None):
     """
     This function calculates and returns the view-related parameters P, Q, and Omega.
 
     Args:
         sigma (pd.DataFrame): The covariance matrix of asset returns.
         tau (float): A scalar indicating the uncertainty in the prior estimate.
+        stock_info (dict, optional): universe='stock'일 때 {'gsector': Ticker → 섹터 코드, 'w_mkt': 시총 비중}.
+            지정하면 섹터 뷰를 종목 단위 sparse P 행렬로 변환
+        views_data (list, optional): 미리 생성한 뷰 (generate_sector_views_batch 결과).
+            지정하면 LLM 호출 없이 이 뷰를 사용
 
     Returns:
         tuple: A tuple containing P, Q, and Omega.
     """
-    # LLM으로 뷰 생성
-    if model == 'llama':
+    # LLM으로 뷰 생성 (미리 생성한 뷰가 있으면 생략)
+    if views_data is None and model == 'llama':
         # GPU 사용 가능 여부 확인 (Llama만 필요)
         import torch
         if not torch.cuda.is_available():
@@ -34,19 +37,23 @@ def get_view_params(sigma, tau, end_date, simul_name, Tier, model='llama'):
             print("="*80 + "\n")
             raise RuntimeError("GPU를 사용할 수 없어 프로그램을 중단합니다.")
 
-        pipeline_to_use = prepare_pipeline_obj()
-    else:
-        # Gemini는 pipeline 불필요
-        pipeline_to_use = None
+    # 파이프라인은 응답 캐시에 없을 때 generate_sector_views 안에서 로드 (Gemini는 불필요)
+    pipeline_to_use = None
 
-    generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model)
-    views_data = open_view_log(simul_name=simul_name, Tier=Tier, end_date=end_date)
+    if views_data is None:
+        # LLM 의존성(transformers/torch)은 뷰를 생성할 때만 로드 (BL/MVO 작업 프로세스는 불필요)
+        from aiportfolio.agents.Llama_view_generator import generate_sector_views
+        generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model)
+        views_data = open_view_log(simul_name=simul_name, Tier=Tier, end_date=end_date)
 
     if views_data is None:
         raise ValueError(f"Failed to load views data for end_date={end_date}")
 
     # --- Picking matrix (P) ---
-    P = create_P_matrix(views_data)
+    if stock_info is None:
+        P = create_P_matrix(views_data)
+    else:
+        P = create_P_matrix_stock(views_data, stock_info['gsector'], stock_info['w_mkt'])
 
     # --- View vector (Q) ---
     Q = create_Q_vector(views_data)
@@ -55,16 +62,11 @@ def get_view_params(sigma, tau, end_date, simul_name, Tier, model='llama'):
     # Calculate view uncertainty matrix (diagonal)
     # Formula: Ω_ii = τ × P_i × Σ × P_i^T
     # Reference: He & Litterman (1999)
-    num_views = P.shape[0]
-    Omega = np.zeros((num_views, num_views))
     sigma_np = sigma.values if isinstance(sigma, pd.DataFrame) else sigma
 
-    for i in range(num_views):
-        P_row = P[i, :]
-        p_sigma_pT = P_row @ sigma_np @ P_row.T
-        omega_i = tau * p_sigma_pT
-        Omega[i, i] = omega_i
-    Omega = Omega / 1
+    # sparse P (K×N)도 dense로 바꾸지 않고 PΣ (K×N) → PΣP^T (K×K) 순서로 곱함 (비용 O(nnz(P)·N))
+    # 모두 0인 P 행(매핑되지 않은 종목, 빈 섹터 등)은 Ω_ii = 1로 두어 Cholesky 풀이가 실패하지 않게 함
+    Omega = he_litterman_omega(sigma_np, P, tau)
 
     print('\n=== View Parameters ===')
     print('P (Picking Matrix):')
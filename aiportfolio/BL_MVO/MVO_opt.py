@@ -1,13 +1,313 @@
 import pandas as pd
 import numpy as np
+from scipy.linalg import cho_factor, cho_solve
 from scipy.optimize import minimize
 
+def _solve_eqp(mu, sigma, free, factor=None):
+    """
+    자유 변수(free)에 대해 min y^T·Σ·y  s.t. μ^T·y = 1 의 해를 구합니다. (나머지는 0)
+    factor (FactorCovariance)가 주어지면 Σ_FF 풀이를 Woodbury 항등식으로 O(N·k²)에 계산합니다.
+
+    Formula:
+        y_F = Σ_FF^(-1)·μ_F / (μ_F^T·Σ_FF^(-1)·μ_F)
+    """
+    y = np.zeros(len(mu))
+    if factor is not None:
+        z = factor.solve(mu[free], idx=free)
+    else:
+        z = cho_solve(cho_factor(sigma[np.ix_(free, free)]), mu[free])
+    y[free] = z / (mu[free] @ z)
+    return y
+
+def solve_tangency_active_set(mu, sigma, y0=None, active0=None, max_iter=None, tol=1e-12, factor=None):
+    """
+    Long-only tangency portfolio via the convex QP reformulation
+
+    Sharpe Ratio 최대화 (비볼록)를 다음의 볼록 QP로 바꾸어 풉니다.
+        min y^T·Σ·y   s.t.  μ^T·y = 1,  y ≥ 0
+        w = y / Σy_i
+    (μ_i > 0인 자산이 하나 이상 있어야 함)
+
+    1. 빠른 경로: 제약 없는 해 Σ^(-1)·μ 가 모두 0 이상이면 그대로 사용
+    2. 그 외: 해석적 기울기 2Σy 와 KKT 승수를 이용한 primal active-set 방법.
+       매 반복은 자유 변수 블록의 Cholesky 풀이(뉴턴 스텝) 한 번이며,
+       유한 차분이 필요 없고 결과가 결정적입니다.
+
+    Args:
+        mu (np.ndarray): 기대 초과수익률 (N,)
+        sigma (np.ndarray): 공분산 행렬 (N×N, 양의 정부호)
+        y0 (np.ndarray, optional): 시작점 (y0 ≥ 0, μ^T·y0 > 0; 스케일 무관). 0인 성분이 초기 active set
+        active0 (np.ndarray, optional): 초기 active set (N,) bool. 지정하면 해당 성분의 y0를 0으로 둠
+        max_iter (int, optional): 최대 반복 횟수 (기본 10·N)
+        tol (float): KKT 승수 허용 오차 (기울기 크기에 대한 상대값)
+        factor (FactorCovariance, optional): Σ의 팩터 표현. 주어지면 모든 풀이와 기울기를
+            N×N 행렬 없이 O(N·k²)로 계산 (sigma는 None이어도 됨)
+
+    Returns:
+        tuple: (w, active, n_iter)
+            - w (np.ndarray): 합이 1인 최적 가중치 (N,)
+            - active (np.ndarray): 하한(0)에 묶인 자산 여부 (N,) bool
+            - n_iter (int): 반복 횟수 (빠른 경로는 0)
+
+    Raises:
+        ValueError: μ_i > 0인 자산이 없는 경우 (long-only 탄젠트 포트폴리오가 정의되지 않음)
+    """
+    mu = np.asarray(mu, dtype=float).flatten()
+    if factor is None:
+        sigma = np.asarray(sigma, dtype=float)
+    n = len(mu)
+
+    if not np.any(mu > 0):
+        raise ValueError("기대수익률이 양수인 자산이 없어 long-only 탄젠트 포트폴리오를 구할 수 없습니다.")
+
+    if max_iter is None:
+        max_iter = 10 * n
+
+    # 1. 빠른 경로: 무제약 해가 이미 long-only
+    y = _solve_eqp(mu, sigma, np.ones(n, dtype=bool), factor)
+    if np.all(y >= 0):
+        return y / y.sum(), np.zeros(n, dtype=bool), 0
+
+    # 2. 시작점: 주어진 y0 (μ^T·y = 1 이 되도록 스케일) 또는 μ_i가 가장 큰 단일 자산
+    y = None
+    if y0 is not None:
+        y0 = np.clip(np.asarray(y0, dtype=float).flatten(), 0.0, None)
+        if active0 is not None:
+            y0 = np.where(np.asarray(active0, dtype=bool), 0.0, y0)
+        if mu @ y0 > 0:
+            y = y0 / (mu @ y0)
+    if y is None:
+        y = np.zeros(n)
+        best = int(np.argmax(mu))
+        y[best] = 1.0 / mu[best]
+    active = y <= 0
+
+    for n_iter in range(1, max_iter + 1):
+        free = ~active
+        y_star = _solve_eqp(mu, sigma, free, factor)
+        p = y_star - y
+
+        blocking = free & (p < 0)
+        ratios = np.full(n, np.inf)
+        ratios[blocking] = y[blocking] / -p[blocking]
+        j = int(np.argmin(ratios))
+
+        if ratios[j] < 1.0:
+            # 제약에 막힘: 막힌 지점까지 이동하고 해당 자산을 active set에 추가
+            y = y + ratios[j] * p
+            y[j] = 0.0
+            active[j] = True
+            continue
+
+        # 자유 블록의 최적점에 도달: KKT 승수 확인
+        y = y_star
+        grad = 2 * (factor.matvec(y) if factor is not None else sigma @ y)
+        nu = grad[free] @ y[free]          # μ^T·y = 1 이므로 ν = 2·y^T·Σ·y
+        lam = grad - nu * mu               # active 자산의 하한 제약 승수 (≥ 0 이어야 최적)
+        lam[free] = np.inf
+
+        k = int(np.argmin(lam))
+        if lam[k] >= -tol * np.max(np.abs(grad)):
+            return y / y.sum(), active, n_iter
+
+        active[k] = False
+
+    raise RuntimeError(f"active-set 탄젠트 최적화가 {max_iter}회 안에 수렴하지 않았습니다.")
+
+def critical_line(mu, sigma, tol=1e-10):
+    """
+    Long-only efficient frontier corner portfolios (Critical Line Algorithm)
+
+    제약 Σw_i = 1, 0 ≤ w_i ≤ 1 하에서 효율적 투자선의 모든 꺾임점(corner portfolio)을
+    한 번의 매개변수 추적으로 구합니다. 두 꺾임점 사이에서는 가중치가 λ에 대해
+    선형이므로, 인접한 꺾임점의 볼록결합이 정확히 효율적 투자선이 됩니다.
+
+    Theoretical Foundation:
+        Markowitz (1956) "The Optimization of a Quadratic Function Subject to Linear Constraints"
+        Bailey & López de Prado (2013) "An Open-Source Implementation of the Critical-Line Algorithm"
+
+    매 꺾임점마다 자유 자산 블록의 Cholesky 분해 한 번만 필요하며 (편입 후보는 그 분해에
+    한 행/열을 덧붙인 Schur 보수로 풀이), 점의 개수와 무관하게 꺾임점 수(≤ 2N 정도)만큼만 계산합니다.
+
+    Args:
+        mu (np.ndarray): 기대수익률 (N,)
+        sigma (np.ndarray): 공분산 행렬 (N×N)
+        tol (float): 수치 오차 허용치
+
+    Returns:
+        tuple: (weights, lambdas)
+            - weights (np.ndarray): 꺾임점 가중치 (C×N), 최대 수익률 → 최소 분산 순
+            - lambdas (np.ndarray): 각 꺾임점의 위험 허용 계수 λ (C,), 마지막은 0 (최소 분산)
+    """
+    mu = np.asarray(mu, dtype=float).flatten()
+    sigma = np.asarray(sigma, dtype=float)
+    n = len(mu)
+    lb, ub = np.zeros(n), np.ones(n)
+
+    # 모든 μ가 같으면 λ가 정의되지 않음 → 투자선은 최소 분산 포트폴리오 한 점
+    if np.ptp(mu) < tol:
+        w_mv, _, _ = solve_tangency_active_set(np.ones(n), sigma)
+        return w_mv.reshape(1, -1), np.array([0.0])
+
+    # 초기 해: 기대수익률이 큰 순서대로 상한까지 채움 → 마지막 자산만 자유 변수
+    w = lb.copy()
+    order = np.argsort(-mu, kind='stable')
+    free = []
+    for i in order:
+        w[i] = ub[i]
+        if w.sum() >= 1:
+            w[i] += 1 - w.sum()
+            free = [int(i)]
+            break
+
+    def bounded(F):
+        mask = np.ones(n, dtype=bool)
+        mask[F] = False
+        return np.flatnonzero(mask)
+
+    def free_solver(F):
+        # 자유 자산 블록 Σ_FF의 Cholesky 분해 (꺾임점마다 한 번)
+        factor = cho_factor(sigma[np.ix_(F, F)])
+        return lambda rhs: cho_solve(factor, rhs)
+
+    def bordered_solver(solve_F, F, i):
+        # F에 자산 i를 더한 블록의 풀이를 Σ_FF 분해와 Schur 보수로 계산 (재분해 없음)
+        #   [[A, b], [b^T, d]]·[x_F; x_i] = [r_F; r_i]
+        #   x_i = (r_i - b^T·A^(-1)·r_F) / (d - b^T·A^(-1)·b),  x_F = A^(-1)·r_F - A^(-1)·b·x_i
+        b = sigma[F, i]
+        u = solve_F(b)
+        schur = sigma[i, i] - b @ u
+
+        def solve(rhs):
+            x_F = solve_F(rhs[:-1])
+            x_i = (rhs[-1] - b @ x_F) / schur
+            return np.append(x_F - u * x_i, x_i)
+        return solve
+
+    def lambda_terms(F, w, solve):
+        # compute_lambda에 필요한 Σ_FF^(-1) 풀이 (자유 자산 집합마다 한 번)
+        B = bounded(F)
+        onesF = np.ones(len(F))
+        inv_ones = solve(onesF)
+        inv_mu = solve(mu[F])
+        l1 = w[B].sum()
+        l3 = solve(sigma[np.ix_(F, B)] @ w[B]) if len(B) else np.zeros(len(F))
+        return inv_ones, inv_mu, onesF @ inv_ones, onesF @ inv_mu, l1, onesF @ l3, l3
+
+    def compute_lambda(terms, j, bi):
+        # F의 j번째 자산이 경계값 bi에 닿는 λ
+        inv_ones, inv_mu, c1, c3, l1, l2, l3 = terms
+        c = -c1 * inv_mu[j] + c3 * inv_ones[j]
+        if abs(c) < tol:
+            return None, None
+        if isinstance(bi, tuple):
+            bi = bi[1] if c > 0 else bi[0]
+        return ((1 - l1 + l2) * inv_ones[j] - c1 * (bi + l3[j])) / c, bi
+
+    def compute_w(F, w, lam, solve):
+        # 자유 자산의 가중치 (λ에 대해 선형)
+        B = bounded(F)
+        onesF = np.ones(len(F))
+        inv_ones = solve(onesF)
+        inv_mu = solve(mu[F])
+        g1 = onesF @ inv_mu
+        g2 = onesF @ inv_ones
+        if len(B) == 0:
+            g = -lam * g1 / g2 + 1 / g2
+            w1 = np.zeros(len(F))
+        else:
+            g3 = w[B].sum()
+            w1 = solve(sigma[np.ix_(F, B)] @ w[B])
+            g4 = onesF @ w1
+            g = -lam * g1 / g2 + (1 - g3 + g4) / g2
+        return -w1 + g * inv_ones + lam * inv_mu
+
+    weights, lambdas = [w.copy()], [np.inf]
+    solve_free = free_solver(free)
+
+    for _ in range(4 * n + 10):
+        # case a) 자유 자산 하나가 경계에 닿음
+        l_in, i_in, bi_in = -np.inf, None, None
+        if len(free) > 1:
+            terms = lambda_terms(free, w, solve_free)
+            for j, i in enumerate(free):
+                lam, bi = compute_lambda(terms, j, (lb[i], ub[i]))
+                if lam is not None and lam > l_in:
+                    l_in, i_in, bi_in = lam, i, bi
+
+        # case b) 경계에 묶인 자산 하나가 자유로워짐 (현재 분해에 한 행/열을 덧붙여 풀이)
+        l_out, i_out = -np.inf, None
+        if len(free) < n:
+            for i in bounded(free):
+                F = free + [int(i)]
+                terms = lambda_terms(F, w, bordered_solver(solve_free, free, int(i)))
+                lam, _ = compute_lambda(terms, len(F) - 1, w[i])
+                if lam is not None and lam < lambdas[-1] - tol and lam > l_out:
+                    l_out, i_out = lam, int(i)
+
+        if l_in <= 0 and l_out <= 0:
+            # 최소 분산 포트폴리오 (λ = 0)
+            lam = 0.0
+        elif l_in > l_out:
+            lam = l_in
+            free.remove(i_in)
+            w[i_in] = bi_in
+        else:
+            lam = l_out
+            free.append(i_out)
+
+        solve_free = free_solver(free)
+        w[free] = compute_w(free, w, lam, solve_free)
+        weights.append(w.copy())
+        lambdas.append(lam)
+
+        if lam == 0.0:
+            break
+
+    weights = np.array(weights)
+    lambdas = np.array(lambdas)
+
+    # 수치 오차로 제약을 위반한 꺾임점과, 기대수익률이 단조 감소하지 않는 꺾임점 제거
+    valid = (np.abs(weights.sum(axis=1) - 1) < 1e-8) & np.all(weights >= -1e-8, axis=1) & np.all(weights <= 1 + 1e-8, axis=1)
+    weights, lambdas = weights[valid], lambdas[valid]
+
+    keep = [0]
+    for k in range(1, len(weights)):
+        if mu @ weights[k] <= mu @ weights[keep[-1]] + tol:
+            keep.append(k)
+
+    # 수익률이 같은 꺾임점은 분산이 더 작은 뒤쪽(λ가 작은 쪽)만 남김
+    strict = [keep[-1]]
+    for k in reversed(keep[:-1]):
+        if mu @ weights[k] > mu @ weights[strict[-1]] + tol:
+            strict.append(k)
+    strict.reverse()
+    weights, lambdas = np.clip(weights[strict], 0.0, 1.0), lambdas[strict]
+
+    return weights, lambdas
+
 class MVO_Optimizer:
-    def __init__(self, mu, sigma, sectors):
+    def __init__(self, mu, sigma, sectors, warm_start=None, sigma_factor=None):
+        """
+        Args:
+            mu (np.ndarray): 기대 초과수익률 (N×1 또는 N,)
+            sigma (pd.DataFrame or np.ndarray): 공분산 행렬 (N×N)
+            sectors (list): 섹터 리스트
+            warm_start (dict, optional): 이전 최적화의 warm_state
+                ({'weights': 가중치, 'active': active set}). 연속된 forecast_date나
+                τ 스윕처럼 해가 비슷한 문제에서 반복 횟수를 줄여줌
+            sigma_factor (FactorCovariance, optional): sigma의 팩터 표현
+                (Market_Params.compute_all()['sigma_for_optimize_factor']).
+                주어지면 탄젠트 최적화의 Σ 풀이를 Woodbury 항등식으로 계산
+        """
         self.mu = mu
         self.sigma = sigma
+        self.sigma_factor = sigma_factor
         self.SECTOR = sectors
         self.n_assets = len(sectors)
+        self.warm_start = warm_start
+        self.warm_state = None  # optimize_tangency_1 실행 후 다음 최적화의 warm_start로 사용
+        self._corners = None    # critical_line() 결과 캐시 (efficient_frontier 등에서 재사용)
 
     # 탄젠트 최적화 포트폴리오 
     def optimize_tangency(self):
@@ -15,8 +315,11 @@ class MVO_Optimizer:
         sigma = self.sigma
         SECTOR = self.SECTOR
 
-        sigma_inv = np.linalg.inv(sigma)
-        w_dir = sigma_inv @ mu_BL
+        if self.sigma_factor is not None:
+            w_dir = self.sigma_factor.solve(np.asarray(mu_BL, dtype=float))
+        else:
+            sigma_inv = np.linalg.inv(sigma)
+            w_dir = sigma_inv @ mu_BL
         w_tan = w_dir / np.sum(w_dir)
 
         print("w_tan:\n", pd.Series(w_tan.flatten(), index=SECTOR))
@@ -24,9 +327,9 @@ class MVO_Optimizer:
         return w_tan
 
     # 탄젠트 최적화 포트폴리오
-    def optimize_tangency_1(self, return_original=False):
+    def optimize_tangency_1(self, return_original=False, solver='active_set'):
         """
-        Optimize tangency portfolio using numerical optimization (SLSQP)
+        Optimize tangency portfolio (long-only maximum Sharpe ratio)
 
         Objective:
             Maximize Sharpe Ratio = (w^T·μ) / sqrt(w^T·Σ·w)
@@ -38,8 +341,14 @@ class MVO_Optimizer:
         Theoretical Foundation:
             Markowitz (1952) "Portfolio Selection"
 
+        Solvers:
+            'active_set': 볼록 QP (min y^T·Σ·y, μ^T·y = 1, y ≥ 0)의 active-set 해
+                          (solve_tangency_active_set 참고). μ_i > 0인 자산이 없으면 SLSQP로 대체
+            'slsqp': scipy SLSQP로 음의 Sharpe Ratio를 직접 최소화 (기존 방식)
+
         Args:
             return_original (bool): If True, return both original and rounded weights
+            solver (str): 'active_set' (기본값) 또는 'slsqp'
 
         Returns:
             If return_original=False:
@@ -74,26 +383,50 @@ class MVO_Optimizer:
                 return 0
             return portfolio_return / portfolio_volatility
 
-        # Define constraints
-        constraints = ({'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
+        if solver not in ('active_set', 'slsqp'):
+            raise ValueError(f"지원하지 않는 solver입니다: {solver} ('active_set' 또는 'slsqp')")
+
+        warm = self.warm_start or {}
+        warm_weights = warm.get('weights')
+        if warm_weights is not None and len(np.asarray(warm_weights).flatten()) != self.n_assets:
+            warm, warm_weights = {}, None  # 자산 구성이 다르면 warm start 무시
+
+        if solver == 'active_set':
+            try:
+                w_opt, active, n_iter = solve_tangency_active_set(
+                    self.mu, sigma, y0=warm_weights, active0=warm.get('active'), factor=self.sigma_factor
+                )
+                w_tan_original = w_opt.reshape(-1, 1)
+                self.warm_state = {'weights': w_opt, 'active': active, 'n_iter': n_iter}
+            except ValueError as e:
+                print(f"[경고] {e} SLSQP로 대체합니다.")
+                solver = 'slsqp'
 
-        # Define bounds for long-only constraint
-        bounds = tuple((0.0, None) for asset in range(self.n_assets))
+        if solver == 'slsqp':
+            # Define constraints
+            constraints = ({'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
 
-        # Initial guess for weights
-        initial_weights = np.ones(self.n_assets) / self.n_assets
+            # Define bounds for long-only constraint
+            bounds = tuple((0.0, None) for asset in range(self.n_assets))
 
-        # Perform the optimization
-        result = minimize(
-            objective_function,
-            initial_weights,
-            args=(self.mu, sigma),
-            method='SLSQP',
-            bounds=bounds,
-            constraints=constraints
-        )
+            # Initial guess for weights (warm start가 있으면 이전 해에서 시작)
+            if warm_weights is not None:
+                initial_weights = np.asarray(warm_weights, dtype=float).flatten()
+            else:
+                initial_weights = np.ones(self.n_assets) / self.n_assets
 
-        w_tan_original = result.x.reshape(-1, 1)
+            # Perform the optimization
+            result = minimize(
+                objective_function,
+                initial_weights,
+                args=(self.mu, sigma),
+                method='SLSQP',
+                bounds=bounds,
+                constraints=constraints
+            )
+
+            w_tan_original = result.x.reshape(-1, 1)
+            self.warm_state = {'weights': result.x, 'active': result.x <= 0, 'n_iter': int(result.nit)}
 
         # 1. 소수점 셋째 자리에서 반올림
         w_tan_rounded = np.round(w_tan_original, 3)
@@ -115,4 +448,106 @@ class MVO_Optimizer:
                 'sharpe_ratio_loss': float(sr_optimal - sr_rounded)
             }
         else:
-            return w_tan_normalized, SECTOR
\ No newline at end of file
+            return w_tan_normalized, SECTOR
+
+    def _corner_portfolios(self):
+        """
+        꺾임점 포트폴리오 (critical_line 결과)를 한 번만 계산해 재사용합니다.
+
+        Returns:
+            tuple: (weights (C×N), returns (C,), volatility (C,))
+        """
+        if self._corners is None:
+            mu = np.asarray(self.mu, dtype=float).flatten()
+            sigma = np.asarray(self.sigma, dtype=float)
+            weights, _ = critical_line(mu, sigma)
+            returns = weights @ mu
+            volatility = np.sqrt(np.einsum('ci,ij,cj->c', weights, sigma, weights))
+            self._corners = (weights, returns, volatility)
+        return self._corners
+
+    def efficient_frontier(self, n_points=100):
+        """
+        Long-only efficient frontier (Σw_i = 1, w_i ≥ 0)
+
+        Critical Line Algorithm으로 꺾임점을 한 번 구한 뒤, 최소 분산 포트폴리오의 수익률부터
+        최대 수익률까지 n_points개의 목표 수익률에서 인접 꺾임점을 선형 보간합니다.
+        (꺾임점 사이에서 효율적 포트폴리오는 정확히 선형이므로 근사가 아님)
+
+        Args:
+            n_points (int): 투자선 위의 점 개수
+
+        Returns:
+            dict: {
+                'returns': 기대수익률 (n_points,),
+                'volatility': 표준편차 (n_points,),
+                'weights': 가중치 (n_points×N),
+                'corner_weights': 꺾임점 가중치 (C×N),
+                'corner_returns': 꺾임점 기대수익률 (C,),
+                'corner_volatility': 꺾임점 표준편차 (C,),
+                'min_variance': 최소 분산 포트폴리오 가중치 (N,),
+                'sectors': 섹터 리스트
+            }
+        """
+        corner_w, corner_r, corner_v = self._corner_portfolios()
+        sigma = np.asarray(self.sigma, dtype=float)
+
+        targets = np.linspace(corner_r[-1], corner_r[0], n_points)
+        weights = np.array([self._interpolate_corners(t) for t in targets])
+        volatility = np.sqrt(np.einsum('pi,ij,pj->p', weights, sigma, weights))
+
+        return {
+            'returns': targets,
+            'volatility': volatility,
+            'weights': weights,
+            'corner_weights': corner_w,
+            'corner_returns': corner_r,
+            'corner_volatility': corner_v,
+            'min_variance': corner_w[-1],
+            'sectors': self.SECTOR,
+        }
+
+    def _interpolate_corners(self, target_return):
+        corner_w, corner_r, _ = self._corner_portfolios()
+
+        # corner_r은 내림차순 → 목표 수익률을 감싸는 인접 꺾임점 (k, k+1)을 찾음
+        if target_return >= corner_r[0]:
+            return corner_w[0]
+        if target_return <= corner_r[-1]:
+            return corner_w[-1]
+        k = int(np.searchsorted(-corner_r, -target_return, side='right')) - 1
+        k = min(max(k, 0), len(corner_r) - 2)
+        span = corner_r[k] - corner_r[k + 1]
+        a = 1.0 if span == 0 else (target_return - corner_r[k + 1]) / span
+        return a * corner_w[k] + (1 - a) * corner_w[k + 1]
+
+    def optimize_min_variance(self):
+        """
+        Long-only 최소 분산 포트폴리오 (efficient frontier의 마지막 꺾임점)
+
+        Returns:
+            tuple: (w_min (N×1), SECTOR)
+        """
+        corner_w, _, _ = self._corner_portfolios()
+        return corner_w[-1].reshape(-1, 1), self.SECTOR
+
+    def optimize_target_return(self, target_return):
+        """
+        목표 기대수익률을 달성하는 long-only 최소 분산 포트폴리오
+
+        Args:
+            target_return (float): 목표 기대수익률 (최소 분산 ~ 최대 수익률 범위)
+
+        Returns:
+            tuple: (w_target (N×1), SECTOR)
+
+        Raises:
+            ValueError: 목표 수익률이 달성 가능한 범위를 벗어난 경우
+        """
+        _, corner_r, _ = self._corner_portfolios()
+        if not (corner_r[-1] - 1e-12 <= target_return <= corner_r[0] + 1e-12):
+            raise ValueError(
+                f"목표 수익률 {target_return:.6f}이 효율적 투자선 범위 "
+                f"[{corner_r[-1]:.6f}, {corner_r[0]:.6f}]를 벗어났습니다."
+            )
+        return self._interpolate_corners(target_return).reshape(-1, 1), self.SECTOR
@@ -1,3 +1,8 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
@@ -38,18 +43,201 @@ def preprocess_rf_rate():
     
     return rf_monthly
 
-# ---------- 2) 최종 데이터프레임 ----------
-def final():
-    df = open_final_stock_months()
+# ---------- 2) 패널 캐시 ----------
+# final()은 Market_Params 생성, NONE_view 베이스라인, Tier1 지표 계산마다 호출되므로
+# 원천 파일의 지문(mtime, size, sha256)을 키로 하는 프로세스 캐시 + 디스크 캐시를 둔다.
+# 패널 이름별로 database/cache/{name}.parquet 와 {name}.meta.json 에 저장한다.
+# 메타에는 빌더 버전도 저장하므로, 집계 방식/스키마를 바꾸면 버전을 올려 이전 캐시를 무효화한다.
+SECTOR_PANEL_SOURCES = [
+    Path("database/final_stock_months.parquet"),
+    Path("database/DTB3.csv"),
+]
+PANEL_CACHE_DIR = Path("database/cache")
+
+_file_hash_memo = {}   # (path, mtime_ns, size) -> sha256
+_panel_memo = {}       # 패널 이름 -> (지문 키, 버전, 패널)
+
+# 패널별 빌더 버전 (빌더의 결과가 바뀌면 올림)
+SECTOR_PANEL_VERSION = 2   # 표준 dtype (int8 gsector 등)
+STOCK_PANEL_VERSION = 2    # 표준 dtype (int8 gsector 등)
+
+def file_fingerprint(path, known=None):
+    """
+    파일 지문 (경로, mtime_ns, size, sha256)을 반환합니다.
+    mtime/size가 바뀌지 않았다면 같은 프로세스 안에서 해시를 다시 계산하지 않습니다.
+    known에 캐시 메타에 저장해 둔 지문을 주면, 경로/mtime/size가 같을 때 저장된 해시를 그대로 사용합니다.
+    (새 프로세스에서도 파일 전체를 다시 읽지 않음)
+    """
+    stat = os.stat(path)
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+
+    if known and known.get('sha256') and (known.get('path'), known.get('mtime_ns'), known.get('size')) == key:
+        _file_hash_memo.setdefault(key, known['sha256'])
+
+    if key not in _file_hash_memo:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        _file_hash_memo[key] = sha.hexdigest()
+
+    return {
+        'path': str(path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': _file_hash_memo[key],
+    }
+
+def sector_panel_fingerprint():
+    """
+    섹터/종목 패널을 만드는 원천 파일들의 지문 목록을 반환합니다.
+    """
+    return [file_fingerprint(path) for path in SECTOR_PANEL_SOURCES]
+
+def fingerprint_key(fingerprint):
+    """지문 목록을 프로세스 캐시 키 (원천 파일 해시 튜플)로 바꿉니다."""
+    return tuple(item['sha256'] for item in fingerprint)
+
+def _cache_paths(name):
+    return PANEL_CACHE_DIR / f"{name}.parquet", PANEL_CACHE_DIR / f"{name}.meta.json"
+
+def _load_persisted_panel(name, fingerprint, version):
+    """
+    디스크 캐시의 빌더 버전과 지문이 모두 일치하는 경우에만 캐시된 패널을 읽습니다.
+    """
+    cache_path, meta_path = _cache_paths(name)
+    if not (cache_path.exists() and meta_path.exists()):
+        return None
+
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    # 버전이 없거나 다르면 이전 빌더가 만든 캐시
+    if meta.get('version') != version:
+        return None
+
+    # 해시가 같으면 mtime만 바뀐 경우(복사, 재다운로드)에도 캐시를 재사용
+    cached_hashes = [item.get('sha256') for item in meta.get('sources', [])]
+    if cached_hashes != [item['sha256'] for item in fingerprint]:
+        return None
+
+    try:
+        return pd.read_parquet(cache_path)
+    except Exception as e:
+        print(f"[경고] {name} 캐시를 읽지 못해 다시 계산합니다: {e}")
+        return None
+
+def _persist_panel(name, panel, fingerprint, version):
+    """
+    패널을 parquet로, 빌더 버전과 지문을 메타 JSON으로 저장합니다. (임시 파일 후 교체)
+    """
+    cache_path, meta_path = _cache_paths(name)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = cache_path.with_suffix('.parquet.tmp')
+        panel.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
 
-    # date 컬럼 생성 (각 연월의 말일)
-    df['date'] = pd.to_datetime(df['cyear'].astype(str) + '-' + df['cmonth'].astype(str)) + pd.offsets.MonthEnd(0)
+        tmp_meta = meta_path.with_suffix('.json.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'sources': fingerprint}, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_meta, meta_path)
+    except OSError as e:
+        print(f"[경고] {name} 캐시 저장 실패 (계산 결과는 그대로 사용): {e}")
+
+def cached_panel(name, builder, version):
+    """
+    원천 파일 지문과 빌더 버전이 같으면 프로세스 캐시 → 디스크 캐시 순으로 재사용하고,
+    원천 파일이나 버전이 바뀌면 builder()로 다시 만듭니다.
+    호출자가 반환값을 수정해도 캐시가 오염되지 않도록 항상 복사본을 반환합니다.
+    """
+    fingerprint = sector_panel_fingerprint()
+    key = fingerprint_key(fingerprint)
+
+    cached = _panel_memo.get(name)
+    if cached is None or cached[:2] != (key, version):
+        panel = _load_persisted_panel(name, fingerprint, version)
+        if panel is None:
+            panel = builder()
+            _persist_panel(name, panel, fingerprint, version)
+        _panel_memo[name] = (key, version, panel)  # 원천 파일이 바뀌었다면 이전 패널은 버림
+
+    return _panel_memo[name][2].copy()
+
+def _persisted_panel_names():
+    """
+    디스크에 저장된 패널 이름 목록. (_persist_panel이 쓴 메타, 즉 'version'이 있는 메타만 해당)
+    다른 프로세스에서 만든 패널 (tier1_features 등)도 포함하고, abnormal return 캐시는 제외합니다.
+    """
+    names = []
+    for meta_path in PANEL_CACHE_DIR.glob('*.meta.json'):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                is_panel = 'version' in json.load(f)
+        except (OSError, json.JSONDecodeError, TypeError):
+            continue
+        if is_panel:
+            names.append(meta_path.name[:-len('.meta.json')])
+    return names
+
+def clear_sector_panel_cache(remove_files=False):
+    """
+    프로세스 캐시를 비웁니다. remove_files=True이면 디스크에 저장된 패널 캐시도 모두 삭제합니다.
+    (cached_panel로 저장한 패널 전체가 대상, 어느 프로세스에서 만들었는지와 무관)
+    """
+    _panel_memo.clear()
+    if remove_files:
+        for name in _persisted_panel_names():
+            for path in _cache_paths(name):
+                if path.exists():
+                    path.unlink()
+
+# ---------- 3) 최종 데이터프레임 ----------
+def final(use_cache=True):
+    """
+    월별 섹터 패널 (date × gsector)을 반환합니다. (원천 파일이 바뀌면 자동으로 다시 집계)
+
+    Args:
+        use_cache (bool): False이면 캐시를 무시하고 항상 다시 집계
+
+    Returns:
+        pd.DataFrame: 섹터별 월간 초과수익률/수익률/시가총액 패널
+    """
+    if not use_cache:
+        return build_sector_panel()
+    return cached_panel('sector_panel', build_sector_panel, SECTOR_PANEL_VERSION)
+
+def stock_panel(use_cache=True):
+    """
+    월별 종목 패널 (date × Ticker)을 반환합니다. (종목 단위 BL/MVO용)
+
+    final()과 같은 S&P500 필터(전 월 편입 종목)와 무위험 수익률을 사용합니다.
+
+    Args:
+        use_cache (bool): False이면 캐시를 무시하고 항상 다시 계산
+
+    Returns:
+        pd.DataFrame: date, Ticker, gsector, MthRet, excess_return, MthCap, prev_MthCap
+    """
+    if not use_cache:
+        return build_stock_panel()
+    return cached_panel('stock_panel', build_stock_panel, STOCK_PANEL_VERSION)
+
+def _stock_level_frame():
+    """
+    전 월 S&P500 편입 종목의 월별 초과수익률과 전 월 시가총액을 계산합니다.
+    """
+    df = open_final_stock_months()  # date 컬럼 (각 연월의 말일) 포함
 
     # 전 월의 sp500에 해당하는 불리언 컬럼 추가
     df = df.sort_values(['Ticker', 'date']).copy()
-    df['sp500_lag1'] = df.groupby('Ticker')['sp500'].shift(1)
+    df['sp500_lag1'] = df.groupby('Ticker', observed=True)['sp500'].shift(1, fill_value=False)
 
-    df_sp = df[df['sp500_lag1']==1].copy()
+    df_sp = df[df['sp500_lag1']].copy()
 
     df_rf = preprocess_rf_rate()
 
@@ -61,7 +249,23 @@ def final():
 
     # 전 월의 시가총액을 매칭
     merged_df = merged_df.sort_values(['Ticker', 'date']).copy()
-    merged_df['prev_MthCap'] = merged_df.groupby('Ticker')['MthCap'].shift(1)
+    merged_df['prev_MthCap'] = merged_df.groupby('Ticker', observed=True)['MthCap'].shift(1)
+
+    return merged_df
+
+def build_stock_panel():
+    """
+    원천 파일로부터 월별 종목 패널을 직접 계산합니다. (캐시 미사용)
+    """
+    merged_df = _stock_level_frame()
+    columns = ['date', 'Ticker', 'gsector', 'MthRet', 'excess_return', 'MthCap', 'prev_MthCap']
+    return merged_df[columns].sort_values(['date', 'Ticker']).reset_index(drop=True)
+
+def build_sector_panel():
+    """
+    원천 파일로부터 월별 섹터 패널을 직접 집계합니다. (캐시 미사용)
+    """
+    merged_df = _stock_level_frame()
 
     # 가중수익률 계산
     merged_df["_ret_x_cap_1"] = merged_df["excess_return"] * merged_df["prev_MthCap"] # excess_return
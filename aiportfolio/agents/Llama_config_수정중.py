@@ -10,6 +10,19 @@ os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'expandable_segments:True'
 # 전역 파이프라인 캐시
 _pipeline_cache = None
 
+# 모델 식별자와 생성 파라미터 (LLM 응답 캐시 키에도 사용)
+LLAMA_MODEL_ID = "meta-llama/Meta-Llama-3-8B-Instruct"
+LLAMA_GENERATION_PARAMS = {
+    'max_new_tokens': 12288,  # 8192 → 12288 (5개 뷰 JSON + 여유분, 각 뷰당 약 600 토큰)
+    'do_sample': True,
+    'temperature': 0.2,       # 0.6 → 0.3 (JSON 구조 유지를 위해 낮춤)
+    'top_p': 0.80,            # 0.9 → 0.85 (안정성 증가)
+}
+# 뷰 JSON 스키마 제약 디코딩 (view_grammar 참고). 응답 캐시 키에 포함
+LLAMA_CONSTRAINED_DECODING = True
+GEMINI_MODEL_ID = 'gemini-2.5-pro'
+GEMINI_GENERATION_PARAMS = {}  # API 기본값 사용 (샘플링)
+
 def prepare_pipeline_obj():
     """
     파이프라인을 한 번만 생성하고 재사용합니다.
@@ -55,7 +68,7 @@ def prepare_pipeline_obj():
         # 양자화 없이 float16만 사용 (GPU) 또는 float32 (CPU)
         _pipeline_cache = transformers.pipeline(
             "text-generation",
-            model="meta-llama/Meta-Llama-3-8B-Instruct",
+            model=LLAMA_MODEL_ID,
             model_kwargs={
                 "dtype": model_dtype,  # torch_dtype -> dtype (deprecated 경고 수정)
                 "low_cpu_mem_usage": True,
@@ -105,54 +118,104 @@ def cleanup_pipeline():
         print("[알림] 파이프라인 메모리 해제 완료")
 
 
-def chat_with_llama3(pipeline_obj, system_prompt, user_prompt):
+def _chat_prompt(tokenizer, system_prompt, user_prompt):
     """
-    Llama 3 모델과 채팅하여 텍스트를 생성합니다.
-
-    Args:
-        pipeline_obj: Hugging Face 파이프라인 객체
-        system_prompt (str): 시스템 프롬프트
-        user_prompt (str): 사용자 프롬프트
-
-    Returns:
-        str: 생성된 텍스트
+    Llama 3 채팅 템플릿을 적용한 프롬프트 문자열
     """
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
-
-    prompt = pipeline_obj.tokenizer.apply_chat_template(
+    return tokenizer.apply_chat_template(
         messages,
         tokenize=False,
         add_generation_prompt=True
     )
 
+def _eos_tokens(tokenizer):
     # EOS 토큰: 모델의 기본 EOS 토큰만 사용
     # "]", "}" 등을 EOS로 설정하면 JSON 배열이 완성되기 전에 중단될 수 있음
-    eos_tokens = [
-        pipeline_obj.tokenizer.eos_token_id,
-        pipeline_obj.tokenizer.convert_tokens_to_ids("<|eot_id|>")  # Llama 3의 공식 종료 토큰
+    return [
+        tokenizer.eos_token_id,
+        tokenizer.convert_tokens_to_ids("<|eot_id|>")  # Llama 3의 공식 종료 토큰
     ]
 
-    # torch.no_grad()는 pipeline 내부에서 이미 처리되므로 제거 가능
-    # 하지만 명시적으로 사용해도 문제 없음
-    outputs = pipeline_obj(
-        prompt,
-        max_new_tokens=12288,  # 8192 → 12288 (5개 뷰 JSON + 여유분, 각 뷰당 약 600 토큰)
-        do_sample=True,
-        temperature=0.2,  # 0.6 → 0.3 (JSON 구조 유지를 위해 낮춤)
-        top_p=0.80,       # 0.9 → 0.85 (안정성 증가)
-        return_full_text=False,
-        eos_token_id=eos_tokens,
-        pad_token_id=pipeline_obj.tokenizer.eos_token_id
-    )
+def chat_with_llama3(pipeline_obj, system_prompt, user_prompt, seed=None, constrained=None):
+    """
+    Llama 3 모델과 채팅하여 텍스트를 생성합니다.
+
+    Args:
+        pipeline_obj: Hugging Face 파이프라인 객체
+        system_prompt (str): 시스템 프롬프트
+        user_prompt (str): 사용자 프롬프트
+        seed (int, optional): 샘플링 시드 (지정하면 같은 프롬프트에 같은 응답)
+        constrained (bool, optional): 뷰 JSON 스키마 제약 디코딩 여부 (None이면 LLAMA_CONSTRAINED_DECODING)
+
+    Returns:
+        str: 생성된 텍스트
+    """
+    return chat_with_llama3_batch(pipeline_obj, [(system_prompt, user_prompt)], batch_size=1, seed=seed,
+                                  constrained=constrained)[0]
+
+def chat_with_llama3_batch(pipeline_obj, prompt_pairs, batch_size=8, seed=None, constrained=None):
+    """
+    여러 (시스템, 사용자) 프롬프트를 패딩된 배치로 한 번에 생성합니다.
+
+    디코더 전용 모델이므로 왼쪽 패딩을 사용하고, 패딩 토큰이 없으면 EOS 토큰을 패딩에 씁니다.
+    파이프라인이 batch_size개씩 묶어 generate를 호출하므로 GPU (또는 CPU 폴백)의
+    행렬 연산이 프롬프트 수만큼 나뉘지 않고 한 번에 처리됩니다.
+
+    Args:
+        pipeline_obj: Hugging Face 파이프라인 객체
+        prompt_pairs (list): [(system_prompt, user_prompt), ...]
+        batch_size (int): 한 번에 생성할 프롬프트 수
+        seed (int, optional): 샘플링 시드 (배치 전체에 한 번 적용)
+        constrained (bool, optional): 뷰 JSON 스키마 제약 디코딩 여부 (None이면 LLAMA_CONSTRAINED_DECODING)
+            제약 모드에서는 출력이 항상 뷰 형식의 JSON 배열이 되고, 배열이 닫히면 바로 생성을 멈춥니다.
+
+    Returns:
+        list: 프롬프트 순서대로 생성된 텍스트
+    """
+    tokenizer = pipeline_obj.tokenizer
+    prompts = [_chat_prompt(tokenizer, system_prompt, user_prompt) for system_prompt, user_prompt in prompt_pairs]
+
+    # 공유 토크나이저의 패딩 설정은 이 호출 동안만 바꾸고 끝나면 (예외가 나도) 원래대로 되돌림
+    original_padding_side, original_pad_token = tokenizer.padding_side, tokenizer.pad_token
+    if len(prompts) > 1:
+        tokenizer.padding_side = 'left'
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+    try:
+        if seed is not None:
+            transformers.set_seed(seed)
+
+        generation_params = dict(LLAMA_GENERATION_PARAMS)
+        if LLAMA_CONSTRAINED_DECODING if constrained is None else constrained:
+            from aiportfolio.agents.view_grammar import view_constraints
+            constraints = view_constraints(tokenizer, _eos_tokens(tokenizer))
+            # 형식상 최대 길이가 설정값보다 짧으면 그만큼만 생성
+            constraints['max_new_tokens'] = min(constraints['max_new_tokens'], generation_params['max_new_tokens'])
+            generation_params.update(constraints)
+
+        # torch.no_grad()는 pipeline 내부에서 이미 처리됨
+        outputs = pipeline_obj(
+            prompts,
+            **generation_params,
+            batch_size=batch_size,
+            return_full_text=False,
+            eos_token_id=_eos_tokens(tokenizer),
+            pad_token_id=tokenizer.eos_token_id
+        )
+    finally:
+        tokenizer.padding_side = original_padding_side
+        tokenizer.pad_token = original_pad_token
 
     # GPU 사용 시에만 CUDA 캐시 정리
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
 
-    return outputs[0]["generated_text"].strip()
+    return [output[0]["generated_text"].strip() for output in outputs]
 
 
 def call_gemini_api(system_prompt, user_prompt):
@@ -172,43 +235,16 @@ def call_gemini_api(system_prompt, user_prompt):
         ValueError: API 키가 없을 경우
         RuntimeError: API 호출 실패 시
     """
-    import os
-    from google import genai
-
-    # .env 파일에서 환경 변수 로드
-    try:
-        from dotenv import load_dotenv
-        load_dotenv()
-    except ImportError:
-        # dotenv가 없으면 환경 변수 직접 로드
-        import pathlib
-        env_path = pathlib.Path(__file__).parent.parent.parent / '.env'
-        if env_path.exists():
-            with open(env_path) as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        os.environ[key] = value
-
-    # API 키 로드
-    api_key = os.getenv('GOOGLE_API_KEY')
-
-    if not api_key:
-        raise ValueError(
-            "Gemini API key not found.\n"
-            "Create a .env file with: GOOGLE_API_KEY=your_key_here\n"
-            "Get your key at: https://aistudio.google.com/app/apikey"
-        )
+    from aiportfolio.agents.gemini_client import get_gemini_client, gemini_prompt
 
-    # Gemini 클라이언트 초기화
-    client = genai.Client(api_key=api_key)
+    # Gemini 클라이언트 (.env 로드와 클라이언트 생성은 프로세스에서 한 번만)
+    client = get_gemini_client()
 
     # 프롬프트 결합 (Gemini는 system + user를 하나로 받음)
-    full_prompt = f"{system_prompt}\n\n---\n\n{user_prompt}"
+    full_prompt = gemini_prompt(system_prompt, user_prompt)
 
     # 사용할 모델 지정 (Gemini 2.5 Pro - 가장 강력한 최신 모델)
-    model_name = 'gemini-2.5-pro'
+    model_name = GEMINI_MODEL_ID
 
     print(f"[Gemini] API 호출 중... (모델: {model_name})")
 
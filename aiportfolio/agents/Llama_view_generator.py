@@ -1,28 +1,34 @@
 import json
-from aiportfolio.agents.Llama_config_수정중 import chat_with_llama3
+from aiportfolio.agents.Llama_config_수정중 import (
+    chat_with_llama3, chat_with_llama3_batch, prepare_pipeline_obj,
+    LLAMA_MODEL_ID, LLAMA_GENERATION_PARAMS, LLAMA_CONSTRAINED_DECODING, GEMINI_MODEL_ID, GEMINI_GENERATION_PARAMS,
+)
+from aiportfolio.agents.response_cache import cached_generate, default_response_cache
 from aiportfolio.agents.prompt_maker_improved import making_system_prompt
 from aiportfolio.agents.prompt_maker_improved import making_user_prompt
 from aiportfolio.util.save_log_as_json import save_view_as_json
 
-def generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model='llama'):
+def generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model='llama', seed=None, cache=None):
     """
     LLM을 사용하여 섹터 간 상대적 뷰를 생성하고 저장합니다.
 
+    같은 (모델, 프롬프트, 샘플링 파라미터, seed, simul_name) 호출은 응답 캐시 정책에 따라 이전 응답을 재사용합니다.
+    (response_cache 참고. 캐시가 적중하면 모델을 로드하지 않음. 뷰 파싱에 성공한 응답만 저장)
+
     Args:
-        pipeline_to_use: Llama 3 파이프라인 객체
+        pipeline_to_use: Llama 3 파이프라인 객체 (None이면 캐시가 적중하지 않을 때 로드)
         end_date: 예측 기준일
         simul_name (str): 시뮬레이션 이름
         Tier (int): 분석 단계 (1, 2, 3)
+        model (str): 'llama' 또는 'gemini'
+        seed (int, optional): 샘플링 시드 (반복 실험을 캐시에서 구분할 때 사용)
+        cache (ResponseCache, optional): 응답 캐시 (None이면 환경 변수 LLM_CACHE_POLICY 설정 사용)
 
     Returns:
         list: 파싱된 뷰 데이터 (Python 리스트)
     """
-    # 1. 시스템 프롬프트 정의 (LLM의 역할, 규칙, 최종 출력 형식)
-    system_prompt = making_system_prompt(tier=Tier)
-
-    # 2. 사용자 프롬프트 정의 (실제 데이터 + 실행 명령)
-    # Tier 인자를 전달하여 단계별 데이터 포함
-    user_prompt = making_user_prompt(end_date=end_date, tier=Tier)
+    # 1~2. 시스템/사용자 프롬프트 정의
+    system_prompt, user_prompt = build_view_prompts(end_date, Tier)
 
     # 프롬프트 출력
     print("\n" + "="*80)
@@ -35,24 +41,169 @@ def generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model='ll
     print(user_prompt)
     print("="*80 + "\n")
 
-    # 3. 모델 실행
+    # 3. 모델 실행 (응답 캐시에 없을 때만)
+    if cache is None:
+        cache = default_response_cache()
+
     if model == 'llama':
         print(f"\n[알림] {end_date}에 포트폴리오를 제작하기 위해 Llama 3 모델에 상대 뷰 생성을 요청합니다...\n")
-        generated_text = chat_with_llama3(
-            pipeline_obj=pipeline_to_use,
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
+        views_data = cached_generate(
+            cache, LLAMA_MODEL_ID, system_prompt, user_prompt,
+            {**LLAMA_GENERATION_PARAMS, 'constrained': LLAMA_CONSTRAINED_DECODING, 'seed': seed},
+            lambda: chat_with_llama3(
+                pipeline_obj=pipeline_to_use if pipeline_to_use is not None else prepare_pipeline_obj(),
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                seed=seed
+            ),
+            parse=lambda text: parse_views(text, end_date),
+            scope=simul_name
         )
     elif model == 'gemini':
         print(f"\n[알림] {end_date}에 포트폴리오를 제작하기 위해 Google Gemini API로 상대 뷰 생성을 요청합니다...\n")
         from aiportfolio.agents.Llama_config_수정중 import call_gemini_api
-        generated_text = call_gemini_api(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
+        views_data = cached_generate(
+            cache, GEMINI_MODEL_ID, system_prompt, user_prompt, {**GEMINI_GENERATION_PARAMS, 'seed': seed},
+            lambda: call_gemini_api(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt
+            ),
+            parse=lambda text: parse_views(text, end_date),
+            scope=simul_name
         )
     else:
         raise ValueError(f"Unknown model: '{model}'. Use 'llama' or 'gemini'")
 
+    # 4~5. JSON 추출/파싱 후 end_date 추가 (parse_views, cached_generate 안에서 수행)
+
+    # 6. 파싱된 데이터를 저장 (문자열이 아닌 객체로 저장)
+    save_view_as_json(views_data, simul_name, Tier, end_date)
+
+    return views_data
+
+def generate_sector_views_batch(requests, model='llama', pipeline_to_use=None, batch_size=8, cache=None, seed=None,
+                                gemini_client=None):
+    """
+    여러 (end_date, simul_name, Tier) 요청의 뷰를 한 번에 생성하고 저장합니다.
+
+    모든 프롬프트를 먼저 만든 뒤, 응답 캐시에 없는 요청만 모아 Llama 3는 패딩된 배치로
+    (chat_with_llama3_batch), Gemini는 비동기 클라이언트로 동시에 (gemini_client.AsyncGeminiClient)
+    호출합니다. 각 응답은 따로 파싱하므로
+    한 요청의 JSON 파싱이 실패해도 나머지 결과는 그대로 저장됩니다.
+    응답 캐시에는 파싱에 성공한 응답만 저장하고, 파싱할 수 없는 캐시 항목은 삭제합니다.
+
+    Args:
+        requests (list): [{'end_date', 'simul_name', 'Tier', 'seed'(선택)}, ...]
+            seed는 해당 요청의 샘플링 시드이자 반복 실험을 캐시 키에서 구분하는 값입니다.
+            simul_name도 캐시 키에 들어가므로 다른 시뮬레이션의 응답은 재사용하지 않습니다.
+            Llama 3는 같은 seed의 요청끼리 묶어 seed마다 set_seed 후 배치로 생성합니다.
+        model (str): 'llama' 또는 'gemini'
+        pipeline_to_use: Llama 3 파이프라인 객체 (None이면 캐시 미적중 요청이 있을 때 로드)
+        batch_size (int): Llama 3 배치 크기
+        cache (ResponseCache, optional): 응답 캐시 (None이면 환경 변수 LLM_CACHE_POLICY 설정 사용)
+        seed (int, optional): seed가 없는 요청에 적용하는 샘플링 시드 (캐시 키에도 이 값을 기록)
+        gemini_client (AsyncGeminiClient, optional): Gemini 클라이언트 (None이면 기본 설정으로 생성)
+
+    Returns:
+        list: 요청 순서대로 파싱된 뷰 데이터 (생성/파싱 실패한 요청은 None)
+    """
+    if model == 'llama':
+        model_id, params = LLAMA_MODEL_ID, {**LLAMA_GENERATION_PARAMS, 'constrained': LLAMA_CONSTRAINED_DECODING}
+    elif model == 'gemini':
+        model_id, params = GEMINI_MODEL_ID, GEMINI_GENERATION_PARAMS
+    else:
+        raise ValueError(f"Unknown model: '{model}'. Use 'llama' or 'gemini'")
+
+    if cache is None:
+        cache = default_response_cache()
+
+    # 1. 모든 프롬프트를 먼저 만들고 캐시 조회
+    prompts, keys, texts = [], [], []
+    for request in requests:
+        system_prompt, user_prompt = build_view_prompts(request['end_date'], request['Tier'])
+        request_seed = request.get('seed')
+        request_params = {**params, 'seed': request_seed if request_seed is not None else seed}
+        key, payload = cache.make_key(model_id, system_prompt, user_prompt, request_params,
+                                      scope=request['simul_name'])
+        prompts.append((system_prompt, user_prompt))
+        keys.append((key, payload))
+        texts.append(cache.get(key, request_params))
+
+    misses = [i for i, text in enumerate(texts) if text is None]
+    print(f"\n[알림] 뷰 요청 {len(requests)}건 중 캐시 적중 {len(requests) - len(misses)}건, "
+          f"{model} 생성 {len(misses)}건\n")
+
+    # 2. 캐시에 없는 요청만 생성 (실제로 적용하는 seed = 캐시 키에 기록한 seed)
+    seeds = {i: keys[i][1]['params']['seed'] for i in misses}
+    if misses and model == 'llama':
+        pipeline_obj = pipeline_to_use if pipeline_to_use is not None else prepare_pipeline_obj()
+        # set_seed는 배치 전체에 적용되므로 seed가 같은 요청끼리 묶어서 생성
+        generated_by_index = {}
+        for group_seed in dict.fromkeys(seeds.values()):
+            group = [i for i in misses if seeds[i] == group_seed]
+            outputs = chat_with_llama3_batch(pipeline_obj, [prompts[i] for i in group], batch_size=batch_size,
+                                             seed=group_seed)
+            generated_by_index.update(zip(group, outputs))
+        generated = [generated_by_index[i] for i in misses]
+    elif misses:
+        from aiportfolio.agents.gemini_client import AsyncGeminiClient
+        client = gemini_client or AsyncGeminiClient(GEMINI_MODEL_ID)
+        generated = client.generate_batch([prompts[i] for i in misses], tags=[seeds[i] for i in misses])
+    else:
+        generated = []
+
+    for i, text in zip(misses, generated):
+        if isinstance(text, Exception):
+            # 재시도 후에도 실패한 요청 (다른 요청은 그대로 진행)
+            print(f"[경고] {requests[i]['simul_name']} (Tier {requests[i]['Tier']}) {requests[i]['end_date']} 요청 실패: {text}")
+            continue
+        texts[i] = text
+
+    # 3. 요청별 파싱/저장 (파싱에 성공한 새 응답만 캐시에 저장)
+    results = []
+    missed = set(misses)
+    for i, (request, text) in enumerate(zip(requests, texts)):
+        if text is None:
+            results.append(None)
+            continue
+        try:
+            views_data = parse_views(text, request['end_date'])
+        except RuntimeError as e:
+            print(f"[경고] {request['simul_name']} (Tier {request['Tier']}) {request['end_date']} 뷰 생성 실패: {e}")
+            if i not in missed:
+                cache.discard(keys[i][0])  # 파싱할 수 없는 캐시 항목은 재시도 때 다시 쓰지 않도록 삭제
+            results.append(None)
+            continue
+        if i in missed:
+            cache.put(*keys[i], text)
+        save_view_as_json(views_data, request['simul_name'], request['Tier'], request['end_date'])
+        results.append(views_data)
+
+    return results
+
+def build_view_prompts(end_date, Tier):
+    """
+    end_date의 시스템/사용자 프롬프트를 만듭니다.
+
+    Returns:
+        tuple: (system_prompt, user_prompt)
+    """
+    # 1. 시스템 프롬프트 정의 (LLM의 역할, 규칙, 최종 출력 형식)
+    system_prompt = making_system_prompt(tier=Tier)
+
+    # 2. 사용자 프롬프트 정의 (실제 데이터 + 실행 명령)
+    # Tier 인자를 전달하여 단계별 데이터 포함
+    user_prompt = making_user_prompt(end_date=end_date, tier=Tier)
+
+    return system_prompt, user_prompt
+
+def parse_views(generated_text, end_date):
+    """
+    LLM 출력에서 뷰 JSON 배열을 추출/파싱하고 각 뷰에 end_date를 추가합니다.
+
+    Raises:
+        RuntimeError: JSON 파싱 실패 시
+    """
     # LLM 출력 전체 표시
     print("\n" + "="*80)
     print("LLM 원본 출력 (전체)")
@@ -61,6 +212,40 @@ def generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model='ll
     print("="*80 + "\n")
 
     # 4. JSON 추출 및 파싱
+    # 제약 디코딩 출력은 전체가 JSON 배열이므로 바로 파싱
+    try:
+        views_data = json.loads(generated_text)
+    except json.JSONDecodeError:
+        views_data = None
+    if isinstance(views_data, list):
+        print(f"[성공] {len(views_data)}개 뷰 파싱 완료")
+    else:
+        views_data = _extract_views(generated_text)
+
+    # 5. end_date를 각 뷰에 추가 (시점 구분을 위함)
+    import pandas as pd
+
+    # end_date를 문자열로 변환
+    if isinstance(end_date, str):
+        end_date_str = end_date
+    else:
+        end_date_str = pd.to_datetime(end_date).strftime('%Y-%m-%d')
+
+    # 각 뷰에 end_date 추가
+    for view in views_data:
+        view['end_date'] = end_date_str
+
+    print(f"[알림] 모든 뷰에 end_date '{end_date_str}' 추가 완료")
+
+    return views_data
+
+def _extract_views(generated_text):
+    """
+    자유 형식 출력에서 JSON 배열 부분을 찾아 파싱합니다. (제약 디코딩을 사용하지 않은 경우)
+
+    Raises:
+        RuntimeError: JSON 파싱 실패 시
+    """
     try:
         # 방법 1: '[{' 패턴으로 시작하는 JSON 배열 찾기
         start_index = generated_text.find('[{')
@@ -146,22 +331,4 @@ def generate_sector_views(pipeline_to_use, end_date, simul_name, Tier, model='ll
         print(f"원본 텍스트 (뒤 500자):\n...{generated_text[-500:]}\n")
         raise RuntimeError(f"LLM JSON 파싱 실패: {e}")
 
-    # 5. end_date를 각 뷰에 추가 (시점 구분을 위함)
-    import pandas as pd
-
-    # end_date를 문자열로 변환
-    if isinstance(end_date, str):
-        end_date_str = end_date
-    else:
-        end_date_str = pd.to_datetime(end_date).strftime('%Y-%m-%d')
-
-    # 각 뷰에 end_date 추가
-    for view in views_data:
-        view['end_date'] = end_date_str
-
-    print(f"[알림] 모든 뷰에 end_date '{end_date_str}' 추가 완료")
-
-    # 6. 파싱된 데이터를 저장 (문자열이 아닌 객체로 저장)
-    save_view_as_json(views_data, simul_name, Tier, end_date)
-
     return views_data
@@ -3,6 +3,9 @@ import json
 import numpy as np
 import pandas as pd
 from glob import glob
+from scipy import sparse
+
+from aiportfolio.util.sector_mapping import map_gics_sector_to_code
 
 # python -m aiportfolio.agents.converting_viewtomatrix
 
@@ -234,4 +237,49 @@ def create_P_matrix(views_data):
         except ValueError as e:
             print(f"Warning: 섹터를 찾을 수 없습니다 - {e}")
     
-    return P
\ No newline at end of file
+    return P
+
+# ==================== 3. 종목 단위 P 행렬 생성 (sparse) ====================
+def create_P_matrix_stock(views_data, gsector, w_mkt):
+    """
+    섹터 간 상대 뷰를 종목 단위 선택 행렬로 변환합니다. (universe='stock')
+
+    각 뷰의 Long 섹터 종목에는 섹터 내 시가총액 비중(+), Short 섹터 종목에는 (-)를 줍니다.
+    따라서 P_i × R 은 두 섹터 시총가중 수익률의 차이가 되어 섹터 뷰와 의미가 같습니다.
+    한 행에는 두 섹터의 종목만 0이 아니므로 scipy.sparse CSR 행렬로 만듭니다.
+
+    Args:
+        views_data (list): open_view_log()가 반환한 뷰 목록
+        gsector (pd.Series): Ticker → GICS 섹터 코드
+        w_mkt (pd.Series): Ticker → 시가총액 비중 (gsector와 같은 순서)
+
+    Returns:
+        scipy.sparse.csr_matrix: K×N 선택 행렬
+    """
+    tickers = list(w_mkt.index)
+    codes = gsector.reindex(tickers).to_numpy(dtype=float)
+    weights = w_mkt.to_numpy(dtype=float)
+
+    rows, cols, vals = [], [], []
+    for i, view in enumerate(views_data):
+        # 섹터명 추출 (Long/Short 표시 제거)
+        sector_1 = view['sector_1'].replace(' (Long)', '').strip()
+        sector_2 = view['sector_2'].replace(' (Short)', '').strip()
+
+        try:
+            code_1, code_2 = map_gics_sector_to_code([sector_1, sector_2])
+        except KeyError as e:
+            print(f"Warning: 섹터를 찾을 수 없습니다 - {e}")
+            continue
+
+        for code, sign in ((code_1, 1.0), (code_2, -1.0)):
+            members = np.flatnonzero(codes == code)
+            total = weights[members].sum()
+            if total <= 0:
+                print(f"Warning: {code} 섹터에 해당하는 종목이 없습니다.")
+                continue
+            rows.extend([i] * len(members))
+            cols.extend(members.tolist())
+            vals.extend((sign * weights[members] / total).tolist())
+
+    return sparse.csr_matrix((vals, (rows, cols)), shape=(len(views_data), len(tickers)))
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import random
+import time
+
+# python -m aiportfolio.agents.gemini_client
+
+# Gemini 비동기 클라이언트
+# - genai.Client는 프로세스에서 한 번만 만들어 재사용 (.env도 한 번만 로드)
+# - 동시 요청 수는 세마포어로, 요청 속도는 토큰 버킷으로 제한
+# - 429/5xx/네트워크 오류는 지수 백오프 (full jitter)로 재시도
+# - 처리 중인 같은 요청 (모델, 프롬프트, tag)은 한 번만 보내고 결과를 공유
+# GEMINI_BASE_URL을 지정하면 로컬 스텁 서버로 보낼 수 있습니다. (__main__의 처리량 벤치마크 참고)
+
+# 재시도할 HTTP 상태 코드
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+_env_loaded = False
+_client_cache = None
+
+def load_env():
+    """
+    .env 파일의 환경 변수를 한 번만 로드합니다. (dotenv가 없으면 직접 파싱)
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        env_path = pathlib.Path(__file__).parent.parent.parent / '.env'
+        if env_path.exists():
+            with open(env_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#') and '=' in line:
+                        key, value = line.split('=', 1)
+                        os.environ[key] = value
+    _env_loaded = True
+
+def get_gemini_client():
+    """
+    genai.Client를 한 번만 생성하고 재사용합니다.
+
+    Raises:
+        ValueError: API 키가 없을 경우
+    """
+    global _client_cache
+    if _client_cache is not None:
+        return _client_cache
+
+    from google import genai
+    from google.genai import types
+
+    load_env()
+    api_key = os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        raise ValueError(
+            "Gemini API key not found.\n"
+            "Create a .env file with: GOOGLE_API_KEY=your_key_here\n"
+            "Get your key at: https://aistudio.google.com/app/apikey"
+        )
+
+    base_url = os.getenv('GEMINI_BASE_URL')
+    http_options = types.HttpOptions(base_url=base_url) if base_url else None
+    _client_cache = genai.Client(api_key=api_key, http_options=http_options)
+    return _client_cache
+
+def gemini_prompt(system_prompt, user_prompt):
+    # Gemini는 system + user를 하나로 받음
+    return f"{system_prompt}\n\n---\n\n{user_prompt}"
+
+def _is_retryable(error):
+    """
+    재시도할 오류인지 여부 (429/5xx 응답, 타임아웃, 연결 오류)
+    """
+    if getattr(error, 'code', None) in RETRY_STATUS:
+        return True
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+class TokenBucket:
+    """
+    토큰 버킷 속도 제한
+
+    초당 rate개의 토큰이 최대 capacity개까지 쌓이고, 요청마다 토큰 하나를 사용합니다.
+    (짧은 순간 capacity개까지 몰아서 보낼 수 있고 평균 속도는 rate로 제한)
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class AsyncGeminiClient:
+    """
+    동시 요청 수, 요청 속도, 재시도를 관리하는 Gemini 비동기 클라이언트
+
+    Args:
+        model (str): Gemini 모델 이름 (Llama_config_수정중.GEMINI_MODEL_ID)
+        max_concurrency (int): 동시에 보내는 최대 요청 수
+        requests_per_minute (float): 평균 요청 속도 상한
+        max_retries (int): 재시도 가능한 오류의 최대 재시도 횟수
+        base_delay, max_delay (float): 지수 백오프의 첫 대기 시간과 상한 (초)
+        client (optional): genai.Client와 같은 인터페이스의 객체 (None이면 get_gemini_client())
+    """
+
+    def __init__(self, model, max_concurrency=8, requests_per_minute=60,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, client=None):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.client = client
+
+    def _key(self, prompt, tag):
+        return hashlib.sha256(json.dumps([self.model, prompt, tag]).encode('utf-8')).hexdigest()
+
+    async def _request(self, prompt, semaphore, bucket):
+        """
+        한 요청을 보내고, 재시도 가능한 오류면 지수 백오프 후 다시 보냅니다.
+        """
+        client = self.client or get_gemini_client()
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            async with semaphore:
+                try:
+                    response = await client.aio.models.generate_content(model=self.model, contents=prompt)
+                    return response.text.strip()
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        raise RuntimeError(f"Gemini API 호출 중 오류 발생: {e}") from e
+                    error = e
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            print(f"[경고] Gemini 요청 실패 ({error}). {delay:.1f}초 후 재시도 ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def generate_many(self, prompt_pairs, tags=None):
+        """
+        여러 (시스템, 사용자) 프롬프트를 동시에 요청합니다.
+
+        Args:
+            prompt_pairs (list): [(system_prompt, user_prompt), ...]
+            tags (list, optional): 같은 프롬프트라도 따로 요청할 항목을 구분하는 값 (예: 반복 실험 seed)
+
+        Returns:
+            list: 프롬프트 순서대로 응답 텍스트 (실패한 요청은 RuntimeError 객체)
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = TokenBucket(self.requests_per_minute / 60.0, capacity=self.max_concurrency)
+        tags = tags if tags is not None else [None] * len(prompt_pairs)
+
+        # 같은 요청은 하나의 작업을 공유
+        tasks = {}
+        keys = []
+        for (system_prompt, user_prompt), tag in zip(prompt_pairs, tags):
+            prompt = gemini_prompt(system_prompt, user_prompt)
+            key = self._key(prompt, tag)
+            if key not in tasks:
+                tasks[key] = asyncio.ensure_future(self._request(prompt, semaphore, bucket))
+            keys.append(key)
+
+        if len(tasks) < len(keys):
+            print(f"[알림] 중복 Gemini 요청 {len(keys) - len(tasks)}건은 한 번만 요청합니다.")
+        print(f"[Gemini] {len(tasks)}건 동시 요청 중... (모델: {self.model}, 동시 {self.max_concurrency}건)")
+
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
+        return [results[key] for key in keys]
+
+    def generate_batch(self, prompt_pairs, tags=None):
+        """
+        generate_many의 동기 버전 (이벤트 루프가 없는 곳에서 사용)
+        """
+        return asyncio.run(self.generate_many(prompt_pairs, tags))
+
+if __name__ == "__main__":
+    # 로컬 스텁 서버에 대한 처리량 벤치마크 (실제 API를 호출하지 않음)
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    latency, fail_every = 0.2, 5
+    counter = {'n': 0}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            counter['n'] += 1
+            time.sleep(latency)
+            if counter['n'] % fail_every == 0:
+                status, body = 429, {'error': {'code': 429, 'message': 'rate limited', 'status': 'RESOURCE_EXHAUSTED'}}
+            else:
+                status, body = 200, {'candidates': [{'content': {'role': 'model', 'parts': [{'text': '[]'}]}}]}
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.setdefault('GOOGLE_API_KEY', 'stub')
+    os.environ['GEMINI_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    prompts = [('system', f'user {i}') for i in range(32)]
+    for concurrency in (1, 8):
+        client = AsyncGeminiClient('stub-model', max_concurrency=concurrency, requests_per_minute=6000, base_delay=0.05)
+        t = time.time()
+        results = client.generate_batch(prompts)
+        elapsed = time.time() - t
+        failed = sum(isinstance(r, Exception) for r in results)
+        print(f"동시 {concurrency}건: {len(prompts) / elapsed:.1f} req/s (실패 {failed}건)")
+    server.shutdown()
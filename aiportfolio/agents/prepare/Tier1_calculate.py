@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import linregress
 from pandas.tseries.offsets import MonthEnd
 import warnings
 
@@ -10,7 +9,9 @@ import warnings
 warnings.filterwarnings("ignore")
 
 try:
-    from aiportfolio.BL_MVO.prepare.sector_excess_return import final
+    from aiportfolio.BL_MVO.prepare.sector_excess_return import (
+        final, cached_panel, fingerprint_key, sector_panel_fingerprint,
+    )
     print("[성공] sector_excess_return 모듈을 정상적으로 임포트했습니다.")
 except ImportError as e:
     print(f"[오류] aiportfolio.BL_MVO.prepare.sector_excess_return 임포트 실패: {e}")
@@ -36,24 +37,73 @@ except ImportError as e:
                 data.append({'date': date, 'gsector': gsector, 'sector_return': sector_return})
         return pd.DataFrame(data)
 
-# --- 헬퍼 함수: R-squared 계산기(추세 강도) ---
-def calculate_r_squared(series: pd.Series) -> float:
+    # 캐시 없이 매번 계산 (가상 데이터용)
+    def sector_panel_fingerprint():
+        return []
+
+    def fingerprint_key(fingerprint):
+        return ()
+
+    def cached_panel(name, builder, version):
+        return builder()
+
+# --- 헬퍼 함수: 롤링 창 ---
+def _rolling_windows(values: np.ndarray, window: int) -> np.ndarray:
     """
-    주어진 시계열(가격) 데이터에 대해 선형 회귀를 수행하고 R-squared를 반환합니다.
-    y = a*x + b (y=가격, x=시간)
+    (T, N) 배열의 각 시점까지 최근 window개 행을 (T, N, window) 배열로 만듭니다.
+    시작 부분의 모자란 행은 NaN으로 채우므로 NaN을 제외하면 tail(window)와 같습니다.
+    (창마다 연속된 메모리로 복사해 pandas와 같은 순서로 합산)
     """
-    y = series.dropna()
-    if len(y) < 2:
-        return np.nan
-    x = np.arange(len(y))
-    
-    try:
-        slope, intercept, r_value, p_value, std_err = linregress(x, y)
-        return r_value ** 2
-    except ValueError:
-        return np.nan
+    padded = np.vstack([np.full((window - 1, values.shape[1]), np.nan), values])
+    return np.ascontiguousarray(np.lib.stride_tricks.sliding_window_view(padded, window, axis=0))
+
+def _rolling_mean_std(values: np.ndarray, window: int):
+    """
+    최근 window개 행의 평균과 표준편차 (ddof=1, NaN 제외, 관측치 2개 미만이면 NaN)
 
-# --- 메인 함수: 롤링 퀀트 지표 계산 (수정됨) ---
+    pandas의 mean()/std()와 같은 두 단계 계산 (합계/개수로 평균을 구한 뒤 편차 제곱합)이므로
+    값이 일정한 창의 표준편차는 정확히 0이 됩니다. (누적합 방식은 상쇄 오차가 남음)
+    """
+    w = _rolling_windows(values, window)
+    valid = ~np.isnan(w)
+    n = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, w, 0.0).sum(axis=-1) / n
+        sqr = np.where(valid, (mean[..., None] - w) ** 2, 0.0)
+        var = sqr.sum(axis=-1) / (n - 1)
+    mean = np.where(n > 0, mean, np.nan)
+    var = np.where(n > 1, var, np.nan)
+    return mean, np.sqrt(var)
+
+def _rolling_trend_r2(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Rolling linear-trend R²
+
+    최근 window개 값 y (NaN 제외)를 x = 0, 1, ..., n-1 에 회귀한 결정계수를 모든 시점에 대해 한 번에 계산합니다.
+    (scipy.stats.linregress(x, y).rvalue ** 2 와 동일, y가 상수이면 NaN, 관측치 2개 미만이면 NaN)
+
+    Formula:
+        Sxx = Σ(x - x̄)²,  Sxy = Σ(x - x̄)(y - ȳ),  Syy = Σ(y - ȳ)²
+        R² = Sxy² / (Sxx·Syy)
+    """
+    w = _rolling_windows(values, window)
+    valid = ~np.isnan(w)
+    n = valid.sum(axis=-1)
+    x = np.cumsum(valid, axis=-1) - 1                  # 창 안에서 앞선 유효 관측치 수
+
+    # y가 상수인 창은 편차 제곱합이 반올림 오차만 남으므로 최댓값/최솟값으로 판정
+    flat = np.where(valid, w, -np.inf).max(axis=-1) == np.where(valid, w, np.inf).min(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = np.where(valid, x - (np.where(valid, x, 0).sum(axis=-1) / n)[..., None], 0.0)
+        dy = np.where(valid, w - (np.where(valid, w, 0.0).sum(axis=-1) / n)[..., None], 0.0)
+        ss_x = (dx * dx).sum(axis=-1)
+        ss_xy = (dx * dy).sum(axis=-1)
+        ss_y = (dy * dy).sum(axis=-1)
+        r2 = np.minimum(ss_xy * ss_xy / (ss_x * ss_y), 1.0)
+    return np.where((n >= 2) & ~flat, r2, np.nan)
+
+# --- 메인 함수: 롤링 퀀트 지표 계산 (벡터화) ---
 def calculate_rolling_indicators(
     price_index_df: pd.DataFrame, 
     returns_df: pd.DataFrame, 
@@ -63,6 +113,10 @@ def calculate_rolling_indicators(
     주어진 '가격 지수'와 '월별 수익률' 데이터를 기반으로,
     지정된 뷰 생성 월(view_months_list)에 맞춰
     5가지 퀀트 지표를 롤링 방식으로 계산합니다.
+
+    월마다 데이터를 잘라 다시 계산하지 않고, 전체 패널에 대해 각 지표를 롤링 연산으로
+    한 번에 계산한 뒤 각 뷰 월말 시점 (as_of_date 이하의 마지막 행)의 값을 뽑습니다.
+    결과는 월별로 .loc[:as_of_date].tail()을 사용하던 기존 계산과 같습니다.
     
     Args:
         price_index_df (pd.DataFrame): 가격 지수 (cagr_3y, trend_strength_r2 용)
@@ -72,100 +126,130 @@ def calculate_rolling_indicators(
     Returns:
         pd.DataFrame: (as_of_date, sector)를 인덱스로 하는 MultiIndex DataFrame
     """
-    
-    all_results = []
-    
-    # [수정] returns_df는 이미 수익률이므로 pct_change()가 필요 없습니다.
-    # returns_df = price_df.pct_change() # <- [삭제]
-
-    for view_month_str in view_months_list:
-        # 'YYYY-MM' 형식을 해당 월의 마지막 날로 변환
-        view_date_start = pd.to_datetime(view_month_str)
-        as_of_date = view_date_start + MonthEnd(0)  # 해당 월의 마지막 날
-        
-        # [수정] 2종류의 데이터를 각각 슬라이싱합니다.
-        price_index_slice = price_index_df.loc[:as_of_date]
-        returns_slice = returns_df.loc[:as_of_date]
-
-        sectors = price_index_df.columns # 컬럼명은 동일
-        indicator_results = pd.DataFrame(index=sectors)
-        indicator_results['as_of_date'] = as_of_date
-        
-        # --- 5가지 지표 계산 (각각 올바른 데이터 소스 사용) ---
-        
-        # 1. 최근 12개월 월별 수익률 (12m_returns)
-        #    - 데이터 소스: returns_df (월별 수익률)
-        recent_12m_returns_data = returns_slice.tail(12)
-        indicator_results['12m_returns'] = [
-            list(recent_12m_returns_data[col].dropna()) for col in sectors
-        ]
-
-        # 2. 3년 평균 복리 수익률 (cagr_3y)
-        #    - 데이터 소스: price_index_df (가격 지수)
-        price_index_3y = price_index_slice.tail(37)
-        if len(price_index_3y) == 37:
-            start_price = price_index_3y.iloc[0]
-            end_price = price_index_3y.iloc[-1]
-            
-            # 0 또는 음수 가격 지수를 방지하기 위한 안전장치
-            if (start_price > 0).all() and (end_price > 0).all():
-                cagr = (end_price / start_price) ** (1/3) - 1
-                indicator_results['cagr_3y'] = cagr
-            else:
-                # (이론상 발생 안해야 함)
-                indicator_results['cagr_3y'] = np.nan 
-        else:
-            indicator_results['cagr_3y'] = np.nan # 데이터 기간 부족 시 NaN
-
-        # 3. 변동성 (volatility)
-        #    - 데이터 소스: returns_df (월별 수익률)
-        simple_returns_12m = returns_slice.tail(12)
-
-        if len(simple_returns_12m) == 12:
-            # returns_df는 이미 소수점 단위 (예: 0.0659 = 6.59%, -0.0403 = -4.03%)
-            # 추가 변환 없이 바로 표준편차 계산
-
-            # 월별 수익률의 표준편차를 계산하고 연율화
-            indicator_results['volatility'] = simple_returns_12m.std() * np.sqrt(12)
-        else:
-            indicator_results['volatility'] = np.nan
-
-        # 4. 평균 회귀 신호 (z_score)
-        #    - 데이터 소스: returns_df (월별 수익률)
-        recent_24m_returns = returns_slice.tail(24)
-        if len(recent_24m_returns) == 24:
-            # returns_df는 이미 소수점 단위
-            # Z-score는 표준화된 값이므로 단위에 영향받지 않음
-            mean_24m = recent_24m_returns.mean()
-            std_24m = recent_24m_returns.std()
-            current_return = recent_24m_returns.iloc[-1]
-            
-            # 0으로 나누기 방지
-            if (std_24m > 0).all():
-                z_score = (current_return - mean_24m) / std_24m
-                indicator_results['z_score'] = z_score
-            else:
-                indicator_results['z_score'] = np.nan
-        else:
-            indicator_results['z_score'] = np.nan
-
-        # 5. 추세 강도 (trend_strength_r2)
-        #    - 데이터 소스: price_index_df (가격 지수)
-        recent_12m_price_index = price_index_slice.tail(12)
-        indicator_results['trend_strength_r2'] = recent_12m_price_index.apply(calculate_r_squared)
-        
-        all_results.append(indicator_results)
-
-    if not all_results:
+    if len(view_months_list) == 0:
         print("[경고] 생성된 지표가 없습니다. view_months_list 또는 price_df를 확인하세요.")
         return pd.DataFrame()
-        
-    final_df = pd.concat(all_results)
-    final_df = final_df.reset_index().rename(columns={'index': 'sector'})
+
+    sectors = price_index_df.columns # 컬럼명은 동일
+    returns_df = returns_df.reindex(columns=sectors)
+    prices = price_index_df.to_numpy(dtype=float)
+    returns = returns_df.to_numpy(dtype=float)
+    T, N = prices.shape
+
+    # 각 지표의 시점별 값 (T, N). 기간이 부족한 시점은 NaN
+    position = np.arange(T)[:, None]
+
+    # 2. 3년 평균 복리 수익률 (cagr_3y): 37개월 전 대비 가격 지수, 모든 섹터의 가격이 양수일 때만
+    cagr = np.full((T, N), np.nan)
+    if T >= 37:
+        start_price, end_price = prices[:-36], prices[36:]
+        positive = ((start_price > 0).all(axis=1) & (end_price > 0).all(axis=1))[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cagr[36:] = np.where(positive, (end_price / start_price) ** (1/3) - 1, np.nan)
+
+    # 3. 변동성 (volatility): 최근 12개월 수익률의 표준편차를 연율화
+    _, std_12m = _rolling_mean_std(returns, 12)
+    volatility = np.where(position >= 11, std_12m * np.sqrt(12), np.nan)
+
+    # 4. 평균 회귀 신호 (z_score): 최근 24개월 평균/표준편차 대비 당월 수익률, 모든 섹터의 표준편차가 양수일 때만
+    mean_24m, std_24m = _rolling_mean_std(returns, 24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z_score = (returns - mean_24m) / std_24m
+    z_score = np.where((position >= 23) & (std_24m > 0).all(axis=1, keepdims=True), z_score, np.nan)
+
+    # 5. 추세 강도 (trend_strength_r2): 최근 12개월 가격 지수의 선형 추세 R²
+    trend_r2 = _rolling_trend_r2(prices, 12)
+
+    # 뷰 월말 시점 → as_of_date 이하의 마지막 행
+    as_of_dates = pd.DatetimeIndex([pd.to_datetime(m) + MonthEnd(0) for m in view_months_list])
+    rows = price_index_df.index.searchsorted(as_of_dates, side='right') - 1
+
+    def pick(values):
+        picked = np.full((len(rows), N), np.nan)
+        picked[rows >= 0] = values[rows[rows >= 0]]
+        return picked.ravel()
+
+    # 1. 최근 12개월 월별 수익률 (12m_returns): 결측 제외 리스트
+    return_lists = []
+    for row in rows:
+        recent = returns[max(row - 11, 0):row + 1] if row >= 0 else returns[:0]
+        return_lists.extend(recent[:, j][~np.isnan(recent[:, j])].tolist() for j in range(N))
+
+    final_df = pd.DataFrame({
+        'as_of_date': np.repeat(as_of_dates, N),
+        'sector': np.tile(np.asarray(sectors), len(rows)),
+        '12m_returns': return_lists,
+        'cagr_3y': pick(cagr),
+        'volatility': pick(volatility),
+        'z_score': pick(z_score),
+        'trend_strength_r2': pick(trend_r2),
+    })
     final_df = final_df.set_index(['as_of_date', 'sector']).sort_index()
     
     return final_df
 
+# --- 검증: 기존 월별 반복 계산과 비교 ---
+def _loop_indicators(price_index_df, returns_df, view_months_list):
+    """
+    벡터화 이전의 월별 반복 계산 (.loc[:as_of_date].tail(), pandas std, linregress). check_rolling_indicators 전용
+    """
+    from scipy.stats import linregress
+
+    def r_squared(series):
+        y = series.dropna()
+        if len(y) < 2:
+            return np.nan
+        return linregress(np.arange(len(y)), y).rvalue ** 2
+
+    rows = []
+    for view_month in view_months_list:
+        as_of_date = pd.to_datetime(view_month) + MonthEnd(0)
+        prices, returns = price_index_df.loc[:as_of_date], returns_df.loc[:as_of_date]
+        recent_36 = prices.tail(37)
+        cagr = ((recent_36.iloc[-1] / recent_36.iloc[0]) ** (1/3) - 1
+                if len(recent_36) == 37 and (recent_36.iloc[0] > 0).all() and (recent_36.iloc[-1] > 0).all()
+                else pd.Series(np.nan, index=prices.columns))
+        recent_12, recent_24 = returns.tail(12), returns.tail(24)
+        volatility = recent_12.std() * np.sqrt(12) if len(recent_12) == 12 else pd.Series(np.nan, index=prices.columns)
+        std_24m = recent_24.std()
+        z_score = ((recent_24.iloc[-1] - recent_24.mean()) / std_24m
+                   if len(recent_24) == 24 and (std_24m > 0).all() else pd.Series(np.nan, index=prices.columns))
+        r2 = prices.tail(12).apply(r_squared)
+        for sector in prices.columns:
+            rows.append({'as_of_date': as_of_date, 'sector': sector,
+                         '12m_returns': list(recent_12[sector].dropna()), 'cagr_3y': cagr[sector],
+                         'volatility': volatility[sector], 'z_score': z_score[sector],
+                         'trend_strength_r2': r2[sector]})
+    return pd.DataFrame(rows).set_index(['as_of_date', 'sector']).sort_index()
+
+def check_rolling_indicators(seed=0):
+    """
+    가상 패널 (결측, 처음부터 값이 0인 구간, 일정한 수익률 구간 포함)에서
+    calculate_rolling_indicators가 기존 월별 반복 계산과 같은 결과를 내는지 확인합니다.
+
+    Raises:
+        AssertionError: 지표 값 또는 NaN 위치가 다를 경우
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2010-01-31', periods=96, freq='ME')
+    returns_df = pd.DataFrame(rng.normal(0.01, 0.05, (len(dates), 5)), index=dates,
+                              columns=[f'gsector_{c}' for c in (10, 15, 20, 25, 30)])
+    returns_df.iloc[:30, 0] = 0.0          # 처음 30개월 수익률 0 (가격 지수 1.0으로 일정)
+    returns_df.iloc[40:70, 1] = 0.25       # 중간 30개월 일정한 수익률 (표준편차 0)
+    returns_df.iloc[rng.choice(len(dates), 8, replace=False), 2] = np.nan
+    price_index_df = (1 + returns_df.fillna(0)).cumprod()
+    view_months = [d.strftime('%Y-%m') for d in dates]
+
+    expected = _loop_indicators(price_index_df, returns_df, view_months)
+    actual = calculate_rolling_indicators(price_index_df, returns_df, view_months)
+
+    assert list(actual['12m_returns']) == list(expected['12m_returns']), "12m_returns 불일치"
+    for col in ['cagr_3y', 'volatility', 'z_score', 'trend_strength_r2']:
+        a, e = actual[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float)
+        assert (np.isnan(a) == np.isnan(e)).all(), f"{col}: NaN 위치 불일치"
+        assert np.allclose(a, e, rtol=1e-9, atol=1e-12, equal_nan=True), f"{col}: 값 불일치"
+    print("[성공] 롤링 지표가 기존 월별 반복 계산과 일치합니다.")
+
 # --- return.py의 메인 실행 함수 (수정됨) ---
 def indicator(): 
     raw_data_from_final = final()
@@ -283,8 +367,58 @@ def indicator():
 
     return final_long_format_df
 
+# --- Tier1 지표 저장소 (기준일별 스냅샷) ---
+# 프롬프트를 만들 때마다 indicator()로 전체 기간을 다시 계산하고 섹터×지표마다 행을 검색하지 않도록,
+# 원천 파일 지문(섹터 패널과 같은 지문)별로 한 번만 계산해 database/cache/tier1_features.parquet 에 저장하고
+# 메모리에는 {기준일: {섹터: 지표}} 딕셔너리로 보관합니다.
+TIER1_STORE_NAME = 'tier1_features'
+TIER1_STORE_VERSION = 2  # indicator()의 결과가 바뀌면 올림
+TIER1_COLUMNS = ['return_list', 'CAGR', 'volatility', 'z-score', 'trend_strength']
+
+_snapshot_memo = {}   # 지문 키 -> {date: {gsector: {지표: 값}}}
+
+def _build_snapshots(features: pd.DataFrame) -> dict:
+    """
+    indicator()의 Long Format 결과를 {date: {gsector: {지표: 값}}} 딕셔너리로 바꿉니다.
+    (parquet에서 읽은 return_list 배열은 리스트로 되돌림)
+    """
+    features = features.assign(return_list=[np.asarray(v, dtype=float).tolist() for v in features['return_list']])
+    snapshots = {}
+    for row in zip(pd.to_datetime(features['date']), features['gsector'], *(features[c] for c in TIER1_COLUMNS)):
+        date, sector, values = row[0], row[1], row[2:]
+        snapshots.setdefault(date, {})[sector] = dict(zip(TIER1_COLUMNS, values))
+    return snapshots
+
+def tier1_snapshots() -> dict:
+    """
+    전체 Tier1 지표 저장소를 반환합니다. 원천 파일이 바뀌면 자동으로 다시 만듭니다.
+
+    Returns:
+        dict: {date (Timestamp): {섹터명: {'return_list', 'CAGR', 'volatility', 'z-score', 'trend_strength'}}}
+    """
+    key = fingerprint_key(sector_panel_fingerprint())
+    if key not in _snapshot_memo or not key:  # 키가 비어 있으면 (가상 데이터) 매번 계산
+        _snapshot_memo.clear()  # 원천 파일이 바뀌었다면 이전 저장소는 버림
+        _snapshot_memo[key] = _build_snapshots(cached_panel(TIER1_STORE_NAME, indicator, TIER1_STORE_VERSION))
+    return _snapshot_memo[key]
+
+def get_snapshot(end_date):
+    """
+    기준일 end_date의 11개 섹터 Tier1 지표를 한 번에 반환합니다. (딕셔너리 조회)
+
+    Args:
+        end_date (str or Timestamp): 기준일 (월말)
+
+    Returns:
+        dict: {섹터명: {지표: 값}}. 해당 날짜의 지표가 없으면 빈 딕셔너리
+            (반환값은 저장소를 그대로 가리키므로 수정하지 말 것)
+    """
+    return tier1_snapshots().get(pd.Timestamp(end_date), {})
+
 # 메인 실행 코드 (모듈로 임포트될 때는 실행되지 않음)
 if __name__ == "__main__":
+    check_rolling_indicators()
     a = indicator()
     print(a.head())
-    print(a.info())
\ No newline at end of file
+    print(a.info())
+    print(get_snapshot(a['date'].max()))
\ No newline at end of file
@@ -3,7 +3,7 @@ import numpy as np
 import os
 import json
 
-from aiportfolio.agents.prepare.Tier1_calculate import indicator
+from aiportfolio.agents.prepare.Tier1_calculate import get_snapshot
 
 # python -m aiportfolio.agents.prompt_maker
 
@@ -17,17 +17,16 @@ def making_INPUT(end_date):
     Returns:
         list: 11개 섹터의 지표 데이터 리스트
     """
-    data = indicator()
+    snapshot = get_snapshot(end_date)  # {섹터: {지표: 값}} (저장소에서 한 번에 조회)
 
     # 헬퍼 함수: 안전하게 데이터 가져오기 + 소수점 4자리 반올림
     def safe_get_value(sector, column):
         """섹터와 컬럼에 대한 값을 안전하게 가져오고 소수점 4자리로 반올림합니다."""
-        filtered = data.loc[(data['date'] == end_date) & (data['gsector'] == sector), column]
-        if len(filtered) == 0:
+        if sector not in snapshot:
             print(f"[경고] {sector} 섹터의 {column} 데이터가 {end_date}에 없습니다. 'N/A'로 대체합니다.")
             return "N/A"
 
-        value = filtered.iloc[0]
+        value = snapshot[sector][column]
 
         # 리스트인 경우 (return_list)
         if isinstance(value, list):
@@ -14,7 +14,7 @@ import pandas as pd
 import numpy as np
 import os
 import json
-from aiportfolio.agents.prepare.Tier1_calculate import indicator
+from aiportfolio.agents.prepare.Tier1_calculate import get_snapshot
 # Tier2 계산 함수는 파일이 없을 때를 대비해 import 유지
 from aiportfolio.agents.prepare.Tier2_calculate import calculate_accounting_indicator
 from aiportfolio.agents.prepare.Tier3_calculate import calculate_macro_indicator
@@ -62,14 +62,13 @@ def making_tier1_INPUT(end_date):
     """
     Tier 1 (기술적 지표) 데이터 생성
     """
-    data = indicator()
+    snapshot = get_snapshot(end_date)  # {섹터: {지표: 값}} (저장소에서 한 번에 조회)
 
     def safe_get_value(sector, column):
-        filtered = data.loc[(data['date'] == end_date) & (data['gsector'] == sector), column]
-        if len(filtered) == 0:
+        if sector not in snapshot:
             print(f"[경고] {sector} 섹터의 {column} 데이터가 {end_date}에 없습니다. 'N/A'로 대체합니다.")
             return "N/A"
-        value = filtered.iloc[0]
+        value = snapshot[sector][column]
 
         if isinstance(value, list):
             return [round(float(x), 4) for x in value]
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+# python -m aiportfolio.agents.response_cache
+
+# LLM 응답 캐시 (내용 주소 지정)
+# (모델, 시스템/사용자 프롬프트 해시, 샘플링 파라미터)가 같은 호출은 이전 응답을 재사용해
+# 같은 뷰로 백테스트를 다시 돌릴 때 추론을 생략합니다.
+# 항목마다 database/cache/llm_responses/{key}.json 파일 하나를 저장하고,
+# 파일 mtime을 마지막 사용 시각으로 사용해 LRU 순서로 정리합니다.
+
+RESPONSE_CACHE_DIR = Path("database/cache/llm_responses")
+
+# 캐시 정책
+# - 'always': 저장된 응답이 있으면 항상 재사용 (seed 없는 샘플링 호출도 재사용)
+# - 'seeded': 결정적 디코딩이거나 seed를 지정한 호출만 재사용 (같은 seed의 반복 실험을 다시 돌릴 때 추론 생략)
+# - 'deterministic': 결정적 디코딩(do_sample=False 또는 temperature=0)일 때만 재사용
+# - 'record': 재사용하지 않고 저장만 함
+# - 'off': 캐시 미사용
+# 기본 설정(LLAMA_GENERATION_PARAMS)은 샘플링이므로 기본 정책은 'seeded'.
+# seed 없이 실행하면 (run_single 등) 매번 새로 샘플링하고, seed를 준 반복 실험 (run_auto_repetition)만 재사용합니다.
+# 응답은 뷰 파싱에 성공한 경우에만 저장합니다. (cached_generate의 parse 참고)
+# 키에는 scope (뷰 생성에서는 simul_name)도 넣으므로, seed가 같아도 시뮬레이션이 다르면 서로의 응답을 재사용하지 않습니다.
+# (같은 simul_name과 seed로 다시 실행할 때만 재사용)
+CACHE_POLICIES = ('always', 'seeded', 'deterministic', 'record', 'off')
+DEFAULT_POLICY = 'seeded'
+
+# 키에 포함하는 샘플링 파라미터
+KEY_PARAMS = ('temperature', 'top_p', 'seed', 'max_new_tokens', 'do_sample', 'constrained')
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def is_deterministic(params):
+    """
+    샘플링 없이 같은 입력에 항상 같은 출력을 내는 설정인지 여부
+    """
+    return params.get('do_sample') is False or params.get('temperature') == 0
+
+class ResponseCache:
+    """
+    LLM 응답의 디스크 캐시
+
+    Args:
+        cache_dir (str or Path): 저장 디렉토리
+        policy (str): CACHE_POLICIES 중 하나
+        max_bytes (int, optional): 전체 크기 상한. 넘으면 오래 사용하지 않은 항목부터 삭제
+        max_entries (int, optional): 항목 수 상한
+    """
+
+    def __init__(self, cache_dir=RESPONSE_CACHE_DIR, policy=DEFAULT_POLICY, max_bytes=256 * 1024**2, max_entries=None):
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"알 수 없는 캐시 정책: '{policy}'. {CACHE_POLICIES} 중 하나를 사용하세요.")
+        self.cache_dir = Path(cache_dir)
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(model_id, system_prompt, user_prompt, params, scope=None):
+        """
+        캐시 키: sha256(모델 id, 프롬프트 해시, 샘플링 파라미터, scope)
+        scope (예: simul_name)가 다른 호출은 나머지가 같아도 키가 다릅니다. (None이면 키에 넣지 않음)
+        """
+        payload = {
+            'model': model_id,
+            'prompt_sha256': _sha256(system_prompt + '\x00' + user_prompt),
+            'params': {name: params.get(name) for name in KEY_PARAMS},
+        }
+        if scope is not None:
+            payload['scope'] = scope
+        return _sha256(json.dumps(payload, sort_keys=True)), payload
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key, params):
+        """
+        정책상 재사용할 수 있고 저장된 응답이 있으면 반환합니다. (없으면 None)
+        """
+        if self.policy in ('record', 'off'):
+            return None
+        if self.policy == 'deterministic' and not is_deterministic(params):
+            return None
+        if self.policy == 'seeded' and not (is_deterministic(params) or params.get('seed') is not None):
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # LRU: 마지막 사용 시각 갱신
+        except (OSError, json.JSONDecodeError):
+            return None
+        return entry.get('response')
+
+    def put(self, key, payload, response):
+        """
+        응답을 저장하고 (임시 파일 후 교체) 상한을 넘으면 정리합니다.
+        """
+        if self.policy == 'off':
+            return
+        path = self._path(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({**payload, 'response': response, 'created': time.time()}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[경고] LLM 응답 캐시 저장 실패 (응답은 그대로 사용): {e}")
+            return
+        self.evict()
+
+    def discard(self, key):
+        """
+        항목 하나를 삭제합니다. (저장된 응답을 파싱할 수 없는 경우 등)
+        """
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        크기/항목 수 상한을 넘으면 마지막 사용 시각이 오래된 항목부터 삭제합니다.
+        """
+        try:
+            entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_dir.glob('*.json')]
+        except OSError:
+            return
+        entries.sort(key=lambda e: e[0])
+
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in entries:
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            over_count = self.max_entries is not None and count > self.max_entries
+            if not (over_bytes or over_count):
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            count -= 1
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.json'):
+            path.unlink()
+
+def default_response_cache():
+    """
+    환경 변수 LLM_CACHE_POLICY (기본 'seeded')와 LLM_CACHE_MAX_MB로 설정한 캐시를 반환합니다.
+    """
+    policy = os.getenv('LLM_CACHE_POLICY', DEFAULT_POLICY)
+    max_mb = os.getenv('LLM_CACHE_MAX_MB')
+    if max_mb:
+        return ResponseCache(policy=policy, max_bytes=int(float(max_mb) * 1024**2))
+    return ResponseCache(policy=policy)
+
+def cached_generate(cache, model_id, system_prompt, user_prompt, params, generate, parse=None, scope=None):
+    """
+    캐시에 응답이 있으면 재사용하고, 없으면 generate()를 호출해 결과를 저장합니다.
+
+    parse가 주어지면 응답을 parse로 변환해 반환하고, parse에 성공한 응답만 저장합니다.
+    (파싱할 수 없는 응답이 캐시에 남아 재시도 때 다시 반환되지 않도록)
+    저장된 응답의 parse가 실패하면 그 항목을 지우고 다시 생성합니다.
+
+    Args:
+        cache (ResponseCache or None): None이면 캐시 미사용
+        model_id (str): 모델 식별자
+        system_prompt, user_prompt (str): 프롬프트
+        params (dict): 샘플링 파라미터 (KEY_PARAMS)
+        generate (callable): 인자 없이 응답 문자열을 반환하는 함수
+        parse (callable, optional): 응답 문자열을 받아 결과를 반환하는 함수 (실패 시 예외)
+        scope (str, optional): 캐시 키 네임스페이스 (예: simul_name)
+
+    Returns:
+        parse가 있으면 parse(응답), 없으면 응답 텍스트
+    """
+    parse = parse or (lambda response: response)
+    if cache is None:
+        return parse(generate())
+
+    key, payload = cache.make_key(model_id, system_prompt, user_prompt, params, scope=scope)
+    response = cache.get(key, params)
+    if response is not None:
+        try:
+            result = parse(response)
+        except Exception as e:
+            print(f"[경고] 캐시된 LLM 응답을 파싱하지 못해 삭제하고 다시 생성합니다 ({key[:12]}): {e}")
+            cache.discard(key)
+        else:
+            print(f"[알림] LLM 응답 캐시 적중 ({model_id}, {key[:12]}) - 추론을 생략합니다.")
+            return result
+
+    response = generate()
+    result = parse(response)  # 실패하면 저장하지 않고 예외를 그대로 전달
+    cache.put(key, payload, response)
+    return result
+
+if __name__ == "__main__":
+    cache = ResponseCache(cache_dir=RESPONSE_CACHE_DIR / "_selftest", policy='always', max_entries=2)
+    params = {'temperature': 0.2, 'top_p': 0.8, 'seed': None, 'max_new_tokens': 16, 'do_sample': True}
+    for i in range(3):
+        print(cached_generate(cache, 'echo', 'system', f'user {i}', params, lambda: f'response {i}'))
+    print(cached_generate(cache, 'echo', 'system', 'user 2', params, lambda: 'not called'))
+    print(len(list(cache.cache_dir.glob('*.json'))), "entries")
+    cache.clear()
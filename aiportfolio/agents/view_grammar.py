@@ -0,0 +1,259 @@
+import re
+
+import torch
+import transformers
+
+# 뷰 JSON 스키마 제약 디코딩
+# 생성 중 매 스텝마다 "지금까지의 출력 + 후보 토큰"이 아래 형식의 접두사가 될 수 있는 토큰만 남기고,
+# JSON 배열이 닫히면 바로 생성을 멈춥니다. (출력이 항상 json.loads로 파싱 가능)
+#
+#   [{"sector_1": "<섹터> (Long)", "sector_2": "<섹터> (Short)", "relative_return_view": <숫자>, "reasoning": "<문장>"}, ...]
+#
+# - 뷰 개수: 1 ~ MAX_VIEWS (시스템 프롬프트의 "up to 5")
+# - 섹터: GICS 11개 섹터 이름만 허용 (converting_viewtomatrix의 섹터 순서와 동일)
+#   sector_2는 sector_1과 다른 섹터만 허용 (같으면 P 행이 0이 되어 Ω가 특이행렬)
+# - 공백/줄바꿈 없는 한 줄 형식 (시스템 프롬프트 system_prompt_상윤.txt의 예시와 동일)
+# - 문자열 길이 상한이 있으므로 생성 토큰 수의 상한도 max_chars()로 정해짐
+
+GICS_SECTORS = [
+    "Energy", "Materials", "Industrials", "Consumer Discretionary", "Consumer Staples",
+    "Health Care", "Financials", "Information Technology", "Communication Services",
+    "Utilities", "Real Estate",
+]
+MAX_VIEWS = 5
+MAX_NUMBER_CHARS = 9
+MAX_REASONING_CHARS = 400
+
+# 후보 토큰 검사 개수 (점수 상위 TOP_CANDIDATES개 중 유효한 토큰만 남김. 하나도 없으면 나머지를 순서대로 검사)
+TOP_CANDIDATES = 64
+SCAN_CHUNK = 4096
+
+# relative_return_view: 절댓값 1 미만의 소수 (예: 0.025, -0.01). 19영업일 수익률 차이이므로 100% 이상은 허용하지 않음
+_NUMBER_PARTIAL = re.compile(r'-?(0(\.\d*)?)?')
+_NUMBER_COMPLETE = re.compile(r'-?0(\.\d+)?')
+_NUMBER_CHARS = set('-0123456789.')
+
+# 뷰 객체 하나의 구성 (리터럴, 섹터 문자열 (이름 뒤에 붙는 접미사), 숫자, 자유 문자열)
+_OBJECT = (
+    ('lit', '{"sector_1": '),
+    ('sector', ' (Long)'),
+    ('lit', ', "sector_2": '),
+    ('sector', ' (Short)'),
+    ('lit', ', "relative_return_view": '),
+    ('number', MAX_NUMBER_CHARS),
+    ('lit', ', "reasoning": '),
+    ('string', MAX_REASONING_CHARS),
+    ('lit', '}'),
+)
+
+# 상태: (단계, 완성한 뷰 수, 객체 내 구성 번호, 현재 구성에서 읽은 문자열, 현재 객체에서 이미 고른 섹터)
+# 단계: 'start' ('[' 대기), 'obj' (객체 안), 'sep' (', ' 또는 ']' 대기), 'done' (배열 닫힘)
+START = ('start', 0, 0, '', ())
+
+def _sector_choices(suffix, chosen):
+    # 같은 객체에서 이미 고른 섹터는 제외
+    return {f'"{s}{suffix}"': s for s in GICS_SECTORS if s not in chosen}
+
+def _advance_char(state, c):
+    """
+    문자 하나를 읽은 다음 상태 (형식에 맞지 않으면 None)
+    """
+    phase, count, seg, buf, chosen = state
+
+    if phase == 'start':
+        return ('obj', 0, 0, '', ()) if c == '[' else None
+
+    if phase == 'sep':
+        buf += c
+        if buf == ']':
+            return ('done', count, 0, '', ())
+        if count < MAX_VIEWS and ', '.startswith(buf):
+            return ('obj', count, 0, '', ()) if buf == ', ' else ('sep', count, 0, buf, ())
+        return None
+
+    if phase == 'done':
+        return None
+
+    kind, spec = _OBJECT[seg]
+
+    if kind == 'lit':
+        buf += c
+        if not spec.startswith(buf):
+            return None
+        return _next_segment(count, seg, chosen) if buf == spec else ('obj', count, seg, buf, chosen)
+
+    if kind == 'sector':
+        buf += c
+        choices = _sector_choices(spec, chosen)
+        if not any(choice.startswith(buf) for choice in choices):
+            return None
+        if buf in choices:
+            return _next_segment(count, seg, chosen + (choices[buf],))
+        return ('obj', count, seg, buf, chosen)
+
+    if kind == 'number':
+        if c in _NUMBER_CHARS and len(buf) < spec and _NUMBER_PARTIAL.fullmatch(buf + c):
+            return ('obj', count, seg, buf + c, chosen)
+        # 숫자가 끝났으면 다음 구성에서 이 문자를 읽음
+        if _NUMBER_COMPLETE.fullmatch(buf):
+            return _advance_char(_next_segment(count, seg, chosen), c)
+        return None
+
+    # 'string': 여는 따옴표, 본문 (따옴표/역슬래시/제어문자 제외), 닫는 따옴표
+    if not buf:
+        return ('obj', count, seg, '"', chosen) if c == '"' else None
+    if c == '"':
+        return _next_segment(count, seg, chosen)
+    if c == '\\' or c < ' ' or len(buf) > spec:
+        return None
+    return ('obj', count, seg, buf + c, chosen)
+
+def _next_segment(count, seg, chosen):
+    if seg + 1 < len(_OBJECT):
+        return ('obj', count, seg + 1, '', chosen)
+    return ('sep', count + 1, 0, '', ())
+
+def advance(state, text):
+    """
+    문자열을 읽은 다음 상태 (형식에 맞지 않으면 None)
+    """
+    for c in text:
+        state = _advance_char(state, c)
+        if state is None:
+            return None
+    return state
+
+def is_complete(state):
+    return state is not None and state[0] == 'done'
+
+def max_chars():
+    """
+    형식에 맞는 출력의 최대 길이 (문자 수). 토큰은 최소 한 문자이므로 생성 토큰 수의 상한이 됩니다.
+    """
+    per_view = sum(
+        len(spec) if kind == 'lit'
+        else max(map(len, _sector_choices(spec, ()))) if kind == 'sector'
+        else spec if kind == 'number'
+        else spec + 2
+        for kind, spec in _OBJECT
+    )
+    return 1 + MAX_VIEWS * per_view + (MAX_VIEWS - 1) * len(', ') + 1
+
+_token_text_memo = {}
+
+def _token_texts(tokenizer):
+    """
+    토큰 id별 디코딩 문자열 (특수 토큰, 빈 문자열, 불완전한 UTF-8 조각은 None). 토크나이저별로 한 번만 계산
+    """
+    key = (tokenizer.name_or_path, len(tokenizer))
+    if key not in _token_text_memo:
+        special = set(tokenizer.all_special_ids) | set(getattr(tokenizer, 'added_tokens_decoder', {}))
+        texts = tokenizer.batch_decode([[i] for i in range(len(tokenizer))])
+        _token_text_memo[key] = [
+            None if i in special or not text or '�' in text else text
+            for i, text in enumerate(texts)
+        ]
+    return _token_text_memo[key]
+
+class _GrammarTracker:
+    """
+    배치의 행별 문법 상태 (생성된 토큰을 한 번씩만 읽음)
+
+    파이프라인은 batch_size마다 generate를 새로 호출하므로, 입력의 프롬프트 부분이 바뀌면 상태를 초기화합니다.
+    """
+
+    def __init__(self, tokenizer):
+        self.texts = _token_texts(tokenizer)
+        self.prompt = None
+        self.states = []
+        self.consumed = 0
+
+    def sync(self, input_ids):
+        batch, length = input_ids.shape
+        if (self.prompt is None or batch != self.prompt.shape[0] or length < self.consumed
+                or not torch.equal(input_ids[:, :self.prompt.shape[1]], self.prompt)):
+            self.prompt = input_ids.clone()
+            self.states = [START] * batch
+            self.consumed = length
+            return
+
+        for row in range(batch):
+            for token_id in input_ids[row, self.consumed:].tolist():
+                state = self.states[row]
+                if state is None or is_complete(state):
+                    break  # 완료 후의 EOS/패딩, 또는 제약을 벗어난 행
+                text = self.texts[token_id] if token_id < len(self.texts) else None
+                self.states[row] = advance(state, text) if text is not None else None
+                if self.states[row] is None:
+                    print(f"[경고] 배치 {row}번 출력이 뷰 형식을 벗어났습니다. 이 행은 제약 없이 생성합니다.")
+        self.consumed = length
+
+class ViewSchemaLogitsProcessor(transformers.LogitsProcessor):
+    """
+    뷰 JSON 형식을 벗어나는 토큰의 점수를 -inf로 만드는 logits processor
+    (배열이 닫힌 행은 EOS만 허용)
+    """
+
+    def __init__(self, tokenizer, eos_token_ids):
+        self.tracker = _GrammarTracker(tokenizer)
+        self.eos_token_ids = [i for i in eos_token_ids if i is not None]
+
+    def _allowed(self, state, row_scores):
+        if is_complete(state):
+            return self.eos_token_ids
+
+        texts = self.tracker.texts
+        order = torch.topk(row_scores, min(TOP_CANDIDATES, row_scores.shape[-1])).indices.tolist()
+        allowed = [i for i in order if i < len(texts) and texts[i] is not None and advance(state, texts[i]) is not None]
+        if allowed:
+            return allowed
+
+        # 상위 후보에 유효한 토큰이 없으면 점수 순서대로 나머지를 검사
+        order = torch.argsort(row_scores, descending=True).tolist()
+        for lo in range(TOP_CANDIDATES, len(order), SCAN_CHUNK):
+            allowed = [i for i in order[lo:lo + SCAN_CHUNK]
+                       if i < len(texts) and texts[i] is not None and advance(state, texts[i]) is not None]
+            if allowed:
+                return allowed
+        return self.eos_token_ids
+
+    def __call__(self, input_ids, scores):
+        self.tracker.sync(input_ids)
+        for row, state in enumerate(self.tracker.states):
+            if state is None:
+                continue
+            allowed = torch.tensor(self._allowed(state, scores[row]), device=scores.device)
+            kept = scores[row, allowed]
+            # top_p 등으로 이미 모두 -inf가 된 경우 허용 토큰끼리 균등하게 선택
+            if torch.isinf(kept).all():
+                kept = torch.zeros_like(kept)
+            scores[row] = float('-inf')
+            scores[row, allowed] = kept
+        return scores
+
+class ViewJsonStoppingCriteria(transformers.StoppingCriteria):
+    """
+    모든 행의 JSON 배열이 닫히면 (또는 형식을 벗어나면) 생성을 멈춥니다.
+    """
+
+    def __init__(self, processor):
+        self.tracker = processor.tracker
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.tracker.sync(input_ids)
+        done = [is_complete(state) for state in self.tracker.states]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+def view_constraints(tokenizer, eos_token_ids):
+    """
+    파이프라인/generate에 넘길 제약 디코딩 인자
+
+    Returns:
+        dict: logits_processor, stopping_criteria, max_new_tokens (형식상 최대 길이)
+    """
+    processor = ViewSchemaLogitsProcessor(tokenizer, eos_token_ids)
+    return {
+        'logits_processor': transformers.LogitsProcessorList([processor]),
+        'stopping_criteria': transformers.StoppingCriteriaList([ViewJsonStoppingCriteria(processor)]),
+        'max_new_tokens': max_chars() + 1,
+    }
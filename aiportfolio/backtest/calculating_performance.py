@@ -6,8 +6,10 @@ import numpy as np
 
 from aiportfolio.util.sector_mapping import map_gics_sector_to_code
 from aiportfolio.util.making_rollingdate import get_rolling_dates, get_backtest_dates
-from aiportfolio.BL_MVO.BL_params.market_params import Market_Params
+from aiportfolio.BL_MVO.BL_opt import get_equilibrium_outputs
+from aiportfolio.BL_MVO.BL_params.rolling_params import rolling_market_params, window_params
 from aiportfolio.BL_MVO.MVO_opt import MVO_Optimizer
+from aiportfolio.util.expanding_stats import expanding_sharpe
 
 # !!!!!!!!!! 일별데이터 전처리 완료되면 의존성 수정해야함
 from aiportfolio.backtest.preprocessing_2차수정 import final_abnormal_returns
@@ -18,6 +20,7 @@ class backtest():
         self.Tier = Tier
         self.forecast_period = forecast_period
         self.backtest_days_count = backtest_days_count
+        self._daily_returns = None  # 일별 섹터 초과수익률 행렬 캐시 (_daily_return_matrix)
 
     def open_BL_MVO_log(self):
         """
@@ -76,12 +79,18 @@ class backtest():
             print(f"open_BL_MVO_log 처리 중 오류 발생: {e}")
             return None
 
-    def get_NONE_view_BL_weight(self):
+    def get_NONE_view_BL_weight(self, rolling=None, cov_method=None):
         """
         Black-Litterman 프레임워크를 사용하되 뷰가 없는 상태(P=0)로 MVO와 동일한 결과를 산출합니다.
 
-        이 함수는 BL 모델에서 P=0 (뷰 없음)으로 설정하여 μ_BL = π (시장 균형 수익률)을 얻고,
-        이를 기반으로 Sharpe Ratio 최적화를 수행합니다. 수학적으로 순수 MVO와 동일한 결과를 보장합니다.
+        P=0 (뷰 없음)이면 μ_BL = π (시장 균형 수익률)이 정확히 성립하므로,
+        BL 공식을 거치지 않고 get_equilibrium_outputs로 π를 바로 사용해 Sharpe Ratio 최적화를 수행합니다.
+
+        Args:
+            rolling (dict, optional): rolling_market_params()의 결과.
+                scene()에서 AI 포트폴리오 계산에 쓴 값을 넘기면 시장 파라미터를 다시 계산하지 않습니다.
+            cov_method (str, optional): AI 포트폴리오와 같은 공분산 추정 방식.
+                표본공분산(None, 'sample')이 아니면 rolling 대신 날짜별로 Market_Params(cov_method=...)로 계산합니다.
 
         Returns:
             pd.DataFrame: Long 형식 가중치
@@ -91,9 +100,15 @@ class backtest():
         """
         forecast_dates = get_rolling_dates(self.forecast_period)
 
+        # rolling_market_params는 표본공분산만 계산하므로 다른 추정 방식이면 날짜별로 계산
+        shared = cov_method in (None, 'sample')
+        if shared and rolling is None:
+            rolling = rolling_market_params(forecast_dates)
+
         all_data = []
+        warm_state = None  # 직전 forecast_date의 MVO 해 (다음 날짜의 warm start)
 
-        for period in forecast_dates:
+        for i, period in enumerate(forecast_dates):
             start_date = period['start_date']
             end_date = period['end_date']
             forecast_date = period['forecast_date']
@@ -101,47 +116,15 @@ class backtest():
             print(f"  - {forecast_date.date()} MVO 가중치 계산 중...")
 
             try:
-                # BL 변수 생성
-                market_params = Market_Params(start_date, end_date)
-                Pi = market_params.making_pi()      # Equilibrium excess returns (π)
-                sigma = market_params.making_sigma()  # Covariance matrix (Σ)
-                sigma_for_optimize = market_params.making_sigma_for_optimize()
-                sectors = sigma[1]
-                num_sectors = len(sectors)
-
-                P = np.zeros((1, num_sectors))
-                Q = np.zeros((1, 1))
-                Omega = np.eye(1)
-                tau = 0.000000000000000001
-
-                # --- Execute the Black-Litterman formula ---
-                pi_np = (Pi.values.flatten() if isinstance(Pi, pd.DataFrame) else Pi.flatten()).reshape(-1, 1)
-                sigma_np = sigma[0].values if isinstance(sigma[0], pd.DataFrame) else sigma[0]
-
-                # Calculate intermediate terms
-                tau_sigma_inv = np.linalg.inv(tau * sigma_np)
-                omega_inv = np.linalg.inv(Omega)
-                PT_omega_inv = P.T @ omega_inv
-
-                # Term A: [ (τΣ)^(-1) + P^T·Ω^(-1)·P ]
-                term_A = tau_sigma_inv + PT_omega_inv @ P
-
-                # Term B: [ (τΣ)^(-1)·π + P^T·Ω^(-1)·Q ]
-                term_B_part1 = tau_sigma_inv @ pi_np
-                term_B_part2 = PT_omega_inv @ Q
-                term_B = term_B_part1 + term_B_part2
-
-                # Calculate posterior expected returns (μ_BL)
-                mu_BL = np.linalg.inv(term_A) @ term_B
-
-                # [검증] μ_BL ≈ π 확인
-                diff = np.max(np.abs(mu_BL.flatten() - pi_np.flatten()))
-                if diff > 0.001:
-                    print(f"    [경고] μ_BL과 π의 차이: {diff:.6f}")
+                # μ_BL = π (뷰 없는 BL의 닫힌 형태)
+                mu_BL, sigma_for_optimize, sectors = get_equilibrium_outputs(
+                    start_date, end_date, params=window_params(rolling, i) if shared else None, cov_method=cov_method
+                )
 
                 # MVO 실행
-                mvo = MVO_Optimizer(mu_BL.flatten(), sigma_for_optimize[0], sectors)
+                mvo = MVO_Optimizer(mu_BL.flatten(), sigma_for_optimize, sectors, warm_start=warm_state)
                 w_tan, sectors = mvo.optimize_tangency_1()
+                warm_state = mvo.warm_state
 
                 # w_tan을 1차원 배열로 변환
                 w_tan_flat = w_tan.flatten()
@@ -164,18 +147,33 @@ class backtest():
 
         return pd.DataFrame(all_data)
 
-    def performance_of_portfolio(self, portfolio_weights, portfolio_name="Portfolio"):
+    def _daily_return_matrix(self):
         """
-        여러 예측 기준일에 대해 포트폴리오의 백테스트 성과를 계산합니다.
+        일별 섹터별 초과수익률 (date × gsector) 행렬을 로드합니다.
+        인스턴스에 캐시되므로 여러 포트폴리오를 백테스트해도 한 번만 만듭니다.
+        """
+        if self._daily_returns is None:
+            daily_return_df = final_abnormal_returns()
+
+            # date를 인덱스로 설정 (preprocessing_2차수정.py는 'date' 컬럼 사용)
+            if 'date' in daily_return_df.columns:
+                daily_return_df = daily_return_df.set_index('date')
+            elif 'DlyCalDt' in daily_return_df.columns:
+                daily_return_df = daily_return_df.set_index('DlyCalDt')
+
+            self._daily_returns = daily_return_df.sort_index()
+
+        return self._daily_returns
+
+    def _backtest_windows(self, dates):
+        """
+        각 forecast_date의 백테스트 구간을 일별 수익률 행렬의 행 번호로 계산합니다.
 
         Args:
-            portfolio_weights (pd.DataFrame): 포트폴리오 가중치
-            portfolio_name (str): 포트폴리오 이름
-                - 'AI_portfolio': LLM 뷰 + BL + MVO 최적화 결과
-                - 'NONE_view': 뷰 없는 BL (P=0, 시장 균형 베이스라인)
+            dates (pd.DatetimeIndex): 정렬된 일별 수익률 행렬의 인덱스
 
         Returns:
-            dict: 백테스트 성과 지표
+            list: [(forecast_date, forecast_date_dt, rows), ...] - rows는 backtest_days_count개의 행 번호
         """
         # forecast_period를 리스트로 변환 (단일 날짜인 경우 대비)
         if not isinstance(self.forecast_period, list):
@@ -183,133 +181,173 @@ class backtest():
         else:
             forecast_period = self.forecast_period
 
-        # 일별 섹터별 초과수익률 데이터 로드 (한 번만 로드)
-        daily_return_df = final_abnormal_returns()
-
-        # date를 인덱스로 설정 (preprocessing_2차수정.py는 'date' 컬럼 사용)
-        if 'date' in daily_return_df.columns:
-            daily_return_df = daily_return_df.set_index('date')
-        elif 'DlyCalDt' in daily_return_df.columns:
-            daily_return_df = daily_return_df.set_index('DlyCalDt')
-
-        # 결과를 저장할 딕셔너리
-        results = {}
-
-        # 각 forecast_date에 대해 백테스트 수행
+        windows = []
         for forecast_date in forecast_period:
-            print(f"[{portfolio_name}] 백테스트 시작: {forecast_date}")
-
             try:
-                # 백테스트 시작 날짜 계산
+                # 백테스트 시작 날짜 계산 후 시작일 이후의 첫 거래일 위치 탐색
                 backtest_start_date = get_backtest_dates(forecast_date)
+                start = dates.searchsorted(backtest_start_date, side='left')
+                n_available = len(dates) - start
 
-                # 백테스트 시작일 이후의 데이터만 필터링
-                available_dates = daily_return_df.index[daily_return_df.index >= backtest_start_date]
-
-                if len(available_dates) == 0:
+                if n_available == 0:
                     raise ValueError(f"[오류] {backtest_start_date.date()} 이후 데이터가 없습니다.")
 
                 # backtest_days_count 만큼의 거래일 선택
-                if len(available_dates) < self.backtest_days_count:
+                if n_available < self.backtest_days_count:
                     raise ValueError(
                         f"[오류] 요청한 {self.backtest_days_count}일보다 사용 가능한 데이터가 적습니다. "
-                        f"(사용 가능한 데이터: {len(available_dates)}일)"
+                        f"(사용 가능한 데이터: {n_available}일)"
                     )
 
-                # 백테스트 기간 데이터 추출
-                backtest_period_dates = available_dates[:self.backtest_days_count]
-                backtest_returns = daily_return_df.loc[backtest_period_dates]
-
-                print(f"[알림] 백테스트 기간: {backtest_period_dates[0].date()} ~ {backtest_period_dates[-1].date()} ({len(backtest_period_dates)}일)")
-
-                # forecast_date에 해당하는 포트폴리오 가중치 가져오기
                 # 문자열인 경우 YY-MM-DD 형식으로 파싱
                 if isinstance(forecast_date, str):
                     forecast_date_dt = pd.to_datetime(forecast_date, format='%y-%m-%d')
                 else:
                     forecast_date_dt = pd.to_datetime(forecast_date)
 
-                portfolio_weights_date = portfolio_weights[portfolio_weights['ForecastDate'] == forecast_date_dt]
+                windows.append((forecast_date, forecast_date_dt, np.arange(start, start + self.backtest_days_count)))
 
-                if portfolio_weights_date.empty:
-                    print(f"[경고] {forecast_date_dt.date()}에 대한 포트폴리오 가중치가 없습니다. 건너뜁니다.")
-                    continue
+            except Exception as e:
+                print(f"[오류] {forecast_date} 백테스트 실패: {e}")
+                continue
+
+        return windows
 
-                # 가중치를 Series로 변환 (SECTOR를 인덱스로)
-                weights = portfolio_weights_date.set_index('SECTOR')['Weight']
+    @staticmethod
+    def _weight_matrix(portfolio_weights, forecast_dates_dt, sectors):
+        """
+        long 형식 가중치를 (기준일 × 섹터) 행렬로 정렬합니다. 가중치가 없는 칸은 NaN
+        """
+        if portfolio_weights is None or portfolio_weights.empty:
+            return np.full((len(forecast_dates_dt), len(sectors)), np.nan)
 
-                # 포트폴리오 일별 수익률 계산
-                portfolio_daily_returns = []
+        wide = portfolio_weights.pivot_table(index='ForecastDate', columns='SECTOR', values='Weight', aggfunc='sum')
+        return wide.reindex(index=forecast_dates_dt, columns=sectors).to_numpy(dtype=float)
 
-                for date in backtest_period_dates:
-                    daily_sector_returns = backtest_returns.loc[date]
+    def performance_of_portfolios(self, portfolios):
+        """
+        여러 포트폴리오의 백테스트 성과를 모든 예측 기준일에 대해 한 번에 계산합니다.
 
-                    # 가중치와 수익률을 곱해서 포트폴리오 수익률 계산
-                    portfolio_return = 0.0
-                    for sector in weights.index:
-                        if sector in daily_sector_returns.index:
-                            portfolio_return += weights[sector] * daily_sector_returns[sector]
+        일별 수익률 행렬에서 각 기준일의 백테스트 구간을 (D × T × S) 블록으로 한 번에 꺼내고,
+        포트폴리오별 가중치를 (P × D × S)로 정렬한 뒤 배치 행렬곱 한 번으로
+        모든 포트폴리오·기준일의 일별 수익률 (P × D × T)을 계산합니다.
 
-                    portfolio_daily_returns.append(portfolio_return)
+        Args:
+            portfolios (dict): {portfolio_name: portfolio_weights} -
+                portfolio_weights는 ForecastDate, SECTOR, Weight 컬럼의 long 형식 DataFrame
+
+        Returns:
+            dict: {portfolio_name: performance_of_portfolio()와 같은 형식의 결과}
+        """
+        daily_return_df = self._daily_return_matrix()
+        dates = daily_return_df.index
+        sectors = daily_return_df.columns
+
+        windows = self._backtest_windows(dates)
+        names = list(portfolios)
+        n_windows = len(self.forecast_period) if isinstance(self.forecast_period, list) else 1
+        results = {name: {} for name in names}
+
+        if windows:
+            forecast_dates_dt = [w[1] for w in windows]
+            rows = np.stack([w[2] for w in windows])                         # D×T
+            block = daily_return_df.to_numpy(dtype=float)[rows]              # D×T×S
+
+            # 포트폴리오별 가중치를 (기준일 × 섹터)로 정렬. 가중치가 없는 섹터는 NaN
+            weights = np.stack([
+                self._weight_matrix(portfolios[name], forecast_dates_dt, sectors) for name in names
+            ])                                                               # P×D×S
+            held = ~np.isnan(weights)
+
+            # r_p,d,t = Σ_s w_p,d,s · R_d,t,s  (배치 행렬곱 한 번)
+            block_isnan = np.isnan(block)
+            daily = np.matmul(np.where(block_isnan, 0.0, block)[None], np.nan_to_num(weights)[..., None])[..., 0]
+
+            # 보유 섹터의 수익률이 결측이면 해당 일의 포트폴리오 수익률도 결측 (기존 계산과 동일)
+            missing = np.matmul(block_isnan[None].astype(float), held[..., None].astype(float))[..., 0] > 0
+            daily[missing] = np.nan
+
+            # 일별 누적 Sharpe Ratio (expanding window)도 전체 (P × D × T)에 대해 한 번에 계산
+            cumulative_sharpe = expanding_sharpe(daily)
+
+        for p, name in enumerate(names):
+            for d, (forecast_date, forecast_date_dt, window_rows) in enumerate(windows):
+                print(f"[{name}] 백테스트 시작: {forecast_date}")
+
+                if not held[p, d].any():
+                    print(f"[경고] {forecast_date_dt.date()}에 대한 포트폴리오 가중치가 없습니다. 건너뜁니다.")
+                    continue
+
+                backtest_period_dates = dates[window_rows]
+                print(f"[알림] 백테스트 기간: {backtest_period_dates[0].date()} ~ {backtest_period_dates[-1].date()} ({len(backtest_period_dates)}일)")
 
                 # 결과를 Series로 저장
-                portfolio_returns_series = pd.Series(portfolio_daily_returns, index=backtest_period_dates)
-
-                # 누적 수익률 계산
-                cumulative_return = (1 + portfolio_returns_series).cumprod() - 1
-                final_return = cumulative_return.iloc[-1]
-
-                # 평균 일별 수익률
-                avg_daily_return = portfolio_returns_series.mean()
-
-                # 변동성 (표준편차)
-                volatility = portfolio_returns_series.std()
-
-                # 샤프 비율 (연율화, 무위험 수익률 0 가정)
-                sharpe_ratio = (avg_daily_return / volatility) * (252 ** 0.5) if volatility != 0 else 0
-
-                # 일별 누적 Sharpe Ratio 계산 (expanding window)
-                # 각 영업일까지의 일별 수익률을 사용하여 Sharpe Ratio 계산
-                cumulative_sharpe_ratios = []
-                for i in range(1, len(portfolio_returns_series) + 1):
-                    # i일까지의 일별 수익률
-                    returns_so_far = portfolio_returns_series.iloc[:i]
-
-                    # 평균과 표준편차 계산
-                    mean_return = returns_so_far.mean()
-                    std_return = returns_so_far.std()
-
-                    # Sharpe Ratio 계산 (연율화)
-                    if std_return != 0:
-                        sharpe = (mean_return / std_return) * (252 ** 0.5)
-                    else:
-                        sharpe = 0.0
-
-                    cumulative_sharpe_ratios.append(sharpe)
-
-                # 결과 저장 (상세 정보 포함)
-                # JSON 직렬화를 위해 키를 문자열로, pandas 객체를 리스트/문자열로 변환
-                results[forecast_date_dt.strftime('%Y-%m-%d')] = {
-                    'portfolio_name': portfolio_name,
-                    'forecast_date': forecast_date_dt.strftime('%Y-%m-%d'),
-                    'daily_returns': portfolio_returns_series.tolist(),
-                    'cumulative_returns': cumulative_return.tolist(),
-                    'cumulative_sharpe_ratios': cumulative_sharpe_ratios,
-                    'final_return': float(final_return),
-                    'avg_daily_return': float(avg_daily_return),
-                    'volatility': float(volatility),
-                    'sharpe_ratio': float(sharpe_ratio),
-                    'backtest_start': backtest_period_dates[0].strftime('%Y-%m-%d'),
-                    'backtest_end': backtest_period_dates[-1].strftime('%Y-%m-%d'),
-                    'backtest_days': len(backtest_period_dates)
-                }
+                portfolio_returns_series = pd.Series(daily[p, d], index=backtest_period_dates)
+                results[name][forecast_date_dt.strftime('%Y-%m-%d')] = self._summarize_returns(
+                    portfolio_returns_series, name, forecast_date_dt, cumulative_sharpe[p, d]
+                )
 
-            except Exception as e:
-                print(f"[오류] {forecast_date} 백테스트 실패: {e}")
-                continue
+            print(f"\n{'='*60}")
+            print(f"[{name}] 백테스트 완료: {len(results[name])}/{n_windows}개 성공")
+            print(f"{'='*60}\n")
+
+        return results
 
-        print(f"\n{'='*60}")
-        print(f"[{portfolio_name}] 백테스트 완료: {len(results)}/{len(forecast_period)}개 성공")
-        print(f"{'='*60}\n")
+    def performance_of_portfolio(self, portfolio_weights, portfolio_name="Portfolio"):
+        """
+        여러 예측 기준일에 대해 포트폴리오의 백테스트 성과를 계산합니다.
 
-        return results
\ No newline at end of file
+        Args:
+            portfolio_weights (pd.DataFrame): 포트폴리오 가중치
+            portfolio_name (str): 포트폴리오 이름
+                - 'AI_portfolio': LLM 뷰 + BL + MVO 최적화 결과
+                - 'NONE_view': 뷰 없는 BL (P=0, 시장 균형 베이스라인)
+
+        Returns:
+            dict: 백테스트 성과 지표
+        """
+        return self.performance_of_portfolios({portfolio_name: portfolio_weights})[portfolio_name]
+
+    @staticmethod
+    def _summarize_returns(portfolio_returns_series, portfolio_name, forecast_date_dt, cumulative_sharpe=None):
+        """
+        한 기준일의 일별 포트폴리오 수익률로 성과 지표를 계산합니다.
+        cumulative_sharpe가 없으면 expanding_sharpe로 직접 계산합니다.
+        """
+        backtest_period_dates = portfolio_returns_series.index
+
+        # 누적 수익률 계산
+        cumulative_return = (1 + portfolio_returns_series).cumprod() - 1
+        final_return = cumulative_return.iloc[-1]
+
+        # 평균 일별 수익률
+        avg_daily_return = portfolio_returns_series.mean()
+
+        # 변동성 (표준편차)
+        volatility = portfolio_returns_series.std()
+
+        # 샤프 비율 (연율화, 무위험 수익률 0 가정)
+        sharpe_ratio = (avg_daily_return / volatility) * (252 ** 0.5) if volatility != 0 else 0
+
+        # 일별 누적 Sharpe Ratio (expanding window, 누적합으로 O(n))
+        # 각 영업일까지의 일별 수익률을 사용하여 Sharpe Ratio 계산 (연율화)
+        if cumulative_sharpe is None:
+            cumulative_sharpe = expanding_sharpe(portfolio_returns_series.to_numpy(dtype=float))
+        cumulative_sharpe_ratios = cumulative_sharpe.tolist()
+
+        # 결과 저장 (상세 정보 포함)
+        # JSON 직렬화를 위해 키를 문자열로, pandas 객체를 리스트/문자열로 변환
+        return {
+            'portfolio_name': portfolio_name,
+            'forecast_date': forecast_date_dt.strftime('%Y-%m-%d'),
+            'daily_returns': portfolio_returns_series.tolist(),
+            'cumulative_returns': cumulative_return.tolist(),
+            'cumulative_sharpe_ratios': cumulative_sharpe_ratios,
+            'final_return': float(final_return),
+            'avg_daily_return': float(avg_daily_return),
+            'volatility': float(volatility),
+            'sharpe_ratio': float(sharpe_ratio),
+            'backtest_start': backtest_period_dates[0].strftime('%Y-%m-%d'),
+            'backtest_end': backtest_period_dates[-1].strftime('%Y-%m-%d'),
+            'backtest_days': len(backtest_period_dates)
+        }
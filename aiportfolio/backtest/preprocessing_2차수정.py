@@ -1,5 +1,12 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
 import pandas as pd
 
+from aiportfolio.BL_MVO.prepare.sector_excess_return import PANEL_CACHE_DIR, file_fingerprint
+from aiportfolio.util.data_load.dataset import load_daily
 from aiportfolio.util.data_load.open_DTB3 import open_rf_rate
 from aiportfolio.util.data_load.open_final_stock_daily import open_final_stock_daily
 from aiportfolio.util.data_load.open_final_stock_months import open_final_stock_months
@@ -27,102 +34,341 @@ def preprocess_rf_rate():
 
 # --- 2) 포트폴리오 가중치 산출에 이용된 종목들만 필터링하기 위한 더미 데이터프레임 ---
 def filtering_dummy():
-    df_month = open_final_stock_months()
-
-    df_month['date'] = pd.to_datetime(df_month['cyear'].astype(str) + '-' + df_month['cmonth'].astype(str)) + pd.offsets.MonthEnd(0)
+    df_month = open_final_stock_months()  # date 컬럼 (각 연월의 말일) 포함
 
     df_month = df_month.sort_values(['Ticker', 'date'])
-    df_month['sp500_lag1'] = df_month.groupby('Ticker')['sp500'].shift(1) # 전 월 sp500 값
+    df_month['sp500_lag1'] = df_month.groupby('Ticker', observed=True)['sp500'].shift(1, fill_value=False) # 전 월 sp500 값
 
-    df_sp = df_month[df_month['sp500_lag1']==1].copy()
+    df_sp = df_month[df_month['sp500_lag1']].copy()
 
     df_sp['month'] = df_sp['date'].dt.to_period('M')
     flag_tickers = df_sp[['month', 'Ticker']].drop_duplicates()
 
     return flag_tickers
 
-# ---------- 3) 일별 s&p 500의 초과수익률 제작 ----------
-def sector_daily_returns():
-    df = open_final_stock_daily()
-
-    df.rename(columns={'DlyCalDt': 'date'}, inplace=True) # 컬럼명 변경
-    df["date"] = pd.to_datetime(df["date"]) # 날짜 형식 변환
-
-    # 가중치 계산에 사용된 종목만 필터링(여기부터 결측치X)
-    df['month'] = df['date'].dt.to_period('M')
-    a = filtering_dummy()
-    daily_filtered = df.merge(a, on=['month','Ticker'])
-
-    # 초과수익률 계산
+# ---------- 3) 일별 섹터/시장 집계 (단일 패스) ----------
+# 집계에 필요한 컬럼만 읽음 (column projection)
+DAILY_COLUMNS = ['Ticker', 'DlyCalDt', 'DlyRet', 'DlyCap', 'gsector']
+
+def _lagged_cap(rows, last_cap=None):
+    """
+    종목별 전일 시가총액 (groupby-shift).
+    last_cap (Ticker → 직전 시가총액)이 주어지면 각 종목의 첫 행을 그 값으로 채워,
+    앞부분을 잘라낸 데이터로도 전체 데이터로 계산한 것과 같은 값을 얻습니다. (증분 갱신용)
+    """
+    grouped = rows.groupby('Ticker', observed=True)
+    prev_cap = grouped['DlyCap'].shift(1)
+    if last_cap is not None:
+        first_row = grouped.cumcount() == 0
+        prev_cap = prev_cap.where(~first_row, last_cap.reindex(rows['Ticker']).to_numpy())
+    return prev_cap
+
+def _last_cap(rows, prev=None):
+    """
+    종목별 마지막 행의 시가총액 (다음 증분 갱신의 전일 시가총액).
+    prev가 주어지면 이번 구간에 없는 종목은 prev의 값을 유지합니다.
+    """
+    cap = rows.drop_duplicates('Ticker', keep='last').set_index('Ticker')['DlyCap']
+    if prev is None:
+        return cap
+    return pd.concat([prev[~prev.index.isin(cap.index)], cap])
+
+def daily_aggregates(df=None, state=None):
+    """
+    일별 종목 데이터를 한 번만 읽어 섹터 집계와 시장 집계를 함께 만듭니다.
+
+    파일 읽기, 날짜 변환, 무위험 수익률 병합은 한 번만 하고, 두 집계는 각각 기존과 같은 행으로 계산합니다.
+    - 섹터: 전 월 S&P500 편입 종목의 행 (중복 제거 없음). 전일 시가총액은 필터된 행 안에서의 종목별 직전 행
+    - 시장: (Ticker, date) 중복은 시가총액이 가장 큰 행만 남긴 전 종목. 전일 시가총액은 종목별 직전 행
+
+    Args:
+        df (pd.DataFrame, optional): 일별 종목 데이터 (None이면 DAILY_COLUMNS만 로드)
+        state (pd.DataFrame, optional): 직전 구간의 종목별 마지막 시가총액
+            (Ticker 인덱스, 'sector_cap', 'total_cap' 컬럼. 증분 갱신용)
+
+    Returns:
+        tuple: (sector_agg, total_agg, state)
+            - sector_agg (pd.DataFrame): date, gsector, sector_prevmktcap, n_stocks, sector_excess_return
+            - total_agg (pd.DataFrame): date, total_mktcap, total_ret_x_cap, total_excess_return
+            - state (pd.DataFrame): 다음 증분 갱신에 넘길 종목별 마지막 시가총액
+    """
+    if df is None:
+        df = open_final_stock_daily(columns=DAILY_COLUMNS)
+
+    df = df[DAILY_COLUMNS].rename(columns={'DlyCalDt': 'date'}) # 컬럼명 변경
+    df['date'] = pd.to_datetime(df['date']) # 날짜 형식 변환
+
+    # 초과수익률 계산 (두 집계 공통)
     df_rf = preprocess_rf_rate()
-    merged_df = pd.merge(daily_filtered, df_rf, on='date', how='left') # 종목 데이터 기준으로 병합
-    merged_df['excess_return'] = merged_df['DlyRet'] - merged_df['rf_daily'] # 일별 초과수익률 계산
-
-    merged_df['prev_DlyCap'] = merged_df.groupby('Ticker')['DlyCap'].shift(1)
-
-    # 가중수익률 계산
-    merged_df["_ret_x_cap"] = merged_df["excess_return"] * merged_df["prev_DlyCap"]
+    df = pd.merge(df, df_rf, on='date', how='left') # 종목 데이터 기준으로 병합
+    df['excess_return'] = df['DlyRet'] - df['rf_daily'] # 일별 초과수익률 계산
 
-    group_keys = ['date', 'gsector']
-    agg = (
-    merged_df.groupby(group_keys, dropna=False)
-            .agg(sector_prevmktcap=("prev_DlyCap", "sum"),
-                ret_x_cap_sum=("_ret_x_cap", "sum"),
-                n_stocks=("Ticker", "count"))
-            .reset_index())
+    sector_state = None if state is None else state['sector_cap'].dropna()
+    total_state = None if state is None else state['total_cap'].dropna()
 
-    mask = agg["sector_prevmktcap"] != 0
-    agg["sector_excess_return"] = agg["ret_x_cap_sum"].div(agg["sector_prevmktcap"]).where(mask)
-
-    # 중간열 제거 및 정리
-    agg = agg.drop(columns=["ret_x_cap_sum"])
-    agg = agg.sort_values(['date', 'gsector']).reset_index(drop=True).copy()
-    
-    return agg
-
-# ---------- 4) 일별 market의 초과수익률 제작 ----------
-def total_daily_returns():
-    df = open_final_stock_daily()
-
-    df.rename(columns={'DlyCalDt': 'date'}, inplace=True) # 컬럼명 변경
-    df["date"] = pd.to_datetime(df["date"]) # 날짜 형식 변환
+    # 섹터: 가중치 계산에 사용된 종목만 필터링 (전 월 S&P500 편입)
+    df['month'] = df['date'].dt.to_period('M')
+    sector_rows = df.merge(filtering_dummy(), on=['month', 'Ticker'])
+    sector_rows['prev_DlyCap'] = _lagged_cap(sector_rows, sector_state)
+    sector_rows['_ret_x_cap'] = sector_rows['excess_return'] * sector_rows['prev_DlyCap']
+
+    sector_agg = (
+        sector_rows.groupby(['date', 'gsector'], dropna=False)
+        .agg(sector_prevmktcap=('prev_DlyCap', 'sum'),
+             ret_x_cap_sum=('_ret_x_cap', 'sum'),
+             n_stocks=('Ticker', 'count'))
+        .reset_index()
+    )
+    mask = sector_agg['sector_prevmktcap'] != 0
+    sector_agg['sector_excess_return'] = sector_agg['ret_x_cap_sum'].div(sector_agg['sector_prevmktcap']).where(mask)
+    sector_agg = sector_agg.drop(columns=['ret_x_cap_sum'])
+    sector_agg = sector_agg.sort_values(['date', 'gsector']).reset_index(drop=True)
 
-    # 날짜 중복되는 종목 처리(시가총액이 가장 큰 것 선택)
-    filtered_df = (
+    # 시장: 날짜 중복되는 종목 처리(시가총액이 가장 큰 것 선택, 원래 행 순서 유지)
+    total_rows = (
         df.sort_values(['Ticker', 'date', 'DlyCap'], ascending=[True, True, False])
         .drop_duplicates(subset=['Ticker', 'date'], keep='first')
         .sort_index()
         .reset_index(drop=True)
     )
+    total_rows['prev_DlyCap'] = _lagged_cap(total_rows, total_state)
+    total_rows['_ret_x_cap'] = total_rows['excess_return'] * total_rows['prev_DlyCap']
 
-    # 초과수익률 계산
-    df_rf = preprocess_rf_rate()
-    merged_df = pd.merge(filtered_df, df_rf, on='date', how='left') # 종목 데이터 기준으로 병합
-    merged_df['excess_return'] = merged_df['DlyRet'] - merged_df['rf_daily'] # 일별 초과수익률 계산
+    total_agg = total_rows.groupby('date').agg(
+        total_mktcap=('prev_DlyCap', 'sum'),
+        total_ret_x_cap=('_ret_x_cap', 'sum')
+    ).reset_index()
+    mask = total_agg['total_mktcap'] != 0 # 분모 0 방지
+    total_agg['total_excess_return'] = total_agg['total_ret_x_cap'].div(total_agg['total_mktcap']).where(mask)
 
-    merged_df['prev_DlyCap'] = merged_df.groupby('Ticker')['DlyCap'].shift(1)
+    new_state = pd.concat({
+        'sector_cap': _last_cap(sector_rows, sector_state),
+        'total_cap': _last_cap(total_rows, total_state),
+    }, axis=1)
 
-    merged_df["_ret_x_cap"] = merged_df["excess_return"] * merged_df["prev_DlyCap"]
-    agg = merged_df.groupby("date").agg(
-        total_mktcap=("prev_DlyCap", "sum"),
-        total_ret_x_cap=("_ret_x_cap", "sum")
-    ).reset_index()
+    return sector_agg, total_agg, new_state
 
-    # 분모 0 방지
-    mask = agg["total_mktcap"] != 0
-    agg["total_excess_return"] = agg["total_ret_x_cap"].div(agg["total_mktcap"]).where(mask)
+# ---------- 4) 일별 s&p 500 섹터 / market의 초과수익률 ----------
+def sector_daily_returns():
+    return daily_aggregates()[0]
 
-    return agg
+def total_daily_returns():
+    return daily_aggregates()[1]
 
 # ---------- 5) abnormal return 제작 ----------
-def final_abnormal_returns():
-    a = sector_daily_returns()
-    b = total_daily_returns()
+def build_abnormal_returns(df=None, state=None):
+    """
+    일별 섹터 abnormal return 행렬 (date × gsector)을 계산합니다.
+
+    Args:
+        df (pd.DataFrame, optional): 일별 종목 데이터 (None이면 필요한 컬럼만 로드)
+        state (pd.DataFrame, optional): 직전 구간의 종목별 마지막 상태 (daily_aggregates 참고)
+
+    Returns:
+        tuple: (matrix, state) - matrix는 date 인덱스의 wide DataFrame,
+            state는 다음 증분 갱신에 넘길 종목별 마지막 시가총액
+    """
+    a, b, state = daily_aggregates(df, state=state)
     merged_df = pd.merge(a, b, on='date', how='inner')
 
     merged_df['abnormal_return'] = merged_df['sector_excess_return'] - merged_df['total_excess_return']
 
     pivoted_df = merged_df.pivot(index='date', columns='gsector', values='abnormal_return')
-    df_reset = pivoted_df.reset_index()
 
-    return df_reset
\ No newline at end of file
+    return pivoted_df, state
+
+# ---------- 6) abnormal return 행렬 캐시 ----------
+# 백테스트마다 일별 패널 전체를 다시 집계하지 않도록 (date × gsector) 행렬을
+# database/cache/abnormal_returns.parquet 에 저장하고, 새 일별 데이터가 추가되면
+# 마지막 저장일 이후의 행만 읽어 이어 붙인다.
+ABNORMAL_RETURN_SOURCES = [
+    Path("database/final_processed_stock_data.parquet"),
+    Path("database/final_stock_months.parquet"),
+    Path("database/DTB3.csv"),
+]
+ABNORMAL_RETURN_NAME = "abnormal_returns"
+
+_abnormal_memo = {}   # 'matrix' -> (지문 키, 행렬)
+
+def _abnormal_cache_paths():
+    base = PANEL_CACHE_DIR / ABNORMAL_RETURN_NAME
+    return base.with_suffix('.parquet'), base.with_suffix('.meta.json'), base.with_suffix('.state.parquet')
+
+def _history_sha(rows, sha=None):
+    """
+    일별 종목 행 (집계에 쓰는 DAILY_COLUMNS만)을 날짜 순서 (같은 날짜는 파일 순서)로 해시에 이어 넣습니다.
+    날짜 순서로 넣으므로 마지막 저장일 이후의 새 행만 이어 넣어도 전체를 다시 해시한 것과 같습니다.
+    """
+    sha = hashlib.sha256() if sha is None else sha
+    rows = rows.sort_values('DlyCalDt', kind='stable')
+    sha.update(pd.util.hash_pandas_object(rows[DAILY_COLUMNS], index=False).to_numpy().tobytes())
+    return sha
+
+def _daily_history_hash(until):
+    """
+    DlyCalDt <= until 인 일별 종목 행의 해시 객체. (행 수뿐 아니라 과거 값이 수정된 경우도 감지)
+    """
+    return _history_sha(load_daily(end=until, columns=DAILY_COLUMNS, source=ABNORMAL_RETURN_SOURCES[0]))
+
+def _read_daily_after(date):
+    """
+    DlyCalDt > date 인 일별 종목 데이터만 읽습니다. (새 구간의 row group만 로드)
+    """
+    start = pd.Timestamp(date) + pd.Timedelta(days=1)
+    return load_daily(start=start, columns=DAILY_COLUMNS, source=ABNORMAL_RETURN_SOURCES[0])
+
+def _load_abnormal_cache():
+    """
+    저장된 행렬, 메타, 상태를 읽습니다. 하나라도 없거나 읽을 수 없으면 None
+    """
+    matrix_path, meta_path, state_path = _abnormal_cache_paths()
+    if not (matrix_path.exists() and meta_path.exists() and state_path.exists()):
+        return None
+
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        # 메모리 맵으로 열어 복사 없이 로드. parquet는 문자열 컬럼명만 지원하므로 원래 섹터 코드로 복원
+        matrix = pd.read_parquet(matrix_path, memory_map=True).set_index('date')
+        matrix.columns = pd.Index(meta['columns'], name='gsector')
+
+        state = pd.read_parquet(state_path).set_index('Ticker')[['sector_cap', 'total_cap']]
+    except Exception as e:
+        print(f"[경고] abnormal return 캐시를 읽지 못해 다시 계산합니다: {e}")
+        return None
+
+    return matrix, meta, state
+
+def _read_abnormal_sources():
+    """
+    메타에 저장된 원천 지문을 {경로: 지문}으로 읽습니다. (없거나 읽을 수 없으면 빈 dict)
+    """
+    meta_path = _abnormal_cache_paths()[1]
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return {item.get('path'): item for item in json.load(f).get('sources', [])}
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return {}
+
+def _persist_abnormal_cache(matrix, state, fingerprint, history_sha256):
+    """
+    행렬, 상태(종목별 마지막 시가총액), 메타(원천 지문, 마지막 날짜, 마지막 날짜까지의 일별 행 해시)를 저장합니다. (임시 파일 후 교체)
+    history_sha256은 호출자가 이미 계산한 값을 받습니다. (일별 데이터를 다시 읽지 않음)
+    """
+    matrix_path, meta_path, state_path = _abnormal_cache_paths()
+    try:
+        matrix_path.parent.mkdir(parents=True, exist_ok=True)
+
+        stored = matrix.copy()
+        stored.columns = [str(c) for c in matrix.columns]
+        tmp_path = matrix_path.with_suffix('.parquet.tmp')
+        stored.reset_index().to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, matrix_path)
+
+        tmp_state = state_path.with_suffix('.parquet.tmp')
+        state.rename_axis('Ticker').reset_index().to_parquet(tmp_state, index=False)
+        os.replace(tmp_state, state_path)
+
+        last_date = matrix.index.max()
+        meta = {
+            'sources': fingerprint,
+            'columns': [None if pd.isna(c) else int(c) for c in matrix.columns],  # gsector는 int8 코드
+            'last_date': last_date.strftime('%Y-%m-%d'),
+            'history_sha256': history_sha256,
+        }
+        tmp_meta = meta_path.with_suffix('.json.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_meta, meta_path)
+    except OSError as e:
+        print(f"[경고] abnormal return 캐시 저장 실패 (계산 결과는 그대로 사용): {e}")
+
+def _update_abnormal_cache(cached, fingerprint):
+    """
+    일별 데이터가 마지막 저장일 뒤에만 추가된 경우 새 구간만 집계해 이어 붙입니다.
+    월별 종목 파일이나 DTB3가 바뀌었거나, 마지막 저장일까지의 일별 행이 하나라도 바뀌었다면
+    None을 반환해 전체 재계산을 유도합니다.
+    """
+    matrix, meta, state = cached
+    last_date = pd.Timestamp(meta['last_date'])
+
+    cached_hashes = {item.get('path'): item.get('sha256') for item in meta.get('sources', [])}
+    for item in fingerprint[1:]:
+        if cached_hashes.get(item['path']) != item['sha256']:
+            print(f"[알림] {item['path']}이(가) 바뀌어 abnormal return 행렬을 전체 재계산합니다.")
+            return None
+
+    history = _daily_history_hash(last_date)
+    if history.hexdigest() != meta.get('history_sha256'):
+        print(f"[알림] {last_date.date()} 이전 일별 데이터가 바뀌어 abnormal return 행렬을 전체 재계산합니다.")
+        return None
+
+    new_rows = _read_daily_after(last_date)
+    if new_rows.empty:
+        # 내용은 그대로이고 파일만 다시 쓴 경우: 지문만 갱신
+        _persist_abnormal_cache(matrix, state, fingerprint, history.hexdigest())
+        return matrix
+
+    print(f"[알림] abnormal return 행렬 증분 갱신: {last_date.date()} 이후 {new_rows['DlyCalDt'].nunique()}일")
+    new_matrix, state = build_abnormal_returns(new_rows, state=state)
+    new_matrix = new_matrix[new_matrix.index > last_date]
+
+    matrix = pd.concat([matrix, new_matrix]).sort_index()
+    matrix.columns.name = 'gsector'
+    # 새 행은 모두 마지막 저장일 뒤이므로 검증에 쓴 해시에 이어 넣으면 새 마지막 날짜까지의 해시가 됨
+    new_rows = new_rows[new_rows['DlyCalDt'] <= matrix.index.max()]
+    _persist_abnormal_cache(matrix, state, fingerprint, _history_sha(new_rows, history).hexdigest())
+    return matrix
+
+def abnormal_return_matrix(use_cache=True, rebuild=False):
+    """
+    일별 섹터 abnormal return 행렬 (date 인덱스 × gsector 컬럼)을 반환합니다.
+
+    원천 파일이 그대로면 저장된 행렬을 메모리 맵으로 열기만 하고,
+    일별 데이터가 뒤에 추가된 경우에는 새 날짜만 집계해 이어 붙입니다.
+    (과거 일별 데이터, 월별 종목 파일, DTB3가 수정된 경우는 자동으로 감지해 전체 재계산)
+
+    Args:
+        use_cache (bool): False이면 캐시를 무시하고 항상 다시 계산 (저장하지 않음)
+        rebuild (bool): True이면 캐시를 버리고 전체를 다시 계산해 저장
+
+    Returns:
+        pd.DataFrame: date 인덱스, gsector 컬럼의 abnormal return 행렬
+    """
+    if not use_cache:
+        return build_abnormal_returns()[0]
+
+    # 경로/mtime/size가 메타와 같으면 저장된 해시를 재사용 (바뀐 파일만 내용 해시)
+    known = _read_abnormal_sources()
+    fingerprint = [file_fingerprint(path, known.get(str(path))) for path in ABNORMAL_RETURN_SOURCES]
+    key = tuple(item['sha256'] for item in fingerprint)
+
+    cached_memo = _abnormal_memo.get('matrix')
+    if not rebuild and cached_memo is not None and cached_memo[0] == key:
+        return cached_memo[1].copy()
+
+    matrix = None
+    cached = None if rebuild else _load_abnormal_cache()
+    if cached is not None:
+        cached_hashes = [item.get('sha256') for item in cached[1].get('sources', [])]
+        if cached_hashes == list(key):
+            matrix = cached[0]
+        else:
+            matrix = _update_abnormal_cache(cached, fingerprint)
+
+    if matrix is None:
+        matrix, state = build_abnormal_returns()
+        _persist_abnormal_cache(matrix, state, fingerprint, _daily_history_hash(matrix.index.max()).hexdigest())
+
+    _abnormal_memo['matrix'] = (key, matrix)
+    return matrix.copy()
+
+def final_abnormal_returns(use_cache=True):
+    """
+    일별 섹터 abnormal return을 date 컬럼 + gsector 컬럼 형태로 반환합니다. (백테스트 입력)
+
+    Args:
+        use_cache (bool): False이면 캐시를 무시하고 항상 다시 계산
+    """
+    return abnormal_return_matrix(use_cache=use_cache).reset_index()
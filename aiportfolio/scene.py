@@ -1,16 +1,167 @@
+import multiprocessing
 import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
 
 from .BL_MVO.BL_opt import get_bl_outputs
 from .BL_MVO.MVO_opt import MVO_Optimizer
+from .BL_MVO.BL_params.rolling_params import rolling_market_params, window_params
 from .util.making_rollingdate import get_rolling_dates
 from .util.sector_mapping import map_code_to_gics_sector
+from .BL_MVO.BL_params.market_params import Market_Params
 from .util.save_log_as_json import save_BL_as_json, save_performance_as_json
 from aiportfolio.backtest.calculating_performance import backtest
 from aiportfolio.backtest.visalization import calculate_average_cumulative_returns
 
-def scene(simul_name, Tier, tau, forecast_period, backtest_days_count, model='llama'):
+def prepare_views(runs, forecast_period, model='llama', batch_size=8):
+    """
+    여러 시뮬레이션의 모든 예측 기준일 뷰를 한 번의 배치 요청으로 미리 생성합니다.
+
+    Args:
+        runs (list): [(simul_name, Tier, seed), ...] (seed는 반복 실험 구분용, None 가능)
+        forecast_period (list): 예측 기준일 목록 (scene과 동일)
+        model (str): 'llama' 또는 'gemini'
+        batch_size (int): Llama 3 배치 크기
+
+    Returns:
+        dict: {simul_name: {pd.Timestamp(end_date): 뷰 리스트}} (생성/파싱 실패한 날짜는 제외)
+    """
+    # LLM 의존성(transformers/torch)은 뷰가 필요한 경우에만 로드
+    from .agents.Llama_view_generator import generate_sector_views_batch
+
+    end_dates = [period['end_date'] for period in get_rolling_dates(forecast_period)]
+    requests = [{'end_date': end_date, 'simul_name': simul_name, 'Tier': Tier, 'seed': seed}
+                for simul_name, Tier, seed in runs for end_date in end_dates]
+    results = generate_sector_views_batch(requests, model=model, batch_size=batch_size)
+
+    views = {simul_name: {} for simul_name, _, _ in runs}
+    for request, views_data in zip(requests, results):
+        if views_data is not None:
+            views[request['simul_name']][pd.Timestamp(request['end_date'])] = views_data
+    return views
+
+def _bl_mvo_task(tau, period, params, simul_name, Tier, model, universe, cov_method, views, warm_start=None):
+    """
+    한 예측 기준일의 시장 파라미터 -> BL -> MVO를 수행합니다. (프로세스 풀에서 실행되는 CPU 단계)
+
+    Returns:
+        tuple: (scenario_result, warm_state)
+    """
+    start_date = period['start_date']
+    end_date = period['end_date']
+
+    # BL 실행
+    if params is None:
+        params = Market_Params(start_date, end_date, universe=universe, cov_method=cov_method).compute_all()
+    BL = get_bl_outputs(tau, start_date=start_date, end_date=end_date, simul_name=simul_name, Tier=Tier, model=model,
+                        params=params, views=views)
+
+    # MVO 실행
+    mvo = MVO_Optimizer(mu=BL[0], sigma=BL[1], sectors=BL[2], warm_start=warm_start,
+                        sigma_factor=params.get('sigma_for_optimize_factor'))
+    w_tan = mvo.optimize_tangency_1()[0]
+
+    # w_tan을 1차원 배열로 변환
+    w_tan_flat = w_tan.flatten()
+
+    # 결과 저장
+    if universe == 'stock':
+        # 종목 가중치를 섹터별로 합산 (섹터 단위 백테스트용)
+        w_stock = pd.Series(w_tan_flat, index=BL[2])
+        w_sector = w_stock.groupby(params['gsector'].reindex(BL[2]).values).sum()
+        w_sector = w_sector.reindex(Market_Params.expected_index, fill_value=0.0)
+        scenario_result = {
+            "forecast_date": period['forecast_date'],
+            "w_aiportfolio": [f"{weight * 100:.4f}%" for weight in w_sector.values],
+            "SECTOR": map_code_to_gics_sector(Market_Params.expected_index),
+            "TICKER": list(BL[2]),
+            "w_stock": [f"{weight * 100:.4f}%" for weight in w_tan_flat],
+        }
+    else:
+        scenario_result = {
+            "forecast_date": period['forecast_date'],
+            "w_aiportfolio": [f"{weight * 100:.4f}%" for weight in w_tan_flat],
+            "SECTOR": map_code_to_gics_sector(BL[2])
+        }
+    return scenario_result, mvo.warm_state
+
+def _bl_mvo_chunk(tau, periods, params_list, simul_name, Tier, model, universe, cov_method, views_list):
+    """
+    연속된 기준일들의 BL/MVO를 순서대로 수행합니다. (프로세스 풀의 작업 단위)
+    한 작업 안에서는 직전 기준일의 MVO 해를 다음 기준일의 warm start로 이어 씁니다.
+
+    Returns:
+        list: 기준일 순서대로 scenario_result
+    """
+    results = []
+    warm_state = None
+    for period, params, views in zip(periods, params_list, views_list):
+        result, warm_state = _bl_mvo_task(tau, period, params, simul_name, Tier, model, universe, cov_method, views,
+                                          warm_start=warm_state)
+        results.append(result)
+    return results
+
+def _produce_views(forecast_date, simul_name, Tier, model, batch_size, views, out_queue):
+    """
+    뷰 생성 단계 (GPU/API): batch_size개 기준일씩 뷰를 생성해 뷰 로그에 저장하고
+    기준일 순서대로 (i, 뷰 리스트)를 out_queue에 넣습니다. 끝나면 (None, None),
+    오류가 나면 (None, 예외)를 넣습니다.
+
+    배치에서 파싱에 실패한 날짜는 기존처럼 해당 날짜만 다시 생성합니다.
+    """
+    try:
+        from .agents.Llama_view_generator import generate_sector_views, generate_sector_views_batch
+
+        for lo in range(0, len(forecast_date), batch_size):
+            chunk = list(enumerate(forecast_date[lo:lo + batch_size], lo))
+            chunk_views = {i: views.get(pd.Timestamp(period['end_date'])) for i, period in chunk}
+
+            missing = [(i, period) for i, period in chunk if chunk_views[i] is None]
+            if missing:
+                requests = [{'end_date': period['end_date'], 'simul_name': simul_name, 'Tier': Tier}
+                            for _, period in missing]
+                results = generate_sector_views_batch(requests, model=model, batch_size=batch_size)
+                for (i, period), views_data in zip(missing, results):
+                    if views_data is None:
+                        views_data = generate_sector_views(None, period['end_date'], simul_name, Tier, model)
+                    chunk_views[i] = views_data
+
+            for i, _ in chunk:
+                out_queue.put((i, chunk_views[i]))
+    except Exception as e:
+        out_queue.put((None, e))
+        return
+    out_queue.put((None, None))
+
+def scene(simul_name, Tier, tau, forecast_period, backtest_days_count, model='llama', universe='sector', cov_method=None,
+          views=None, batch_size=8, workers=0):
     """
     전체 시뮬레이션 실행 함수
+
+    universe='stock'이면 BL/MVO를 S&P500 구성 종목 단위로 수행합니다.
+    이때 로그에는 종목별 가중치(TICKER, w_stock)를 함께 저장하고,
+    w_aiportfolio에는 종목 가중치를 섹터별로 합산한 섹터 노출을 기록하여
+    기존 섹터 단위 백테스트를 그대로 사용합니다.
+
+    cov_method로 공분산 추정 방식('sample', 'ledoit_wolf', 'ewma', 'factor')을 바꿀 수 있습니다.
+    (None이면 universe별 기본값. 팩터 표현이 있으면 MVO가 Woodbury 풀이를 사용)
+
+    뷰 생성과 BL/MVO는 두 단계의 생산자/소비자 파이프라인으로 실행됩니다.
+    - 생산자 (스레드): batch_size개 기준일씩 LLM 뷰를 생성해 뷰 로그에 저장
+    - 소비자: 뷰가 나온 기준일부터 바로 시장 파라미터 -> BL -> MVO 수행
+
+    views는 prepare_views로 미리 만든 {pd.Timestamp(end_date): 뷰 리스트}입니다. 있는 날짜는 생성을 생략합니다.
+
+    workers=0 (기본값)이면 소비자가 한 프로세스에서 기준일 순서대로 실행하고
+    직전 기준일의 MVO 해를 warm start로 사용합니다. (기준일당 BL/MVO는 수 ms라 대부분 이 방식이 가장 빠름)
+    workers > 0이면 생산자의 배치 (연속된 batch_size개 기준일)마다 작업 하나를 spawn 프로세스 풀에 보내
+    LLM 생성과 BL/MVO를 겹칩니다. 작업 안에서는 warm start를 이어 쓰고, 배치 경계에서만 새로 시작합니다.
+    작업 프로세스마다 패키지를 다시 임포트하는 비용 (수백 ms)이 있으므로 종목 단위처럼 기준일당 계산이 무거울 때만 쓰세요.
+    - 뷰를 생성할 배치가 2개 이상일 때만 (겹칠 구간이 있을 때만) 프로세스 풀을 사용하고, 아니면 workers=0처럼 실행합니다.
+    - spawn을 사용하므로 scene을 호출하는 스크립트는 `if __name__ == "__main__":` 안에서 실행해야 합니다.
     """
     # 결과를 저장할 디렉토리 생성
     base_dir = os.path.join("database", "logs")
@@ -27,44 +178,79 @@ def scene(simul_name, Tier, tau, forecast_period, backtest_days_count, model='ll
     # 학습기간 설정        
     forecast_date = get_rolling_dates(forecast_period)
 
-    results = []
-
-    # 기간별 BL -> MVO 수행
-    for period in forecast_date:
+    # 모든 학습기간의 섹터 시장 파라미터(Σ, λ, π 등)를 한 번에 계산 (NONE_view 베이스라인과 공유)
+    rolling = rolling_market_params(forecast_date)
 
-        print(f"--- forecast_date: {period['forecast_date']} ---")
-        start_date = period['start_date']
-        end_date = period['end_date']
+    def period_params(i):
+        # 종목 단위/다른 공분산 추정은 작업 안에서 계산 (CPU 단계에 포함)
+        if universe == 'stock' or cov_method not in (None, 'sample'):
+            return None
+        return window_params(rolling, i)
 
-        # BL 실행
-        BL = get_bl_outputs(tau, start_date=start_date, end_date=end_date, simul_name=simul_name, Tier=Tier, model=model)
+    # 1단계: 뷰 생성 (스레드)
+    view_queue = queue.Queue()
+    producer = threading.Thread(
+        target=_produce_views,
+        args=(forecast_date, simul_name, Tier, model, batch_size, views or {}, view_queue),
+        daemon=True,
+    )
+    producer.start()
 
-        # MVO 실행
-        mvo = MVO_Optimizer(mu=BL[0], sigma=BL[1], sectors=BL[2])
-        w_tan = mvo.optimize_tangency_1()[0]
+    def ready_views():
+        # 뷰가 생성되는 순서대로 (i, 뷰 리스트) 반환
+        while True:
+            i, item = view_queue.get()
+            if i is None:
+                if item is not None:
+                    raise item
+                return
+            print(f"[알림] {forecast_date[i]['forecast_date']} 뷰 준비 완료 → BL/MVO 시작")
+            yield i, item
 
-        # w_tan을 1차원 배열로 변환
-        w_tan_flat = w_tan.flatten()
+    # 2단계: 기간별 BL -> MVO 수행
+    results = [None] * len(forecast_date)
+    chunks = [list(range(lo, min(lo + batch_size, len(forecast_date)))) for lo in range(0, len(forecast_date), batch_size)]
+    missing_chunks = {i // batch_size for i, period in enumerate(forecast_date)
+                      if pd.Timestamp(period['end_date']) not in (views or {})}
+    if workers and len(missing_chunks) < 2:
+        print("[알림] 뷰 생성과 겹칠 구간이 없어 프로세스 풀 없이 순서대로 실행합니다.")
+        workers = 0
 
-        # 결과 저장
-        scenario_result = {
-            "forecast_date": period['forecast_date'],
-            "w_aiportfolio": [f"{weight * 100:.4f}%" for weight in w_tan_flat],
-            "SECTOR": map_code_to_gics_sector(BL[2])
-        }
-        results.append(scenario_result)
+    if workers == 0:
+        warm_state = None  # 직전 forecast_date의 MVO 해 (다음 날짜의 warm start)
+        for i, views_data in ready_views():
+            print(f"--- forecast_date: {forecast_date[i]['forecast_date']} ---")
+            results[i], warm_state = _bl_mvo_task(tau, forecast_date[i], period_params(i), simul_name, Tier, model,
+                                                  universe, cov_method, views_data, warm_start=warm_state)
+    else:
+        # 생산자 스레드가 CUDA를 사용하므로 fork 대신 spawn으로 작업 프로세스 생성
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            ready, futures = {}, {}
+            for i, views_data in ready_views():
+                ready[i] = views_data
+                chunk = chunks[i // batch_size]
+                if all(j in ready for j in chunk):
+                    # 배치의 뷰가 모두 준비되면 연속된 기준일을 한 작업으로 전달 (작업 안에서 warm start 유지)
+                    future = pool.submit(_bl_mvo_chunk, tau, [forecast_date[j] for j in chunk],
+                                         [period_params(j) for j in chunk], simul_name, Tier, model, universe,
+                                         cov_method, [ready.pop(j) for j in chunk])
+                    futures[future] = chunk
+            for future, chunk in futures.items():
+                for j, result in zip(chunk, future.result()):
+                    results[j] = result
+    producer.join()
 
     save_BL_as_json(results, simul_name, Tier)
 
     test = backtest(simul_name, Tier, forecast_period, backtest_days_count)
     BL_result = test.open_BL_MVO_log()
-    none_view_result = test.get_NONE_view_BL_weight()
-
-    BL_backtest_result = test.performance_of_portfolio(BL_result, portfolio_name='AI_portfolio')
-    save_performance_as_json(BL_backtest_result, simul_name, Tier)
+    none_view_result = test.get_NONE_view_BL_weight(rolling=rolling, cov_method=cov_method)  # AI 포트폴리오와 같은 Σ/π 사용
 
-    none_view_backtest_result = test.performance_of_portfolio(none_view_result, portfolio_name='NONE_view')
-    save_performance_as_json(none_view_backtest_result, simul_name, Tier)
+    # 모든 포트폴리오·기준일의 일별 수익률을 한 번에 계산
+    backtest_results = test.performance_of_portfolios({'AI_portfolio': BL_result, 'NONE_view': none_view_result})
+    for backtest_result in backtest_results.values():
+        save_performance_as_json(backtest_result, simul_name, Tier)
 
     calculate_average_cumulative_returns(simul_name, Tier)
 
@@ -1,6 +1,8 @@
 import pandas as pd
 from datetime import datetime
 
+from aiportfolio.util.sp500_membership import load_sp500_periods, sp500_membership
+
 def match_sp500_by_date(filtered_file, sp500_file, output_file, 
                         ticker_column='Ticker', date_column='DlyCalDt'):
     """
@@ -40,7 +42,7 @@ def match_sp500_by_date(filtered_file, sp500_file, output_file,
     
     # 2단계: SP500 기간 파일 읽기
     print(f"\n[2단계] SP500 기간 파일 읽는 중: {sp500_file}")
-    df_sp500 = pd.read_csv(sp500_file)
+    df_sp500 = load_sp500_periods(sp500_file)  # end_date가 비어있으면 2099-12-31 (여전히 SP500에 포함)
     sp500_tickers = len(df_sp500)
     print(f"✓ SP500 기간 레코드 수: {sp500_tickers:,}개")
     
@@ -51,66 +53,13 @@ def match_sp500_by_date(filtered_file, sp500_file, output_file,
     df_filtered[date_column] = pd.to_datetime(df_filtered[date_column])
     print(f"✓ {date_column} 변환 완료")
     
-    # SP500 파일의 날짜 변환
-    df_sp500['start_date'] = pd.to_datetime(df_sp500['start_date'])
-    
-    # end_date가 비어있으면 현재 날짜로 대체 (여전히 SP500에 포함)
-    df_sp500['end_date'] = df_sp500['end_date'].fillna('2099-12-31')
-    df_sp500['end_date'] = pd.to_datetime(df_sp500['end_date'])
-    
-    print(f"✓ start_date, end_date 변환 완료")
-    
-    # Ticker를 대문자로 통일
-    df_filtered['ticker_upper'] = df_filtered[ticker_column].str.strip().str.upper()
-    df_sp500['ticker_upper'] = df_sp500['Ticker'].str.strip().str.upper()
-    
-    # 4단계: 매칭 수행
+    # 4단계: 매칭 수행 (종목/날짜 정수 키의 구간 탐색)
     print(f"\n[4단계] 기간별 매칭 진행 중...")
-    print(f"  (이 작업은 시간이 걸릴 수 있습니다...)")
-    
-    # 결과를 저장할 리스트
-    sp500_flags = []
-    
-    # 각 레코드에 대해 SP500 여부 확인
-    batch_size = 10000
-    total_batches = (total_records + batch_size - 1) // batch_size
-    
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min((batch_num + 1) * batch_size, total_records)
-        
-        batch_flags = []
-        for idx in range(start_idx, end_idx):
-            row = df_filtered.iloc[idx]
-            ticker = row['ticker_upper']
-            date = row[date_column]
-            
-            # 해당 ticker의 SP500 기간 찾기
-            sp500_periods = df_sp500[df_sp500['ticker_upper'] == ticker]
-            
-            # 날짜가 어떤 기간에라도 포함되는지 확인
-            is_in_sp500 = False
-            for _, period in sp500_periods.iterrows():
-                if period['start_date'] <= date <= period['end_date']:
-                    is_in_sp500 = True
-                    break
-            
-            batch_flags.append(1 if is_in_sp500 else 0)
-        
-        sp500_flags.extend(batch_flags)
-        
-        # 진행 상황 표시
-        if (batch_num + 1) % 10 == 0 or batch_num == total_batches - 1:
-            progress = ((batch_num + 1) / total_batches) * 100
-            processed = min((batch_num + 1) * batch_size, total_records)
-            print(f"  진행: {processed:,}/{total_records:,} ({progress:.1f}%)")
+    sp500_flags = sp500_membership(df_filtered[ticker_column], df_filtered[date_column], df_sp500)
     
     # sp500 열 추가
     df_filtered['sp500'] = sp500_flags
     
-    # 임시 열 삭제
-    df_filtered = df_filtered.drop(columns=['ticker_upper'])
-    
     # 매칭 결과 통계
     sp500_matched = df_filtered['sp500'].sum()
     non_sp500 = total_records - sp500_matched
@@ -0,0 +1,153 @@
+import pandas as pd
+import pyarrow.dataset as ds
+from pathlib import Path
+
+from aiportfolio.util.data_load.panel_schema import compact_daily, compact_monthly
+
+# python -m aiportfolio.util.data_load.dataset
+
+# 종목 패널 / 무위험 수익률의 구간 조회 계층
+# 날짜/종목 조건을 pyarrow dataset 필터로 넘겨 필요한 파티션, row group, 컬럼만 읽습니다.
+# - 단일 parquet 파일: row group의 날짜 통계로 건너뜀 (panel_schema.write_panel로 저장된 월 단위 row group)
+# - 파티션 디렉토리 (year=YYYY/month=M/): 조건에 맞지 않는 디렉토리는 열지 않음
+
+DAILY_SOURCE = Path("database/final_processed_stock_data.parquet")
+MONTHLY_SOURCE = Path("database/final_stock_months.parquet")
+RF_SOURCE = Path("database/DTB3.csv")
+
+def _open_dataset(source):
+    """
+    parquet 파일 또는 hive 파티션 디렉토리 (year=YYYY/month=M/)를 dataset으로 엽니다.
+    """
+    source = Path(source)
+    if not source.exists():
+        raise FileNotFoundError(f"'{source}' 파일을 찾을 수 없습니다.")
+    return ds.dataset(source, format='parquet', partitioning='hive' if source.is_dir() else None)
+
+def _combine(conditions):
+    expr = None
+    for cond in conditions:
+        expr = cond if expr is None else expr & cond
+    return expr
+
+def _period_filter(dataset, date_col, start, end):
+    """
+    날짜 컬럼 조건과, 파티션 컬럼(year, month)이 있으면 파티션 조건을 함께 만듭니다.
+    """
+    names = set(dataset.schema.names)
+    conditions = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field(date_col) >= start.to_pydatetime())
+        if 'year' in names:
+            conditions.append(ds.field('year') >= start.year)
+        if 'month' in names:
+            conditions.append((ds.field('year') > start.year) | (ds.field('month') >= start.month))
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field(date_col) <= end.to_pydatetime())
+        if 'year' in names:
+            conditions.append(ds.field('year') <= end.year)
+        if 'month' in names:
+            conditions.append((ds.field('year') < end.year) | (ds.field('month') <= end.month))
+    return _combine(conditions)
+
+def _ticker_filter(expr, tickers):
+    if tickers is None:
+        return expr
+    return _combine([c for c in (expr, ds.field('Ticker').isin(list(tickers))) if c is not None])
+
+def _read(dataset, columns, expr):
+    """
+    조건에 맞는 row group의 요청 컬럼만 읽어 pandas로 변환합니다. (파티션 컬럼은 제외)
+    """
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    table = dataset.to_table(columns=columns, filter=expr)
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    return df.drop(columns=[c for c in ('year', 'month') if c in df.columns and (columns is None or c not in columns)])
+
+def load_daily(start=None, end=None, columns=None, tickers=None, source=None):
+    """
+    일별 종목 데이터 중 [start, end] 구간과 지정 종목만 읽습니다.
+
+    Args:
+        start, end (str or Timestamp, optional): 조회 구간 (양 끝 포함, None이면 제한 없음)
+        columns (list, optional): 읽을 컬럼 목록 (None이면 전체)
+        tickers (list, optional): 읽을 종목 코드 (None이면 전체)
+        source (str or Path, optional): parquet 파일 또는 파티션 디렉토리 (기본: DAILY_SOURCE)
+
+    Returns:
+        pd.DataFrame: 표준 스키마 (panel_schema 참고)
+    """
+    dataset = _open_dataset(source or DAILY_SOURCE)
+    expr = _ticker_filter(_period_filter(dataset, 'DlyCalDt', start, end), tickers)
+    return compact_daily(_read(dataset, columns, expr))
+
+def load_monthly(start=None, end=None, columns=None, tickers=None, source=None):
+    """
+    월별 종목 데이터 중 [start, end] 구간 (월 단위)과 지정 종목만 읽습니다.
+
+    'date' 컬럼이 없는 이전 스키마의 파일은 cyear/cmonth로 구간을 거르고 'date'를 만들어 반환합니다.
+
+    Args:
+        start, end (str or Timestamp, optional): 조회 구간 (해당 월 포함, None이면 제한 없음)
+        columns (list, optional): 읽을 컬럼 목록 (None이면 전체)
+        tickers (list, optional): 읽을 종목 코드 (None이면 전체)
+        source (str or Path, optional): parquet 파일 또는 파티션 디렉토리 (기본: MONTHLY_SOURCE)
+
+    Returns:
+        pd.DataFrame: 표준 스키마와 월말 날짜 컬럼 'date'
+    """
+    dataset = _open_dataset(source or MONTHLY_SOURCE)
+    names = dataset.schema.names
+    requested = columns
+
+    # 월 단위 구간: start가 속한 월의 첫날 ~ end가 속한 월의 말일
+    start = None if start is None else pd.Timestamp(start).to_period('M').to_timestamp()
+    end = None if end is None else pd.Timestamp(end).to_period('M').to_timestamp(how='end')
+
+    if 'date' in names:
+        expr = _period_filter(dataset, 'date', start, end)
+    else:
+        # 이전 스키마: (cyear, cmonth) 정수 조건
+        conditions = []
+        if start is not None:
+            conditions.append((ds.field('cyear') > start.year)
+                              | ((ds.field('cyear') == start.year) & (ds.field('cmonth') >= start.month)))
+        if end is not None:
+            conditions.append((ds.field('cyear') < end.year)
+                              | ((ds.field('cyear') == end.year) & (ds.field('cmonth') <= end.month)))
+        expr = _combine(conditions)
+        if columns is not None and 'date' in columns:
+            columns = list(columns) + ['cyear', 'cmonth']
+
+    df = compact_monthly(_read(dataset, columns, _ticker_filter(expr, tickers)))
+    if requested is not None:
+        df = df[[c for c in requested if c in df.columns]]
+    return df
+
+def load_rf(start=None, end=None, source=None):
+    """
+    DTB3 무위험 수익률 중 [start, end] 구간만 반환합니다. (CSV는 날짜/값 컬럼만 읽음)
+
+    Returns:
+        pd.DataFrame: observation_date (datetime64), DTB3
+    """
+    df = pd.read_csv(source or RF_SOURCE, usecols=['observation_date', 'DTB3'], parse_dates=['observation_date'])
+    if start is not None:
+        df = df[df['observation_date'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['observation_date'] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+if __name__ == "__main__":
+    import time
+
+    t = time.time()
+    df = load_daily('2024-01-02', '2024-01-31', columns=['Ticker', 'DlyCalDt', 'DlyRet'])
+    print(f"load_daily: {len(df):,}행 ({time.time() - t:.2f}s)")
+
+    t = time.time()
+    df = load_monthly('2014-01-01', '2023-12-31')
+    print(f"load_monthly: {len(df):,}행 ({time.time() - t:.2f}s)")
@@ -2,7 +2,15 @@ import pandas as pd
 from pathlib import Path
 import sys
 
-def open_rf_rate():
+from aiportfolio.util.data_load.dataset import load_rf
+
+def open_rf_rate(start=None, end=None):
+    """
+    DTB3 무위험 수익률을 읽습니다.
+
+    Args:
+        start, end (str or Timestamp, optional): 읽을 날짜 구간 (양 끝 포함, None이면 전체)
+    """
     # 확인할 Parquet 파일 경로
     file_path = Path("database/DTB3.csv")
 
@@ -14,7 +22,10 @@ def open_rf_rate():
 
     try:
         # 1. Parquet 파일을 pandas 데이터프레임으로 읽기
-        df = pd.read_csv(file_path)
+        if start is None and end is None:
+            df = pd.read_csv(file_path)
+        else:
+            df = load_rf(start, end, source=file_path)
 
         '''
         # 2. 데이터프레임의 상위 5개 행을 화면에 출력
@@ -2,9 +2,24 @@ import pandas as pd
 from pathlib import Path
 import sys
 
+from aiportfolio.util.data_load.dataset import load_daily
+from aiportfolio.util.data_load.panel_schema import compact_daily, read_panel
+
 # python -m aiportfolio.util.data_load.open_final_stock_daily
 
-def open_final_stock_daily():
+def open_final_stock_daily(columns=None, start=None, end=None, tickers=None):
+    """
+    일별 종목 데이터를 읽습니다.
+
+    Args:
+        columns (list, optional): 읽을 컬럼 목록 (None이면 전체). 필요한 컬럼만 읽으면 I/O와 메모리가 줄어듦
+        start, end (str or Timestamp, optional): 읽을 날짜 구간 (양 끝 포함). 해당 row group만 읽음
+        tickers (list, optional): 읽을 종목 코드 (None이면 전체)
+
+    Returns:
+        pd.DataFrame: 표준 스키마 (Ticker category, gsector int8, sp500 bool, DlyRet float32, DlyCalDt datetime64)
+            이전 스키마로 저장된 파일은 읽은 뒤 변환 (panel_schema 참고)
+    """
     # 확인할 Parquet 파일 경로
     file_path = Path("database/final_processed_stock_data.parquet")
 
@@ -15,8 +30,11 @@ def open_final_stock_daily():
         sys.exit(1)
 
     try:
-        # 1. Parquet 파일을 pandas 데이터프레임으로 읽기
-        df = pd.read_parquet(file_path)
+        # 1. Parquet 파일을 메모리 맵으로 읽고 표준 스키마로 맞추기 (구간/종목 조건이 있으면 필요한 row group만)
+        if start is None and end is None and tickers is None:
+            df = compact_daily(read_panel(file_path, columns=columns))
+        else:
+            df = load_daily(start, end, columns=columns, tickers=tickers, source=file_path)
         '''
         # 2. 데이터프레임의 상위 5개 행을 화면에 출력
         print("\n파일 내용 미리보기 (상위 5개 행):")
@@ -2,9 +2,24 @@ import pandas as pd
 from pathlib import Path
 import sys
 
+from aiportfolio.util.data_load.dataset import load_monthly
+from aiportfolio.util.data_load.panel_schema import compact_monthly, read_panel
+
 # python -m aiportfolio.util.data_cleanse.open_final_stock_months
 
-def open_final_stock_months():
+def open_final_stock_months(start=None, end=None, columns=None, tickers=None):
+    """
+    월별 종목 데이터를 읽습니다.
+
+    Args:
+        start, end (str or Timestamp, optional): 읽을 구간 (해당 월 포함). 해당 row group만 읽음
+        columns (list, optional): 읽을 컬럼 목록 (None이면 전체)
+        tickers (list, optional): 읽을 종목 코드 (None이면 전체)
+
+    Returns:
+        pd.DataFrame: 표준 스키마 (Ticker category, gsector int8, sp500 bool, MthRet float32)
+            와 월말 날짜 컬럼 'date' (datetime64)
+    """
     # 확인할 Parquet 파일 경로
     file_path = Path("database/final_stock_months.parquet")
 
@@ -15,8 +30,11 @@ def open_final_stock_months():
         sys.exit(1)
 
     try:
-        # 1. Parquet 파일을 pandas 데이터프레임으로 읽기
-        df = pd.read_parquet(file_path)
+        # 1. Parquet 파일을 메모리 맵으로 읽고 표준 스키마로 맞추기 (구간/종목 조건이 있으면 필요한 row group만)
+        if start is None and end is None and columns is None and tickers is None:
+            df = compact_monthly(read_panel(file_path))
+        else:
+            df = load_monthly(start, end, columns=columns, tickers=tickers, source=file_path)
         '''
         # 2. 데이터프레임의 상위 5개 행을 화면에 출력
         print("\n파일 내용 미리보기 (상위 5개 행):")
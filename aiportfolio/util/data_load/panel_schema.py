@@ -0,0 +1,166 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# python -m aiportfolio.util.data_load.panel_schema
+
+# 종목 패널 (일별/월별)의 표준 스키마
+# - Ticker, PrimaryExch: category (parquet에서는 dictionary 인코딩)
+# - gsector: int8 (GICS 섹터 코드는 10~60), 결측이 있으면 nullable Int8
+# - sp500: bool
+# - 수익률 (DlyRet, MthRet): float32 (CRSP 수익률은 소수점 6자리라 float32의 유효숫자 7자리로 충분)
+# - 시가총액 (DlyCap, MthCap): float64 (값의 범위가 커서 float32로 줄이면 가중치 합계에 오차가 생김)
+# - 날짜: datetime64 (월별 패널은 cyear/cmonth에서 만든 월말 'date' 컬럼을 함께 저장)
+
+DAILY_DTYPES = {
+    'PrimaryExch': 'category',
+    'Ticker': 'category',
+    'DlyCap': 'float64',
+    'DlyRet': 'float32',
+    'sp500': 'bool',
+}
+MONTHLY_DTYPES = {
+    'PrimaryExch': 'category',
+    'Ticker': 'category',
+    'cyear': 'int16',
+    'cmonth': 'int8',
+    'MthCap': 'float64',
+    'MthRet': 'float32',
+    'sp500': 'bool',
+}
+
+# 스트리밍 저장 (pyarrow 직접 기록)용 일별 스키마
+DAILY_ARROW_SCHEMA = pa.schema([
+    ('PrimaryExch', pa.dictionary(pa.int32(), pa.string())),
+    ('Ticker', pa.dictionary(pa.int32(), pa.string())),
+    ('DlyCalDt', pa.timestamp('ns')),
+    ('DlyCap', pa.float64()),
+    ('DlyRet', pa.float32()),
+    ('sp500', pa.bool_()),
+    ('gsector', pa.int8()),
+])
+
+def _sector_codes(s):
+    """
+    gsector를 int8로 변환합니다. 결측이 있으면 nullable Int8을 사용합니다.
+    """
+    if s.dtype in ('int8', 'Int8'):
+        return s
+    s = pd.to_numeric(s, errors='coerce')
+    return s.astype('Int8' if s.isna().any() else 'int8')
+
+def _apply_dtypes(df, dtypes):
+    """
+    존재하는 컬럼만 표준 타입으로 변환합니다. 이미 같은 타입이면 복사하지 않습니다.
+    """
+    converted = {}
+    for col, dtype in dtypes.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        s = df[col]
+        if dtype == 'bool' and s.isna().any():
+            s = s.fillna(0)
+        converted[col] = s.astype(dtype)
+    if 'gsector' in df.columns:
+        converted['gsector'] = _sector_codes(df['gsector'])
+    return df.assign(**converted) if converted else df
+
+def compact_daily(df):
+    """
+    일별 종목 패널을 표준 스키마로 변환합니다. (DlyCalDt는 datetime64)
+
+    Args:
+        df (pd.DataFrame): 일별 종목 데이터 (일부 컬럼만 있어도 됨)
+
+    Returns:
+        pd.DataFrame: 표준 스키마의 DataFrame (변환할 컬럼이 없으면 입력 그대로)
+    """
+    if 'DlyCalDt' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['DlyCalDt']):
+        df = df.assign(DlyCalDt=pd.to_datetime(df['DlyCalDt']))
+    return _apply_dtypes(df, DAILY_DTYPES)
+
+def compact_monthly(df):
+    """
+    월별 종목 패널을 표준 스키마로 변환하고 월말 날짜 컬럼 'date'를 추가합니다.
+    (cyear/cmonth를 문자열로 이어 붙여 파싱하지 않고 연/월 정수로 바로 만듦)
+
+    Args:
+        df (pd.DataFrame): 월별 종목 데이터
+
+    Returns:
+        pd.DataFrame: 표준 스키마의 DataFrame
+    """
+    if 'date' not in df.columns and {'cyear', 'cmonth'} <= set(df.columns):
+        month_start = pd.to_datetime(pd.DataFrame({'year': df['cyear'], 'month': df['cmonth'], 'day': 1}))
+        df = df.assign(date=month_start + pd.offsets.MonthEnd(0))
+    return _apply_dtypes(df, MONTHLY_DTYPES)
+
+def read_panel(file_path, columns=None, filters=None):
+    """
+    parquet 파일을 메모리 맵으로 읽어 pandas로 변환합니다.
+
+    dictionary 컬럼은 category로, 숫자 컬럼은 블록 병합 없이(split_blocks) 변환하고
+    변환이 끝난 Arrow 버퍼는 바로 해제(self_destruct)해 최대 메모리를 줄입니다.
+    표준 스키마로 저장된 파일은 추가 변환 없이 그대로 사용할 수 있습니다.
+
+    Args:
+        file_path (str or Path): parquet 파일 (또는 파티션 디렉토리)
+        columns (list, optional): 읽을 컬럼 목록
+        filters (list, optional): pyarrow 행 필터
+
+    Returns:
+        pd.DataFrame
+    """
+    table = pq.read_table(file_path, columns=columns, filters=filters, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def write_panel(df, file_path, date_col):
+    """
+    패널을 날짜순으로 정렬해 월 단위 row group으로 저장합니다. (임시 파일 후 교체)
+
+    row group마다 날짜의 최소/최대 통계가 기록되므로 날짜 조건으로 읽을 때
+    (data_load.dataset.load_daily 등) 해당 월의 row group만 읽게 됩니다.
+
+    Args:
+        df (pd.DataFrame): 표준 스키마의 패널
+        file_path (str or Path): 저장할 parquet 파일
+        date_col (str): 정렬/분할 기준 날짜 컬럼 ('DlyCalDt' 또는 'date')
+    """
+    file_path = Path(file_path)
+    sort_keys = [date_col, 'Ticker'] if 'Ticker' in df.columns else [date_col]
+    df = df.sort_values(sort_keys, kind='stable').reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # 월이 바뀌는 위치에서 row group을 나눔
+    months = df[date_col].dt.to_period('M')
+    bounds = [0] + list(months.ne(months.shift()).to_numpy().nonzero()[0][1:]) + [len(df)]
+
+    tmp_path = file_path.with_suffix('.parquet.tmp')
+    with pq.ParquetWriter(tmp_path, table.schema) as writer:
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            writer.write_table(table.slice(lo, hi - lo))
+    tmp_path.replace(file_path)
+
+def rewrite_canonical(file_path, kind):
+    """
+    기존 parquet 파일을 표준 스키마와 월 단위 row group으로 다시 저장합니다.
+
+    Args:
+        file_path (str or Path): 변환할 parquet 파일
+        kind (str): 'daily' 또는 'monthly'
+    """
+    compact = compact_daily if kind == 'daily' else compact_monthly
+    df = compact(pd.read_parquet(file_path))
+    write_panel(df, file_path, 'DlyCalDt' if kind == 'daily' else 'date')
+    return df
+
+if __name__ == "__main__":
+    for path, kind in [(Path("database/final_processed_stock_data.parquet"), 'daily'),
+                       (Path("database/final_stock_months.parquet"), 'monthly')]:
+        if not path.exists():
+            print(f"건너뜀: {path} 파일이 없습니다.")
+            continue
+        before = pd.read_parquet(path).memory_usage(deep=True).sum()
+        after = rewrite_canonical(path, kind).memory_usage(deep=True).sum()
+        print(f"{path}: {before / 1024**2:,.1f} MB → {after / 1024**2:,.1f} MB")
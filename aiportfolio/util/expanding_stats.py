@@ -0,0 +1,104 @@
+import numpy as np
+
+# python -m aiportfolio.util.expanding_stats
+
+# 모든 함수는 마지막 축을 시간 축으로 보고 앞쪽 축(포트폴리오, 기준일 등)은 그대로 배치 처리합니다.
+# 결측치(NaN)는 pandas의 expanding().mean()/std()처럼 건너뜁니다.
+
+def expanding_moments(x, ddof=1):
+    """
+    Expanding-window count / mean / std in one vectorized pass
+
+    각 시점 t까지의 평균과 표준편차를 누적합으로 한 번에 계산합니다. (O(T))
+    누적합의 상쇄 오차를 줄이기 위해 행별 평균을 먼저 뺀 뒤 누적합니다.
+    (분산은 평행이동에 불변)
+
+    Formula:
+        n_t = Σ_{s≤t} 1,  S1_t = Σ_{s≤t} x_s,  S2_t = Σ_{s≤t} x_s²
+        mean_t = S1_t / n_t
+        var_t  = (S2_t - S1_t² / n_t) / (n_t - ddof)
+
+    Args:
+        x (np.ndarray): (..., T) 수익률 배열
+        ddof (int): 자유도 보정 (pandas std와 같은 기본값 1)
+
+    Returns:
+        tuple: (count, mean, std) - 모두 (..., T). 관측치가 ddof 이하인 시점의 std는 NaN
+    """
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+
+    with np.errstate(invalid='ignore'):
+        center = np.nanmean(x, axis=-1, keepdims=True) if x.shape[-1] else 0.0
+    centered = np.where(valid, x - np.nan_to_num(center), 0.0)
+
+    count = np.cumsum(valid, axis=-1)
+    s1 = np.cumsum(centered, axis=-1)
+    s2 = np.cumsum(centered * centered, axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s1 / count + center
+        var = (s2 - s1 * s1 / count) / (count - ddof)
+
+    var = np.where(count > ddof, np.maximum(var, 0.0), np.nan)
+    mean = np.where(count > 0, mean, np.nan)
+    return count, mean, np.sqrt(var)
+
+def expanding_volatility(x, periods=None):
+    """
+    각 시점까지의 표준편차 시계열. periods가 주어지면 sqrt(periods)로 연율화합니다.
+    """
+    _, _, std = expanding_moments(x)
+    return std * np.sqrt(periods) if periods else std
+
+def expanding_sharpe(x, periods=252):
+    """
+    Expanding-window Sharpe ratio series (무위험 수익률 0 가정)
+
+    각 시점까지의 일별 수익률로 구한 연율화 Sharpe Ratio를 한 번에 계산합니다.
+    표준편차가 0이면 0.0, 관측치가 1개 이하면 NaN (기존 백테스트 루프와 동일)
+
+    Formula:
+        SR_t = mean_t / std_t × sqrt(periods)
+
+    Args:
+        x (np.ndarray): (..., T) 일별 수익률
+        periods (int): 연율화 기간 수 (일별 252)
+
+    Returns:
+        np.ndarray: (..., T)
+    """
+    _, mean, std = expanding_moments(x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = mean / std * np.sqrt(periods)
+    return np.where(std == 0, 0.0, sharpe)
+
+def expanding_drawdown(x):
+    """
+    각 시점의 누적 수익률 고점 대비 낙폭과 그때까지의 최대 낙폭 (결측 수익률은 0으로 간주)
+
+    Returns:
+        tuple: (drawdown, max_drawdown) - 모두 (..., T), 0 이하의 값
+    """
+    wealth = np.cumprod(1 + np.nan_to_num(np.asarray(x, dtype=float)), axis=-1)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=-1)
+    drawdown = wealth / peak - 1
+    return drawdown, np.minimum.accumulate(drawdown, axis=-1)
+
+def expanding_hit_rate(x):
+    """
+    각 시점까지 수익률이 양수였던 날의 비율 (결측치 제외)
+    """
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    hits = np.cumsum(np.where(valid, x > 0, False), axis=-1)
+    count = np.cumsum(valid, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, hits / count, np.nan)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0005, 0.01, size=(3, 20))
+    print(expanding_sharpe(returns)[:, -1])
+    print(expanding_drawdown(returns)[1][:, -1])
+    print(expanding_hit_rate(returns)[:, -1])
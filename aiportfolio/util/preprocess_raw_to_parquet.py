@@ -10,17 +10,31 @@
 입력: database/raw_data.csv (또는 --raw-data-path로 지정된 외부 경로)
 출력: database/final_stock_daily.parquet
 모든 처리는 메모리에서 수행 (중간 파일 저장 없음)
+
+--streaming 모드: raw_data.csv가 메모리보다 큰 경우 청크 단위로 읽어
+필터링/매칭 후 연/월별로 파티션된 parquet 데이터셋(database/final_stock_daily/year=YYYY/month=M/)에 이어 씀
 """
 
+import shutil
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 import sys
 
+from aiportfolio.util.data_load.panel_schema import DAILY_ARROW_SCHEMA, compact_daily, write_panel
+from aiportfolio.util.sp500_membership import load_sp500_periods, sp500_membership
+
 
 class RawToParquetPipeline:
     """raw_data.csv를 final_stock_daily.parquet로 변환하는 통합 파이프라인"""
 
+    # 스트리밍 모드에서 읽을 컬럼과 타입 (필요한 컬럼만, 타입 추론 없이)
+    RAW_USECOLS = ['PrimaryExch', 'Ticker', 'DlyCalDt', 'DlyCap', 'DlyRet']
+    RAW_DTYPES = {'PrimaryExch': 'str', 'Ticker': 'str', 'DlyCalDt': 'str', 'DlyCap': 'float64', 'DlyRet': 'float64'}
+    FINAL_COLUMNS = ['PrimaryExch', 'Ticker', 'DlyCalDt', 'DlyCap', 'DlyRet', 'sp500', 'gsector']
+
     # === [수정됨] __init__ 메서드 ===
     def __init__(self, base_path=None, raw_data_path=None):
         """
@@ -55,6 +69,7 @@ class RawToParquetPipeline:
 
         # --- 출력 파일 경로 (기존과 동일) ---
         self.output_parquet = self.database_path / "final_stock_daily.parquet"
+        self.output_dataset = self.database_path / "final_stock_daily"  # 스트리밍 모드 (연/월별 파티션)
         self.mcap_daily_csv = self.database_path / "mcap_by_exchange_daily.csv"
 
         # --- 데이터프레임 (기존과 동일) ---
@@ -148,9 +163,18 @@ class RawToParquetPipeline:
         df_temp = self.df.copy()
         df_temp["DlyCalDt"] = pd.to_datetime(df_temp["DlyCalDt"])
 
+        self._save_mcap_pivot(self._mcap_sums(df_temp))
+
+    @staticmethod
+    def _mcap_sums(df):
+        """날짜×거래소별 시총 합계 (long 형식, 청크별 부분합을 다시 합산할 수 있음)"""
+        return df.groupby(["DlyCalDt", "PrimaryExch"], as_index=False)["DlyCap"].sum()
+
+    def _save_mcap_pivot(self, sums):
+        """날짜×거래소별 시총 합계를 피벗해 비율과 함께 mcap_by_exchange_daily.csv로 저장"""
         # 날짜×거래소별 시총 합계 피벗
         pivot = (
-            df_temp
+            sums
             .groupby(["DlyCalDt", "PrimaryExch"], as_index=False)["DlyCap"]
             .sum()
             .pivot(index="DlyCalDt", columns="PrimaryExch", values="DlyCap")
@@ -195,70 +219,22 @@ class RawToParquetPipeline:
 
         # SP500 기간 파일 로드
         print(f"\nSP500 기간 파일 읽는 중: {self.sp500_periods_path}")
-        self.df_sp500 = pd.read_csv(self.sp500_periods_path)
+        self.df_sp500 = load_sp500_periods(self.sp500_periods_path)
         print(f"✓ SP500 기간 레코드 수: {len(self.df_sp500):,}개")
 
-        # 날짜 변환
+        # 날짜 변환 (end_date가 비어있으면 2099-12-31로 대체 - load_sp500_periods에서 처리)
         print(f"\n날짜 형식 변환 중...")
         self.df['DlyCalDt'] = pd.to_datetime(self.df['DlyCalDt'])
-        self.df_sp500['start_date'] = pd.to_datetime(self.df_sp500['start_date'])
-
-        # end_date가 비어있으면 2099-12-31로 대체 (여전히 SP500에 포함)
-        self.df_sp500['end_date'] = self.df_sp500['end_date'].fillna('2099-12-31')
-        self.df_sp500['end_date'] = pd.to_datetime(self.df_sp500['end_date'])
-
         print(f"✓ start_date, end_date 변환 완료")
 
-        # Ticker를 대문자로 통일
-        self.df['ticker_upper'] = self.df['Ticker'].str.strip().str.upper()
-        self.df_sp500['ticker_upper'] = self.df_sp500['Ticker'].str.strip().str.upper()
-
-        # 매칭 수행
+        # 매칭 수행 (종목/날짜 정수 키의 구간 탐색, sp500_membership 참고)
         print(f"\n기간별 매칭 진행 중...")
-        print(f"  (이 작업은 시간이 걸릴 수 있습니다...)")
-
         total_records = len(self.df)
-        batch_size = 10000
-        total_batches = (total_records + batch_size - 1) // batch_size
-
-        sp500_flags = []
-
-        for batch_num in range(total_batches):
-            start_idx = batch_num * batch_size
-            end_idx = min((batch_num + 1) * batch_size, total_records)
-
-            batch_flags = []
-            for idx in range(start_idx, end_idx):
-                row = self.df.iloc[idx]
-                ticker = row['ticker_upper']
-                date = row['DlyCalDt']
-
-                # 해당 ticker의 SP500 기간 찾기
-                sp500_periods = self.df_sp500[self.df_sp500['ticker_upper'] == ticker]
-
-                # 날짜가 어떤 기간에라도 포함되는지 확인
-                is_in_sp500 = False
-                for _, period in sp500_periods.iterrows():
-                    if period['start_date'] <= date <= period['end_date']:
-                        is_in_sp500 = True
-                        break
-
-                batch_flags.append(1 if is_in_sp500 else 0)
-
-            sp500_flags.extend(batch_flags)
-
-            # 진행 상황 표시
-            if (batch_num + 1) % 10 == 0 or batch_num == total_batches - 1:
-                progress = ((batch_num + 1) / total_batches) * 100
-                processed = min((batch_num + 1) * batch_size, total_records)
-                print(f"  진행: {processed:,}/{total_records:,} ({progress:.1f}%)")
+        sp500_flags = sp500_membership(self.df['Ticker'], self.df['DlyCalDt'], self.df_sp500)
 
         # sp500 열 추가
         self.df['sp500'] = sp500_flags
 
-        # 임시 열 삭제
-        self.df = self.df.drop(columns=['ticker_upper'])
-
         # 매칭 결과 통계
         sp500_matched = self.df['sp500'].sum()
         non_sp500 = total_records - sp500_matched
@@ -268,12 +244,8 @@ class RawToParquetPipeline:
         print(f"  SP500 포함 (sp500=1): {sp500_matched:,}개 ({match_rate:.1f}%)")
         print(f"  SP500 미포함 (sp500=0): {non_sp500:,}개 ({100-match_rate:.1f}%)")
 
-    def match_gics_sector(self):
-        """GICS 섹터 매칭"""
-        print("\n" + "="*70)
-        print("[5단계] GICS 섹터 매칭")
-        print("="*70)
-
+    def _load_gics_mapping(self):
+        """GICS 파일을 읽어 (대문자 ticker → gsector) 딕셔너리와 sector 열 이름을 반환"""
         # GICS 파일 로드
         print(f"\nGICS 파일 읽는 중: {self.gics_mapping_path}")
         self.df_gics = pd.read_csv(self.gics_mapping_path)
@@ -312,6 +284,15 @@ class RawToParquetPipeline:
         print(f"\nGICS 데이터 준비 중...")
         self.df_gics['ticker_upper'] = self.df_gics[gics_ticker_col].astype(str).str.strip().str.upper()
         gics_dict = self.df_gics.set_index('ticker_upper')[gics_sector_col].to_dict()
+        return gics_dict, gics_sector_col
+
+    def match_gics_sector(self):
+        """GICS 섹터 매칭"""
+        print("\n" + "="*70)
+        print("[5단계] GICS 섹터 매칭")
+        print("="*70)
+
+        gics_dict, gics_sector_col = self._load_gics_mapping()
         print(f"✓ GICS 매핑 딕셔너리 생성 완료: {len(gics_dict):,}개")
 
         unique_sectors = self.df_gics[gics_sector_col].dropna().unique()
@@ -422,9 +403,8 @@ class RawToParquetPipeline:
         print("[7단계] Parquet 저장")
         print("="*70)
 
-        # 필요한 컬럼만 선택 및 순서 정리
-        final_columns = ['PrimaryExch', 'Ticker', 'DlyCalDt', 'DlyCap', 'DlyRet', 'sp500', 'gsector']
-        self.df = self.df[final_columns]
+        # 필요한 컬럼만 선택 및 순서 정리 후 표준 스키마로 변환 (panel_schema 참고)
+        self.df = compact_daily(self.df[self.FINAL_COLUMNS])
 
         print(f"\n최종 데이터프레임 정보:")
         print(f"  행 수: {len(self.df):,}개")
@@ -434,7 +414,7 @@ class RawToParquetPipeline:
 
         # Parquet 저장
         print(f"\nParquet 파일 저장 중: {self.output_parquet}")
-        self.df.to_parquet(self.output_parquet, index=False, engine='pyarrow')
+        write_panel(self.df, self.output_parquet, 'DlyCalDt')  # 날짜순, 월 단위 row group
 
         file_size_mb = self.output_parquet.stat().st_size / (1024 * 1024)
         print(f"✓ 저장 완료! (파일 크기: {file_size_mb:.2f} MB)")
@@ -446,6 +426,100 @@ class RawToParquetPipeline:
         print(f"\n데이터 타입:")
         print(self.df.dtypes)
 
+    def _process_chunk(self, chunk, gics_dict):
+        """
+        스트리밍 모드의 청크 하나를 전체 파이프라인과 같은 규칙으로 처리합니다.
+        (거래소 필터 → SP500 매칭 → GICS 매칭 → GOOG 보정 및 GICS 없는 행 삭제)
+
+        Returns:
+            tuple: (처리된 청크, 날짜×거래소별 시총 부분합)
+        """
+        chunk = chunk[chunk['PrimaryExch'].isin(['N', 'Q'])].copy()
+        chunk['DlyCalDt'] = pd.to_datetime(chunk['DlyCalDt'])
+        mcap_sums = self._mcap_sums(chunk)
+
+        chunk['sp500'] = sp500_membership(chunk['Ticker'], chunk['DlyCalDt'], self.df_sp500)
+
+        ticker_upper = chunk['Ticker'].astype(str).str.strip().str.upper()
+        chunk['gsector'] = ticker_upper.map(gics_dict)
+        chunk.loc[chunk['Ticker'].astype(str).str.upper() == 'GOOG', 'gsector'] = 50.0
+        chunk = chunk[chunk['gsector'].notna()]
+
+        return compact_daily(chunk[self.FINAL_COLUMNS]), mcap_sums
+
+    def run_streaming(self, chunksize=2_000_000):
+        """
+        raw_data.csv를 청크 단위로 읽어 연/월별로 파티션된 parquet 데이터셋에 이어 씁니다.
+
+        각 청크는 usecols/dtype을 지정해 타입 추론 없이 읽고, 필터링/매칭 후 바로 기록하므로
+        최대 메모리 사용량은 파일 크기가 아니라 청크 크기에 비례합니다.
+        거래소별 시총은 청크별 부분합을 모아 마지막에 한 번 합산합니다.
+
+        출력:
+            database/final_stock_daily/year=YYYY/month=M/part-*.parquet
+            (data_load.dataset.load_daily(start, end, source=self.output_dataset)로 필요한 월만 읽을 수 있음)
+
+        Args:
+            chunksize (int): 한 번에 읽을 행 수
+        """
+        print("\n" + "="*70)
+        print("통합 전처리 파이프라인 시작 (스트리밍 모드)")
+        print("="*70)
+        print(f"입력: {self.raw_data_path}")
+        print(f"출력: {self.output_dataset}")
+        print(f"청크 크기: {chunksize:,}행")
+
+        try:
+            self.validate_input_files()
+
+            # 참조 데이터는 한 번만 로드
+            self.df_sp500 = load_sp500_periods(self.sp500_periods_path)
+            gics_dict, _ = self._load_gics_mapping()
+
+            # 이전 실행의 파티션이 남아 있으면 중복되므로 출력 디렉토리를 새로 만듦
+            if self.output_dataset.exists():
+                shutil.rmtree(self.output_dataset)
+            self.output_dataset.mkdir(parents=True)
+
+            # 표준 스키마 (Ticker/PrimaryExch dictionary 인코딩, gsector int8, sp500 bool, DlyRet float32)
+            schema = DAILY_ARROW_SCHEMA.append(pa.field('year', pa.int32())).append(pa.field('month', pa.int8()))
+
+            mcap_parts = []
+            n_read = n_written = 0
+            reader = pd.read_csv(self.raw_data_path, usecols=self.RAW_USECOLS, dtype=self.RAW_DTYPES, chunksize=chunksize)
+
+            for i, chunk in enumerate(reader):
+                n_read += len(chunk)
+                chunk, mcap_sums = self._process_chunk(chunk, gics_dict)
+                mcap_parts.append(mcap_sums)
+
+                if not chunk.empty:
+                    chunk = chunk.assign(year=chunk['DlyCalDt'].dt.year.astype('int32'),
+                                         month=chunk['DlyCalDt'].dt.month.astype('int8'))
+                    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    pq.write_to_dataset(
+                        table, self.output_dataset, partition_cols=['year', 'month'],
+                        basename_template=f"part-{i:05d}-{{i}}.parquet",
+                    )
+                    n_written += len(chunk)
+
+                print(f"  청크 {i + 1}: 누적 {n_read:,}행 읽음 / {n_written:,}행 저장")
+
+            self._save_mcap_pivot(pd.concat(mcap_parts, ignore_index=True))
+
+            print("\n" + "="*70)
+            print("✅ 전체 파이프라인 완료! (스트리밍 모드)")
+            print("="*70)
+            print(f"\n생성된 파일:")
+            print(f"  1. {self.output_dataset} (연/월별 파티션, {n_written:,}행)")
+            print(f"  2. {self.mcap_daily_csv}")
+
+        except Exception as e:
+            print(f"\n✗ 오류 발생: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+
     def run(self):
         """전체 파이프라인 실행"""
         print("\n" + "="*70)
@@ -502,6 +576,18 @@ def main():
     )
     # ----------------------
 
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help="raw_data.csv를 청크 단위로 읽어 연/월별 파티션 parquet 데이터셋 (year=YYYY/month=M)으로 저장합니다. (메모리보다 큰 파일용)"
+    )
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=2_000_000,
+        help="스트리밍 모드에서 한 번에 읽을 행 수 (기본값: 2,000,000)"
+    )
+
     args = parser.parse_args()
 
     # 파이프라인 실행 (수정된 부분)
@@ -509,7 +595,10 @@ def main():
         base_path=args.base_path,
         raw_data_path=args.raw_data_path  # 새로 추가된 인자 전달
     )
-    pipeline.run()
+    if args.streaming:
+        pipeline.run_streaming(chunksize=args.chunksize)
+    else:
+        pipeline.run()
 
 
 if __name__ == "__main__":
@@ -9,6 +9,9 @@ import pandas as pd
 import numpy as np
 import traceback
 
+from aiportfolio.util.data_load.panel_schema import compact_daily, write_panel
+from aiportfolio.util.sp500_membership import load_sp500_periods, sp500_membership
+
 # 사용법 읽어보세요!! databse 폴더에 raw_data.csv 파일을 넣고
 # 이 스크립트를 실행하면 전처리된 final_processed_stock_data.parquet 파일이 생성됩니다~
 # 로컬에 저장할 필요없습니다.
@@ -146,55 +149,21 @@ def match_sp500_by_date(input_df, sp500_file,
     if date_column not in df_filtered.columns:
         print(f"\n✗ 오류: '{date_column}' 열을 찾을 수 없습니다."); return None
     
-    # 2단계: SP500 기간 파일 읽기
+    # 2단계: SP500 기간 파일 읽기 (end_date가 비어있으면 2099-12-31)
     print(f"\n[2단계] SP500 기간 파일 읽는 중: {sp500_file}")
-    df_sp500 = pd.read_csv(sp500_file)
+    df_sp500 = load_sp500_periods(sp500_file)
     print(f"✓ SP500 기간 레코드 수: {len(df_sp500):,}개")
     
     # 3단계: 날짜 변환
     print(f"\n[3단계] 날짜 형식 변환 중...")
     df_filtered[date_column] = pd.to_datetime(df_filtered[date_column])
-    df_sp500['start_date'] = pd.to_datetime(df_sp500['start_date'])
-    df_sp500['end_date'] = df_sp500['end_date'].fillna('2099-12-31')
-    df_sp500['end_date'] = pd.to_datetime(df_sp500['end_date'])
     print(f"✓ 날짜 변환 완료")
     
-    # Ticker 대문자 통일
-    df_filtered['ticker_upper'] = df_filtered[ticker_column].astype(str).str.strip().str.upper()
-    df_sp500['ticker_upper'] = df_sp500['Ticker'].astype(str).str.strip().str.upper()
-    
-    # 4단계: 매칭 수행
-    print(f"\n[4단계] 기간별 매칭 진행 중... (시간이 걸릴 수 있습니다)")
-    sp500_flags = []
-    batch_size = 10000
-    total_batches = (total_records + batch_size - 1) // batch_size
-    
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min((batch_num + 1) * batch_size, total_records)
-        
-        batch_flags = []
-        for idx in range(start_idx, end_idx):
-            row = df_filtered.iloc[idx]
-            ticker = row['ticker_upper']
-            date = row[date_column]
-            sp500_periods = df_sp500[df_sp500['ticker_upper'] == ticker]
-            is_in_sp500 = False
-            for _, period in sp500_periods.iterrows():
-                if period['start_date'] <= date <= period['end_date']:
-                    is_in_sp500 = True
-                    break
-            batch_flags.append(1 if is_in_sp500 else 0)
-        
-        sp500_flags.extend(batch_flags)
-        
-        if (batch_num + 1) % 10 == 0 or batch_num == total_batches - 1:
-            progress = ((batch_num + 1) / total_batches) * 100
-            processed = min((batch_num + 1) * batch_size, total_records)
-            print(f"  진행: {processed:,}/{total_records:,} ({progress:.1f}%)")
+    # 4단계: 매칭 수행 (종목/날짜 정수 키의 구간 탐색)
+    print(f"\n[4단계] 기간별 매칭 진행 중...")
+    sp500_flags = sp500_membership(df_filtered[ticker_column], df_filtered[date_column], df_sp500)
     
     df_filtered['sp500'] = sp500_flags
-    df_filtered = df_filtered.drop(columns=['ticker_upper'])
     
     sp500_matched = df_filtered['sp500'].sum()
     match_rate = (sp500_matched / total_records * 100) if total_records > 0 else 0
@@ -405,7 +374,8 @@ def main_pipeline():
         print("\n" + "="*70)
         print("🚀 STEP 4: 최종 Parquet 파일 저장")
         print("="*70)
-        df_step3.to_parquet(final_output_parquet, index=False, engine='pyarrow')
+        df_step3 = compact_daily(df_step3)  # 표준 스키마 (panel_schema 참고)
+        write_panel(df_step3, final_output_parquet, date_column)  # 날짜순, 월 단위 row group
         print(f"✓ 최종 Parquet 파일 저장 완료: {final_output_parquet}")
         
         print("\n" + "="*70)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# python -m aiportfolio.util.sp500_membership
+
+# SP500 편입 기간 매칭 엔진
+# (preprocess_raw_to_parquet, raw_filltered, data_load/daily_sp500 에서 공통으로 사용)
+
+def load_sp500_periods(sp500_file):
+    """
+    SP500 편입 기간 파일 (Ticker, start_date, end_date)을 읽어 정리합니다.
+    end_date가 비어있으면 2099-12-31 (여전히 SP500에 포함)로 대체합니다.
+
+    Returns:
+        pd.DataFrame: ticker_upper, start_date, end_date
+    """
+    df_sp500 = pd.read_csv(sp500_file)
+    return prepare_sp500_periods(df_sp500)
+
+def prepare_sp500_periods(df_sp500):
+    """
+    SP500 기간 DataFrame의 날짜를 변환하고 Ticker를 대문자로 통일합니다.
+    """
+    periods = pd.DataFrame({
+        'ticker_upper': df_sp500['Ticker'].astype(str).str.strip().str.upper(),
+        'start_date': pd.to_datetime(df_sp500['start_date']),
+        'end_date': pd.to_datetime(df_sp500['end_date'].fillna('2099-12-31')),
+    })
+    return periods.dropna(subset=['start_date', 'end_date'])
+
+def _normalize_tickers(tickers):
+    """
+    Ticker를 대문자/공백 제거로 통일합니다. 문자열 연산은 고유값에만 적용합니다.
+    """
+    codes, uniques = pd.factorize(pd.Series(tickers).astype(str), sort=False)
+    upper = pd.Index(uniques).str.strip().str.upper()
+    return codes, upper
+
+def sp500_membership(tickers, dates, periods):
+    """
+    Vectorized interval membership: (ticker, date)가 어떤 SP500 편입 기간에라도 포함되는지
+
+    1. 같은 종목의 겹치거나 맞닿은 기간을 하나로 합쳐 종목별로 서로소인 구간을 만듦
+    2. (종목 번호, 날짜) 를 하나의 정수 키로 만들어 구간 시작 키 배열에서 searchsorted
+    3. 찾은 구간의 끝 키 이하이면 포함
+
+    행을 정렬하거나 종목별로 반복하지 않으므로 비용은 O(rows × log(periods))이며,
+    수천만 행도 몇 초 안에 처리합니다. 날짜는 일 단위로 비교합니다.
+
+    Formula:
+        key = ticker_code × (span + 1) + day
+        in_sp500 = key ≤ end_key[searchsorted(start_key, key, 'right') - 1]
+
+    Args:
+        tickers (array-like): 종목 코드 (N,)
+        dates (array-like): 날짜 (N,)
+        periods (pd.DataFrame): prepare_sp500_periods()의 결과
+
+    Returns:
+        np.ndarray: 포함 여부 (N,) int8 (1: 포함, 0: 미포함)
+    """
+    row_codes, row_upper = _normalize_tickers(tickers)
+    row_days = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+    row_nat = pd.isna(pd.Series(dates)).to_numpy()
+
+    # 종목 번호: 기간 파일의 종목 기준 (없는 종목은 -1)
+    period_tickers = pd.Index(periods['ticker_upper'].unique())
+    ticker_code = period_tickers.get_indexer(row_upper)[row_codes] if len(row_codes) else np.array([], dtype=np.int64)
+
+    # 1. 종목별 기간 합치기 (정렬 후 직전 구간과 겹치거나 맞닿으면 병합)
+    p = pd.DataFrame({
+        'code': period_tickers.get_indexer(periods['ticker_upper']),
+        'start': periods['start_date'].to_numpy().astype('datetime64[D]').astype(np.int64),
+        'end': periods['end_date'].to_numpy().astype('datetime64[D]').astype(np.int64),
+    }).sort_values(['code', 'start'])
+    prev_end = p.groupby('code')['end'].cummax().groupby(p['code']).shift(1)
+    p['block'] = (prev_end.isna() | (p['start'] > prev_end + 1)).cumsum()
+    merged = p.groupby('block').agg(code=('code', 'first'), start=('start', 'min'), end=('end', 'max'))
+
+    if merged.empty or len(row_days) == 0:
+        return np.zeros(len(row_days), dtype=np.int8)
+
+    # 2. (종목 번호, 날짜) 정수 키 (날짜는 전체 최소일 기준 오프셋)
+    day0 = min(merged['start'].min(), row_days[~row_nat].min() if (~row_nat).any() else merged['start'].min())
+    span = max(merged['end'].max(), row_days[~row_nat].max() if (~row_nat).any() else 0) - day0 + 1
+    start_key = merged['code'].to_numpy() * span + (merged['start'].to_numpy() - day0)
+    end_key = merged['code'].to_numpy() * span + (merged['end'].to_numpy() - day0)
+    row_key = ticker_code * span + (row_days - day0)
+
+    # 3. 구간 탐색
+    idx = np.searchsorted(start_key, row_key, side='right') - 1
+    inside = (idx >= 0) & (row_key <= end_key[np.clip(idx, 0, None)])
+    inside &= (ticker_code >= 0) & ~row_nat
+    return inside.astype(np.int8)
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    tickers = np.array([f"T{i:04d}" for i in range(3000)])
+    periods = pd.DataFrame({
+        'Ticker': tickers[:1000],
+        'start_date': pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 7000, 1000), 'D'),
+        'end_date': [None] * 1000,
+    })
+    rows = 10_000_000
+    dates = pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 9000, rows), 'D')
+
+    t = time.time()
+    flags = sp500_membership(tickers[rng.integers(0, 3000, rows)], dates, prepare_sp500_periods(periods))
+    print(f"{rows:,} rows: {time.time() - t:.2f}s, sp500={flags.mean():.3f}")
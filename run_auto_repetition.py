@@ -1,4 +1,4 @@
-from aiportfolio.scene import scene
+from aiportfolio.scene import scene, prepare_views
 
 ######################################
 #            configuration           #
@@ -12,6 +12,7 @@ Tier3_repetition_count = 1
 
 tau = 0.025
 model = 'llama'  # 'llama' or 'gemini'
+batch_size = 8  # Llama 3 배치 생성 크기
 
 forecast_period = [
         "24-05-31",
@@ -30,17 +31,14 @@ backtest_days_count = 19
 #                run                 #
 ######################################
 
-if Tier1_repetition_count >= 1:
-    for i in range(1,Tier1_repetition_count+1):
-        simul_name = simul_name_base + 'Tier1_' + f'{i}'
-        scene(simul_name, 1, tau, forecast_period, backtest_days_count, model)
+repetition_counts = {1: Tier1_repetition_count, 2: Tier2_repetition_count, 3: Tier3_repetition_count}
+runs = [(simul_name_base + f'Tier{Tier}_' + f'{i}', Tier, i)
+        for Tier, count in repetition_counts.items() for i in range(1, count+1)]
 
-if Tier2_repetition_count >= 1:
-    for i in range(1,Tier2_repetition_count+1):
-        simul_name = simul_name_base + 'Tier2_' + f'{i}'
-        scene(simul_name, 2, tau, forecast_period, backtest_days_count, model)
+# scene은 spawn 프로세스 풀을 사용하므로 메인 모듈에서만 실행
+if __name__ == "__main__":
+    # 모든 반복/기준일의 뷰를 한 번에 배치 생성한 뒤 각 시뮬레이션에 전달
+    views = prepare_views(runs, forecast_period, model, batch_size)
 
-if Tier3_repetition_count >= 1:
-    for i in range(1,Tier3_repetition_count+1):
-        simul_name = simul_name_base + 'Tier3_' + f'{i}'
-        scene(simul_name, 3, tau, forecast_period, backtest_days_count, model)
\ No newline at end of file
+    for simul_name, Tier, _ in runs:
+        scene(simul_name, Tier, tau, forecast_period, backtest_days_count, model, views=views[simul_name])
@@ -33,5 +33,7 @@ backtest_days_count = 19
 #                run                 #
 ######################################
 
-scene(simul_name, Tier, tau, forecast_period, backtest_days_count, model)
+# scene은 spawn 프로세스 풀을 사용하므로 메인 모듈에서만 실행
+if __name__ == "__main__":
+    scene(simul_name, Tier, tau, forecast_period, backtest_days_count, model)
 